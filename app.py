@@ -39,6 +39,8 @@ from pages.reports import render_reports
 from pages.users import render_users
 from pages.configuration import render_configuration
 from ui.login import render_login
+from ui.components import render_data_warnings
+from services.cache import cache_issues
 
 try:
     from streamlit_autorefresh import st_autorefresh
@@ -607,6 +609,8 @@ device_rows = build_devices_view()
 channel_configs = load_channel_configs()
 locations = load_locations()
 
+render_data_warnings(cache_issues())
+
 
 # ============================================================
 # PÁGINAS
@@ -15,3 +15,23 @@ def get_supabase_config():
         )
         return None, None
 
+
+
+@st.cache_resource
+def get_service_supabase():
+    """
+    Cliente com a chave de serviço (supabase_service_key em st.secrets),
+    usado só pelas consultas compartilhadas entre sessões (poller da
+    frota). None quando a chave não está configurada.
+    """
+    try:
+        key = st.secrets.get("supabase_service_key")
+    except Exception:
+        return None
+
+    url, _ = get_supabase_config()
+
+    if not url or not key:
+        return None
+
+    return create_client(url, key)
@@ -1,3 +1,61 @@
 REFRESH_SECONDS = 30
 OFFLINE_AFTER_SECONDS = 120
 MCA_PER_BAR = 10.197
+
+# Histórico: janelas longas são divididas em fatias alinhadas à grade UTC,
+# paginadas com range() e buscadas em paralelo.
+# HISTORY_PAGE_SIZE não deve exceder o max-rows do PostgREST.
+HISTORY_SLICE_HOURS = 2
+HISTORY_PAGE_SIZE = 1000
+HISTORY_FETCH_WORKERS = 4
+
+# Buffer incremental do histórico por dispositivo.
+HISTORY_REFRESH_SECONDS = 30
+HISTORY_MAX_DAYS = 30
+# O buffer guarda a maior janela pedida nos últimos
+# HISTORY_RETENTION_SECONDS; depois disso encolhe para as janelas em uso.
+HISTORY_RETENTION_SECONDS = 600
+# Reconsulta um pequeno trecho antes da marca d'água para não perder
+# linhas com recebido_em anterior que só ficaram visíveis após o commit.
+HISTORY_OVERLAP_SECONDS = 60
+# Bordas das janelas de histórico (HistoryWindow) são alinhadas a esta
+# grade, para que sessões e páginas compartilhem as mesmas entradas de cache.
+HISTORY_WINDOW_GRID_SECONDS = 60
+
+# Poller compartilhado da última leitura da frota.
+TELEMETRY_POLL_SECONDS = 10
+# Sem sessões ativas por este tempo, o poller deixa de consultar o banco.
+TELEMETRY_POLL_IDLE_SECONDS = 300
+
+# Ingestão MQTT opcional (habilitada por mqtt_host em st.secrets).
+MQTT_DEFAULT_PORT = 1883
+MQTT_DEFAULT_TOPIC = "axion/+/telemetria"
+MQTT_BUFFER_SIZE = 4096
+
+# O token da sessão só é renovado quando faltar menos que isso para expirar.
+AUTH_REFRESH_MARGIN_SECONDS = 300
+
+# Cache stale-while-revalidate dos loaders (services.cache).
+# Sem valor em cache, a página espera no máximo CACHE_LOAD_TIMEOUT_SECONDS;
+# após CACHE_BREAKER_FAILURES falhas seguidas o banco não é consultado
+# por CACHE_BREAKER_COOLDOWN_SECONDS.
+CACHE_LOAD_TIMEOUT_SECONDS = 8
+CACHE_BREAKER_FAILURES = 3
+CACHE_BREAKER_COOLDOWN_SECONDS = 60
+CACHE_REFRESH_WORKERS = 4
+# Teto de memória somado de todos os caches (loaders e buffers de
+# histórico); acima dele as entradas menos usadas são descartadas.
+CACHE_MEMORY_BUDGET_MB = 256
+
+# Relatórios PDF gerados em processos separados (services.report_jobs);
+# os arquivos prontos ficam em disco, limitados em quantidade e tamanho.
+# REPORT_WORKERS = None usa um processo por núcleo.
+REPORT_WORKERS = None
+REPORT_CACHE_MAX_FILES = 32
+REPORT_CACHE_MAX_MB = 200
+# Intervalo de atualização do progresso na página de relatórios.
+REPORT_POLL_SECONDS = 1
+# Médias ponderadas no tempo dos relatórios: cada leitura vale até a
+# próxima, no máximo REPORT_MAX_HOLD_SECONDS; intervalos maiores são
+# lacunas e não prolongam o último valor.
+REPORT_MAX_HOLD_SECONDS = 300
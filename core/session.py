@@ -1,12 +1,45 @@
+import base64
+import json
+import time
+
 import streamlit as st
-from supabase import create_client
+from supabase import ClientOptions, create_client
 from .config import get_supabase_config
+from .constants import AUTH_REFRESH_MARGIN_SECONDS
+from services.cache import clear_loader_caches
+from services.history_store import get_history_store
+
+
+def _token_expires_at(access_token):
+    """Lê o exp do JWT (sem validar a assinatura; só para agendar a renovação)."""
+    try:
+        payload = access_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return 0.0
+
+
+def _store_auth_session(session):
+    st.session_state.auth_session = {
+        "access_token": session.access_token,
+        "refresh_token": session.refresh_token,
+    }
 
 
 def get_authenticated_supabase():
+    """
+    Cliente Supabase da sessão atual.
+
+    O cliente fica em st.session_state (nunca é compartilhado entre
+    sessões) e é reutilizado nos reruns enquanto o token não mudar,
+    mantendo a conexão HTTP keep-alive. O token só é renovado quando
+    faltar menos de AUTH_REFRESH_MARGIN_SECONDS para expirar.
+    """
     session = st.session_state.get("auth_session")
 
     if not session:
+        st.session_state.pop("supabase_client", None)
         return None
 
     url, key = get_supabase_config()
@@ -14,14 +47,48 @@ def get_authenticated_supabase():
     if not url or not key:
         return None
 
+    entry = st.session_state.get("supabase_client")
+
     try:
-        client = create_client(url, key)
-        client.auth.set_session(
-            session["access_token"],
-            session["refresh_token"],
-        )
-        return client
+        if (
+            entry is None
+            or entry["access_token"] != session["access_token"]
+        ):
+            client = create_client(
+                url,
+                key,
+                ClientOptions(auto_refresh_token=False),
+            )
+            response = client.auth.set_session(
+                session["access_token"],
+                session["refresh_token"],
+            )
+
+            # set_session já renova tokens expirados.
+            if response and response.session:
+                _store_auth_session(response.session)
+                session = st.session_state.auth_session
+
+            entry = {
+                "client": client,
+                "access_token": session["access_token"],
+                "expires_at": _token_expires_at(session["access_token"]),
+            }
+            st.session_state.supabase_client = entry
+
+        if entry["expires_at"] - time.time() < AUTH_REFRESH_MARGIN_SECONDS:
+            refreshed = entry["client"].auth.refresh_session()
+
+            if refreshed and refreshed.session:
+                _store_auth_session(refreshed.session)
+                entry["access_token"] = refreshed.session.access_token
+                entry["expires_at"] = _token_expires_at(
+                    refreshed.session.access_token
+                )
+
+        return entry["client"]
     except Exception:
+        st.session_state.pop("supabase_client", None)
         return None
 
 
@@ -32,16 +99,6 @@ def get_current_user_profile():
         return None
 
     try:
-        refresh_result = client.auth.refresh_session()
-
-        if refresh_result and refresh_result.session:
-            st.session_state.auth_session = {
-                "access_token": refresh_result.session.access_token,
-                "refresh_token": refresh_result.session.refresh_token,
-            }
-
-            client = get_authenticated_supabase()
-
         user = client.auth.get_user().user
 
         response = (
@@ -84,9 +141,15 @@ def logout():
     except Exception:
         pass
 
+    profile = st.session_state.get("user_profile") or {}
+    get_history_store().clear_scope(profile.get("id"))
+
     st.session_state.auth_session = None
+    st.session_state.pop("supabase_client", None)
+    st.session_state.pop("fleet_snapshot", None)
     st.session_state.user_profile = None
     st.cache_data.clear()
+    clear_loader_caches()
     st.session_state.view = "dashboard"
     st.rerun()
 
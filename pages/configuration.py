@@ -283,10 +283,10 @@ def render_configuration(channel_configs):
                             .execute()
                         )
 
-                        load_devices.clear()
+                        clear_device_cache()
                         load_channel_configs.clear()
                         load_locations.clear()
-                        load_telemetry.clear()
+                        refresh_telemetry()
 
                         st.success(
                             f"{device_name_value} cadastrado com sucesso."
@@ -22,6 +22,7 @@ from services.analog_inputs import *
 from services.data import *
 from services.analytics import *
 from services.reports import *
+from services.fleet import *
 from ui.components import *
 
 
@@ -56,15 +57,9 @@ def render_dashboard(device_rows, channel_configs, locations):
         online = int(
             (device_rows["status"] == "Online").sum()
         )
-        alarms = 0
-
-        for _, dashboard_row in device_rows.iterrows():
-            current_alarms = get_current_device_alarms(
-                dashboard_row
-            )
-
-            if not current_alarms.empty:
-                alarms += len(current_alarms)
+        fleet = get_fleet_status(device_rows)
+        channel_table = get_channel_table()
+        alarms = fleet.alarm_count
 
         k1, k2, k3 = st.columns(3)
 
@@ -101,12 +96,25 @@ def render_dashboard(device_rows, channel_configs, locations):
                 unsafe_allow_html=True,
             )
 
+        snapshot = get_fleet_snapshot()
+
         st.caption(
             f"Atualização automática a cada {REFRESH_SECONDS}s • "
             f"Última atualização: "
-            f"{format_local_datetime(datetime.now(timezone.utc))}"
+            f"{format_local_datetime(snapshot.fetched_at)}"
         )
 
+        if snapshot.fetched_at is not None and snapshot.is_stale():
+            st.warning(
+                f"Leituras da frota desatualizadas há "
+                f"{int(snapshot.age_seconds())}s."
+                + (
+                    f" Última falha: {snapshot.error}"
+                    if snapshot.error
+                    else ""
+                )
+            )
+
         if alarms > 0:
             st.markdown(
                 f"""
@@ -132,6 +140,13 @@ def render_dashboard(device_rows, channel_configs, locations):
         # Equipamentos por local
         # --------------------------------------------------------
 
+        # Estatísticas de 7 dias de todos os gauges da página,
+        # buscadas uma única vez nos rollups.
+        gauge_stats = load_fleet_channel_statistics(
+            device_rows["device_id"].astype(str).tolist(),
+            7,
+        )
+
         locations = (
             device_rows["local"]
             .fillna("Sem local")
@@ -197,13 +212,10 @@ def render_dashboard(device_rows, channel_configs, locations):
                             else device_id
                         )
 
-                        score = health_score(row)
+                        score = fleet.health_for(device_id)
 
-                        full_scale_v = safe_float(
-                            row.get(
-                                "adc_full_scale_v"
-                            ),
-                            4.096
+                        device_channels = channel_table.device(
+                            device_id
                         )
 
                         last = row.get(
@@ -218,21 +230,9 @@ def render_dashboard(device_rows, channel_configs, locations):
                         # Entradas ativas
                         # ----------------------------
 
-                        active_ai = []
-
-                        for canal_num in range(1, 9):
-                            canal_name = (
-                                f"AI{canal_num:03d}"
-                            )
-
-                            if is_channel_active(
-                                channel_configs,
-                                device_id,
-                                canal_name
-                            ):
-                                active_ai.append(
-                                    canal_name
-                                )
+                        active_ai = fleet.active_channels_for(
+                            device_id
+                        )
 
                         # ----------------------------
                         # Seleção das grandezas principais
@@ -240,62 +240,20 @@ def render_dashboard(device_rows, channel_configs, locations):
 
                         candidates = []
 
-                        for canal in active_ai:
-
-                            cfg = get_channel_config(
-                                channel_configs,
-                                device_id,
-                                canal
-                            )
-
-                            label = channel_display_name(
-                                cfg,
-                                canal
-                            )
-
-                            unit = channel_unit(
-                                cfg,
-                                ""
-                            )
-
-                            value = get_channel_value(
-                                row,
-                                channel_configs,
-                                device_id,
-                                canal,
-                                full_scale_v
-                            )
+                        for channel in device_channels.active:
+                            if channel.canal not in active_ai:
+                                continue
 
                             candidates.append({
-                                "canal": canal,
-                                "label": label,
-                                "unit": unit,
-                                "value": value,
-                                "eng_min": safe_float(
-                                    cfg.get(
-                                        "eng_min"
-                                    ),
-                                    0
-                                ),
-                                "eng_max": safe_float(
-                                    cfg.get(
-                                        "eng_max"
-                                    ),
-                                    100
-                                ),
-                                "alarm_min": safe_float(
-                                    cfg.get(
-                                        "alarme_min"
-                                    )
-                                ),
-                                "alarm_max": safe_float(
-                                    cfg.get(
-                                        "alarme_max"
-                                    )
-                                ),
-                                "exibir_gauge": bool(
-                                    cfg.get("exibir_gauge", True)
-                                ),
+                                "canal": channel.canal,
+                                "label": channel.label,
+                                "unit": channel.unit,
+                                "value": channel.value(row),
+                                "eng_min": channel.eng_min,
+                                "eng_max": channel.eng_max,
+                                "alarm_min": channel.alarm_min,
+                                "alarm_max": channel.alarm_max,
+                                "exibir_gauge": channel.show_gauge,
                             })
 
                         # Entradas ativas com 'Exibir gauge no dashboard' habilitado viram gauges.
@@ -395,35 +353,16 @@ def render_dashboard(device_rows, channel_configs, locations):
                                             # Min/max atuais do período
                                             # ficam abaixo do mostrador,
                                             # sem depender da aba Relatórios.
-                                            if "history_short" not in locals():
-                                                history_short = load_history(
-                                                    device_id,
-                                                    7
-                                                )
-
-                                            values = pd.Series(
-                                                dtype=float
+                                            item_stats = gauge_stats.get(
+                                                (device_id, item["canal"])
                                             )
 
-                                            if not history_short.empty:
-                                                values = pd.to_numeric(
-                                                    history_short.apply(
-                                                        lambda hist_row: get_channel_value(
-                                                            hist_row,
-                                                            channel_configs,
-                                                            device_id,
-                                                            item["canal"],
-                                                            full_scale_v,
-                                                        ),
-                                                        axis=1,
-                                                    ),
-                                                    errors="coerce"
-                                                ).dropna()
-
-                                            if not values.empty:
-                                                avg = float(values.mean())
-                                                minimum = float(values.min())
-                                                maximum = float(values.max())
+                                            if item_stats and np.isfinite(
+                                                item_stats["media"]
+                                            ):
+                                                avg = float(item_stats["media"])
+                                                minimum = float(item_stats["minimo"])
+                                                maximum = float(item_stats["maximo"])
                                                 minimum = max(item["eng_min"], min(minimum, item["eng_max"]))
                                                 maximum = max(item["eng_min"], min(maximum, item["eng_max"]))
                                                 avg = max(item["eng_min"], min(avg, item["eng_max"]))
@@ -459,8 +398,8 @@ def render_dashboard(device_rows, channel_configs, locations):
                             # Alarmes ativos
                             # ----------------------------
 
-                            current_alarms = get_current_device_alarms(
-                                row
+                            current_alarms = fleet.alarms_for(
+                                device_id
                             )
 
                             if not current_alarms.empty:
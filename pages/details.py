@@ -22,6 +22,7 @@ from services.analog_inputs import *
 from services.data import *
 from services.analytics import *
 from services.reports import *
+from services.fleet import *
 from ui.components import *
 
 
@@ -74,32 +75,14 @@ def render_details(device_rows, channel_configs):
 
             history = load_history(
                 selected,
-                period_days
+                HistoryWindow.last(period_days),
             )
 
             # ------------------------------------------------
             # CONFIGURAÇÃO DO DISPOSITIVO
             # ------------------------------------------------
 
-            device_cfg = load_devices()
-            full_scale_v = safe_float(
-                row.get("adc_full_scale_v"),
-                4.096
-            )
-
-            if not device_cfg.empty:
-                device_match = device_cfg[
-                    device_cfg["device_id"].astype(str)
-                    == str(selected)
-                ]
-
-                if not device_match.empty:
-                    full_scale_v = safe_float(
-                        device_match.iloc[0].get(
-                            "adc_full_scale_v"
-                        ),
-                        4.096
-                    )
+            device_channels = get_channel_table().device(selected)
 
             # ------------------------------------------------
             # STATUS / CABEÇALHO
@@ -119,17 +102,8 @@ def render_details(device_rows, channel_configs):
             # ENTRADAS ATIVAS
             # ------------------------------------------------
 
-            active_ai = []
-
-            for canal_num in range(1, 9):
-                canal_name = f"AI{canal_num:03d}"
-
-                if is_channel_active(
-                    channel_configs,
-                    selected,
-                    canal_name
-                ):
-                    active_ai.append(canal_name)
+            fleet = get_fleet_status(device_rows)
+            active_ai = fleet.active_channels_for(selected)
 
             # ------------------------------------------------
             # PRESSÃO
@@ -142,24 +116,9 @@ def render_details(device_rows, channel_configs):
             pressure_mca = np.nan
 
             if pressure_active:
-                pressure_cfg = get_channel_config(
-                    channel_configs,
-                    selected,
-                    "AI004"
-                )
-
-                pressure = get_channel_value(
-                    row,
-                    channel_configs,
-                    selected,
-                    "AI004",
-                    full_scale_v
-                )
-
-                pressure_unit = channel_unit(
-                    pressure_cfg,
-                    ""
-                )
+                pressure_channel = device_channels.channel("AI004")
+                pressure = pressure_channel.value(row)
+                pressure_unit = pressure_channel.unit
 
                 if pressure_unit.lower() == "bar":
                     pressure_mca = bar_to_mca(
@@ -178,14 +137,7 @@ def render_details(device_rows, channel_configs):
                         "Pressão",
                         format_value(
                             pressure,
-                            int(
-                                safe_float(
-                                    pressure_cfg.get(
-                                        "decimais"
-                                    ),
-                                    2
-                                )
-                            ),
+                            pressure_channel.decimals,
                             pressure_unit
                         )
                     )
@@ -256,36 +208,11 @@ def render_details(device_rows, channel_configs):
                 for index, canal in enumerate(
                     active_analog_channels
                 ):
-                    cfg = get_channel_config(
-                        channel_configs,
-                        selected,
-                        canal
-                    )
-
-                    label = channel_display_name(
-                        cfg,
-                        canal
-                    )
-
-                    unit = channel_unit(
-                        cfg,
-                        ""
-                    )
-
-                    value = get_channel_value(
-                        row,
-                        channel_configs,
-                        selected,
-                        canal,
-                        full_scale_v
-                    )
-
-                    decimals = int(
-                        safe_float(
-                            cfg.get("decimais"),
-                            2
-                        )
-                    )
+                    channel = device_channels.channel(canal)
+                    label = channel.label
+                    unit = channel.unit
+                    value = channel.value(row)
+                    decimals = channel.decimals
 
                     with analog_columns[
                         index % len(analog_columns)
@@ -303,9 +230,7 @@ def render_details(device_rows, channel_configs):
             # ALARMES ATIVOS
             # ------------------------------------------------
 
-            current_alarms = get_current_device_alarms(
-                row
-            )
+            current_alarms = fleet.alarms_for(selected)
 
             if not current_alarms.empty:
                 st.markdown(
@@ -419,17 +344,8 @@ def render_details(device_rows, channel_configs):
                         if canal in history.columns:
                             chart_columns.append(canal)
 
-                            cfg = get_channel_config(
-                                channel_configs,
-                                selected,
-                                canal
-                            )
-
                             chart_labels.append(
-                                channel_display_name(
-                                    cfg,
-                                    canal
-                                )
+                                device_channels.channel(canal).label
                             )
 
                     if chart_columns:
@@ -22,9 +22,234 @@ from services.analog_inputs import *
 from services.data import *
 from services.analytics import *
 from services.reports import *
+from services.report_jobs import *
 from ui.components import *
 
 
+REPORT_WEIGHTING_LABELS = {
+    "leitura": "Por leitura",
+    "tempo": "Ponderada no tempo",
+}
+
+REPORT_PHASE_LABELS = {
+    "fetch": "preparando dados",
+    "stats": "calculando estatisticas",
+    "layout": "montando tabelas",
+    "render": "gerando PDF",
+}
+
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def render_report_progress(job_id):
+    """
+    Progresso e cancelamento do relatório em andamento. Só este trecho é
+    reexecutado, e só enquanto o job roda; ao terminar, a página é
+    recarregada uma vez para mostrar o download.
+    """
+    jobs = get_report_jobs()
+    status = jobs.status(job_id)
+
+    if status is None or not status.active:
+        st.rerun()
+
+    st.progress(
+        status.progress,
+        text=(
+            "Gerando relatorio PDF... "
+            f"{REPORT_PHASE_LABELS.get(status.phase, 'na fila')}"
+        ),
+    )
+
+    if st.button("Cancelar relatorio", width="stretch"):
+        jobs.cancel(job_id)
+
+
+@st.fragment
+def render_report_job(device_id, period_label, report_key, fetch):
+    """
+    Botão de geração, progresso/cancelamento e download do relatório.
+    O PDF só é lido do disco quando o download é clicado.
+    """
+    jobs = get_report_jobs()
+    job_id = report_job_id(report_key)
+    current = jobs.status(job_id)
+
+    tracked = st.session_state.get("report_job")
+
+    # Job de outro dispositivo/período não serve aqui.
+    if tracked is not None and (
+        tracked["device_id"] != device_id
+        or tracked["period"] != period_label
+    ):
+        tracked = None
+
+    # Conteúdo atual já gerado (nesta ou em outra sessão).
+    if current is not None and current.state == "done":
+        tracked = {
+            "device_id": device_id,
+            "period": period_label,
+            "job_id": job_id,
+        }
+
+    status = jobs.status(tracked["job_id"]) if tracked else None
+    has_pdf = status is not None and status.state == "done"
+
+    idle = status is None or not status.active
+
+    if idle and (not has_pdf or status.job_id != job_id) and st.button(
+        "Atualizar relatorio PDF" if has_pdf else "Gerar relatorio PDF",
+        type="secondary" if has_pdf else "primary",
+        width="stretch",
+    ):
+        st.session_state.report_job = {
+            "device_id": device_id,
+            "period": period_label,
+            "job_id": jobs.submit(report_key, fetch),
+        }
+        status = jobs.status(job_id)
+        has_pdf = status is not None and status.state == "done"
+
+    if status is not None and status.active:
+        render_report_progress(status.job_id)
+        return
+
+    if status is not None and status.state == "failed":
+        st.error(f"Falha ao gerar o relatorio: {status.error}")
+    elif status is not None and status.state == "cancelled":
+        st.info("Geracao do relatorio cancelada.")
+
+    if has_pdf:
+        pdf_job_id = status.job_id
+
+        st.download_button(
+            "Baixar relatorio PDF",
+            data=lambda: jobs.result(pdf_job_id) or b"",
+            file_name=(
+                f"AXION_"
+                f"{device_id}_"
+                f"Relatorio_"
+                f"{period_label.replace(' ', '_')}.pdf"
+            ),
+            mime="application/pdf",
+            type="primary",
+            width="stretch",
+        )
+
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def render_export_progress(batch_id):
+    """
+    Progresso e cancelamento da exportação em andamento; reexecutado só
+    enquanto o lote roda. Ao terminar, recarrega a página uma vez.
+    """
+    jobs = get_report_jobs()
+    status = jobs.batch_status(batch_id)
+
+    if status is None or not status.active:
+        st.rerun()
+
+    st.progress(
+        status.progress,
+        text=(
+            "Gerando relatorios... "
+            f"{status.completed + status.failed}/{status.total}"
+        ),
+    )
+
+    if st.button("Cancelar exportacao", width="stretch"):
+        jobs.cancel_batch(batch_id)
+
+
+@st.fragment
+def render_location_export(
+    device_rows,
+    location,
+    window,
+    period_label,
+    weighting,
+):
+    """
+    ZIP com o relatório de serviço de todos os ativos de location,
+    gerados em paralelo no pool de relatórios. Os itens (e a consulta do
+    histórico de cada ativo) só são montados ao clicar em gerar; o ZIP só
+    é lido do disco quando o download é clicado.
+    """
+    jobs = get_report_jobs()
+    device_count = len(location_device_rows(device_rows, location))
+
+    if not device_count:
+        st.info("Nenhum ativo ativo neste local.")
+        return
+
+    tracked = st.session_state.get("report_batch")
+
+    if tracked is not None and (
+        tracked["location"] != location
+        or tracked["period"] != period_label
+    ):
+        tracked = None
+
+    status = jobs.batch_status(tracked["batch_id"]) if tracked else None
+    has_zip = status is not None and status.state == "done"
+    idle = status is None or not status.active
+
+    if idle and st.button(
+        (
+            "Atualizar ZIP"
+            if has_zip
+            else f"Gerar ZIP com {device_count} relatorios"
+        ),
+        width="stretch",
+    ):
+        # Mesmo conteúdo de um ZIP já gerado (nesta ou em outra sessão):
+        # submit_batch devolve o lote pronto sem gerar de novo.
+        batch_id = jobs.submit_batch(
+            location,
+            location_report_items(
+                device_rows,
+                location,
+                window,
+                period_label,
+                weighting,
+            ),
+        )
+        st.session_state.report_batch = {
+            "location": location,
+            "period": period_label,
+            "batch_id": batch_id,
+        }
+        status = jobs.batch_status(batch_id)
+        has_zip = status is not None and status.state == "done"
+
+    if status is not None and status.active:
+        render_export_progress(status.batch_id)
+        return
+
+    if status is not None and status.state in ("cancelled", "failed"):
+        st.info("Exportacao interrompida.")
+
+    if has_zip:
+        if status.failed:
+            st.warning(
+                f"{status.failed} relatorio(s) nao foram gerados; "
+                "veja ERROS.txt no ZIP."
+            )
+
+        zip_batch_id = status.batch_id
+
+        st.download_button(
+            "Baixar ZIP",
+            data=lambda: jobs.batch_result(zip_batch_id) or b"",
+            file_name=(
+                f"AXION_{location.replace(' ', '_')}_"
+                f"{period_label.replace(' ', '_')}.zip"
+            ),
+            mime="application/zip",
+            type="primary",
+            width="stretch",
+        )
+
+
 def render_reports(device_rows, channel_configs):
     supabase = get_supabase()
 
@@ -78,14 +303,47 @@ def render_reports(device_rows, channel_configs):
             "30 dias": 30,
         }[period_label]
 
+        report_weighting = st.radio(
+            "Media",
+            REPORT_WEIGHTINGS,
+            format_func=REPORT_WEIGHTING_LABELS.get,
+            horizontal=True,
+            help=(
+                "Ponderada no tempo: cada leitura vale ate a proxima "
+                f"(no maximo {REPORT_MAX_HOLD_SECONDS // 60} min), "
+                "para que rajadas apos reconexao nao dominem a media."
+            ),
+        )
+
+        # Mesma janela para leituras e eventos de alarme.
+        report_window = HistoryWindow.last(period_days)
+
+        history_progress = st.progress(
+            0.0,
+            text="Carregando leituras do período...",
+        )
+
+        def report_history_progress(done, total):
+            history_progress.progress(
+                done / total,
+                text=(
+                    "Carregando leituras do período... "
+                    f"{done}/{total}"
+                ),
+            )
+
         report_history = load_history(
             selected_report_device,
-            period_days,
+            report_window,
+            progress=report_history_progress,
+            timeout=None,
         )
 
+        history_progress.empty()
+
         report_alarm_events = load_alarm_events(
             selected_report_device,
-            period_days,
+            report_window,
         )
 
         selected_rows = device_rows[
@@ -112,6 +370,7 @@ def render_reports(device_rows, channel_configs):
                 report_stats = build_report_statistics(
                     selected_report_device,
                     report_history,
+                    weighting=report_weighting,
                 )
 
                 if report_stats:
@@ -123,12 +382,25 @@ def render_reports(device_rows, channel_configs):
                             "Media": item["media"],
                             "Minimo": item["minimo"],
                             "Maximo": item["maximo"],
+                            "Desvio": item["desvio"],
+                            "P5": item["p5"],
+                            "P50": item["p50"],
+                            "P95": item["p95"],
                             "Ultimo": item["ultimo"],
                             "Leituras": item["leituras"],
                         }
                         for item in report_stats
                     ])
 
+                    if report_weighting == "tempo":
+                        stats_df["Horas cobertas"] = [
+                            item["duracao_s"] / 3600
+                            for item in report_stats
+                        ]
+                        stats_df["Lacunas"] = [
+                            item["lacunas"] for item in report_stats
+                        ]
+
                     st.dataframe(
                         stats_df,
                         width="stretch",
@@ -184,37 +456,12 @@ def render_reports(device_rows, channel_configs):
                         width="stretch",
                     )
 
-                active_configs = []
-
-                for canal_num in range(1, 17):
-                    canal = f"AI{canal_num:03d}"
-
-                    if not is_channel_active(
-                        channel_configs,
-                        selected_report_device,
-                        canal
-                    ):
-                        continue
-
-                    cfg = get_channel_config(
-                        channel_configs,
-                        selected_report_device,
-                        canal
-                    )
-
-                    active_configs.append(
-                        (
-                            canal,
-                            channel_display_name(
-                                cfg,
-                                canal
-                            ),
-                            channel_unit(
-                                cfg,
-                                ""
-                            ),
-                        )
-                    )
+                active_configs = [
+                    (channel.canal, channel.label, channel.unit)
+                    for channel in get_channel_table()
+                    .device(selected_report_device)
+                    .active
+                ]
 
                 if active_configs:
                     for canal, label, unit in active_configs:
@@ -319,29 +566,53 @@ def render_reports(device_rows, channel_configs):
                         hide_index=True,
                     )
 
-                pdf_buffer = generate_service_report_pdf(
+                # O PDF é gerado em segundo plano só quando pedido.
+                report_key = service_report_key(
                     selected_report_device,
+                    report_window,
+                    period_label,
                     report_row,
                     report_history,
-                    period_label,
                     report_alarm_events,
+                    report_weighting,
                 )
 
-                filename = (
-                    f"AXION_"
-                    f"{selected_report_device}_"
-                    f"Relatorio_"
-                    f"{period_label.replace(' ', '_')}.pdf"
+                render_report_job(
+                    selected_report_device,
+                    period_label,
+                    report_key,
+                    lambda: {
+                        "device_id": selected_report_device,
+                        "row": report_row,
+                        "history": report_history,
+                        "period_label": period_label,
+                        "alarm_events": report_alarm_events,
+                        "device_channels": get_channel_table().device(
+                            selected_report_device
+                        ),
+                        "weighting": report_weighting,
+                    },
                 )
 
-                st.download_button(
-                    "Baixar relatorio PDF",
-                    data=pdf_buffer.getvalue(),
-                    file_name=filename,
-                    mime="application/pdf",
-                    type="primary",
-                    width="stretch",
-                )
+        # --------------------------------------------------------
+        # Exportação de um local inteiro
+        # --------------------------------------------------------
+
+        st.markdown("### Exportar relatorios de um local")
+
+        export_location = st.selectbox(
+            "Local",
+            load_locations(),
+            key="report_export_location",
+        )
+
+        render_location_export(
+            device_rows,
+            export_location,
+            report_window,
+            period_label,
+            report_weighting,
+        )
 
     # ============================================================
     # CONFIGURAÇÃO
@@ -22,9 +22,57 @@ from services.analog_inputs import *
 from services.data import *
 from services.analytics import *
 from services.reports import *
+from services.fleet import *
+from services.cache import cache_memory_metrics, request_metrics
+from services.report_jobs import get_report_jobs
 from ui.components import *
 
 
+def render_server_metrics():
+    """Contadores dos caches e serviços compartilhados do processo."""
+    with st.expander("Desempenho do servidor", expanded=False):
+        memory = cache_memory_metrics()
+
+        st.caption(
+            "Memória dos caches: "
+            f"{memory['resident_bytes'] / 1024 ** 2:.1f} MB de "
+            f"{memory['budget_bytes'] / 1024 ** 2:.0f} MB"
+        )
+
+        requests = request_metrics()
+        requests["history"] = get_history_store().metrics()
+
+        st.markdown("**Consultas por cache**")
+        st.dataframe(
+            pd.DataFrame.from_dict(requests, orient="index"),
+            width="stretch",
+        )
+
+        st.markdown("**Status da frota**")
+        st.json(fleet_status_metrics(), expanded=False)
+
+        poller = telemetry_poller_metrics()
+
+        st.markdown("**Poller da frota**")
+
+        if poller is None:
+            st.caption(
+                "Desativado: sem chave de serviço, cada sessão consulta "
+                "com o próprio token."
+            )
+        else:
+            st.json(poller, expanded=False)
+
+        ingest = get_mqtt_ingest()
+
+        if ingest is not None:
+            st.markdown("**MQTT**")
+            st.json(ingest.metrics(), expanded=False)
+
+        st.markdown("**Relatórios**")
+        st.json(get_report_jobs().metrics(), expanded=False)
+
+
 def render_users():
     supabase = get_supabase()
 
@@ -396,6 +444,5 @@ def render_users():
                                 )
                                 st.caption(str(exc))
 
+    render_server_metrics()
     st.stop()
-
-
@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+
+from .utils import *
+from .analog_inputs import convert_channel_array
+
+
+ALARM_COLUMNS = [
+    "Equipamento",
+    "Grandeza",
+    "Valor",
+    "Limite",
+    "Unidade",
+    "Data/Hora",
+]
+
+VIBRATION_AXES = ["x", "y", "z"]
+
+# Ordem dos alarmes de cada leitura: AI001..AI016 (mínimo, máximo) e
+# depois vibração X, Y, Z — a mesma da avaliação linha a linha.
+_VIBRATION_SLOT = 2 * 16
+
+
+def _device_ids(df):
+    if "device_id" in df.columns:
+        return df["device_id"].astype(str).to_numpy()
+
+    return np.full(len(df), "—", dtype=object)
+
+
+def vibration_matrix(df):
+    """Matriz (leituras x eixos X, Y, Z) de vibração em mm/s, NaN se ausente."""
+    return np.column_stack([
+        (
+            pd.to_numeric(df[f"{axis}_mm_s"], errors="coerce")
+            .to_numpy(dtype=np.float64, na_value=np.nan)
+            if f"{axis}_mm_s" in df.columns
+            else np.full(len(df), np.nan)
+        )
+        for axis in VIBRATION_AXES
+    ])
+
+
+class DeviceThresholds:
+    """Canais ativos com limite configurado de um dispositivo."""
+
+    def __init__(self, device):
+        self.device_id = device.device_id
+        self.channels = [
+            channel
+            for channel in device.active
+            if np.isfinite(channel.alarm_min)
+            or np.isfinite(channel.alarm_max)
+        ]
+
+        self.labels = np.array(
+            [channel.label for channel in self.channels], dtype=object
+        )
+        self.units = np.array(
+            [channel.unit for channel in self.channels], dtype=object
+        )
+        self.slots = np.array(
+            [2 * channel.index for channel in self.channels], dtype=np.int64
+        )
+        self.alarm_min = device.alarm_min[
+            [channel.index for channel in self.channels]
+        ]
+        self.alarm_max = device.alarm_max[
+            [channel.index for channel in self.channels]
+        ]
+
+    def values(self, df, rows):
+        """Matriz (leituras x canais) em unidades de engenharia."""
+        columns = []
+
+        for channel in self.channels:
+            if channel.field in df.columns:
+                raw = df[channel.field].iloc[rows]
+            else:
+                raw = np.full(len(rows), np.nan)
+
+            columns.append(
+                convert_channel_array(
+                    raw,
+                    channel.config,
+                    channel.full_scale_v,
+                )
+            )
+
+        return np.column_stack(columns)
+
+
+class AlarmEvaluator:
+    """
+    Limites de alarme compilados para uma versão da configuração
+    (tabela de canais e limite_rms global).
+
+    evaluate() recebe um DataFrame de telemetria de qualquer tamanho —
+    última leitura da frota ou histórico — e compara todas as leituras
+    de uma vez, por dispositivo, com os arrays de limites.
+    """
+
+    def __init__(self, channel_table, vibration_limit, version=None):
+        self.version = version
+        self.channel_table = channel_table
+        self.vibration_limit = safe_float(vibration_limit)
+        self._devices = {
+            device.device_id: DeviceThresholds(device)
+            for device in channel_table
+        }
+
+    def device_blocks(self, df):
+        """
+        Para cada dispositivo de df com canais limitados, devolve
+        (posições das linhas, DeviceThresholds, matriz de valores).
+        """
+        device_ids = _device_ids(df)
+
+        codes, uniques = pd.factorize(device_ids)
+
+        for code, device_id in enumerate(uniques):
+            thresholds = self._devices.get(device_id)
+
+            if thresholds is None or not thresholds.channels:
+                continue
+
+            rows = np.flatnonzero(codes == code)
+            yield rows, thresholds, thresholds.values(df, rows)
+
+    def evaluate(self, df, blocks=None):
+        """
+        Alarmes de todas as leituras de df. blocks: device_blocks(df) já
+        calculado, para não converter os canais de novo.
+        """
+        if df.empty:
+            return pd.DataFrame()
+
+        if blocks is None:
+            blocks = self.device_blocks(df)
+
+        n_rows = len(df)
+
+        device_ids = _device_ids(df)
+
+        if "recebido_em" in df.columns:
+            when = df["recebido_em"].array
+        else:
+            when = pd.array(np.full(n_rows, None, dtype=object))
+
+        row_parts = []
+        slot_parts = []
+        value_parts = []
+        limit_parts = []
+        label_parts = []
+        unit_parts = []
+
+        for rows, thresholds, values in blocks:
+            labels = thresholds.labels
+            units = thresholds.units
+
+            with np.errstate(invalid="ignore"):
+                checks = [
+                    (values < thresholds.alarm_min, thresholds.alarm_min, 0),
+                    (values > thresholds.alarm_max, thresholds.alarm_max, 1),
+                ]
+
+            for hit, limits, side in checks:
+                hit_rows, hit_channels = np.nonzero(hit)
+
+                row_parts.append(rows[hit_rows])
+                slot_parts.append(thresholds.slots[hit_channels] + side)
+                value_parts.append(values[hit_rows, hit_channels])
+                limit_parts.append(limits[hit_channels])
+                label_parts.append(labels[hit_channels])
+                unit_parts.append(units[hit_channels])
+
+        if np.isfinite(self.vibration_limit):
+            vibration = vibration_matrix(df)
+
+            with np.errstate(invalid="ignore"):
+                hit_rows, hit_axes = np.nonzero(
+                    vibration > self.vibration_limit
+                )
+
+            axis_labels = np.array(
+                [f"Vibração {axis.upper()}" for axis in VIBRATION_AXES],
+                dtype=object,
+            )
+
+            row_parts.append(hit_rows)
+            slot_parts.append(_VIBRATION_SLOT + hit_axes)
+            value_parts.append(vibration[hit_rows, hit_axes])
+            limit_parts.append(
+                np.full(len(hit_rows), self.vibration_limit)
+            )
+            label_parts.append(axis_labels[hit_axes])
+            unit_parts.append(
+                np.full(len(hit_rows), "mm/s RMS", dtype=object)
+            )
+
+        if not row_parts:
+            return pd.DataFrame()
+
+        hit_rows = np.concatenate(row_parts)
+
+        if not len(hit_rows):
+            return pd.DataFrame()
+
+        order = np.lexsort((np.concatenate(slot_parts), hit_rows))
+        hit_rows = hit_rows[order]
+
+        return pd.DataFrame({
+            "Equipamento": device_ids[hit_rows],
+            "Grandeza": np.concatenate(label_parts)[order],
+            "Valor": np.concatenate(value_parts)[order],
+            "Limite": np.concatenate(limit_parts)[order],
+            "Unidade": np.concatenate(unit_parts)[order],
+            "Data/Hora": when.take(hit_rows),
+        }, columns=ALARM_COLUMNS)
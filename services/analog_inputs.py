@@ -97,6 +97,181 @@ def convert_channel_value(raw, config, full_scale_v=4.096):
     return raw_to_voltage(raw, full_scale_v)
 
 
+def _as_float_array(raw):
+    """
+    Converte uma coluna RAW para float64, com NaN no lugar de valores
+    ausentes, não numéricos ou infinitos (mesma regra de safe_float).
+    """
+    if isinstance(raw, pd.Series):
+        series = raw
+    else:
+        series = pd.Series(np.asarray(raw).ravel())
+
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors="coerce")
+
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    return np.where(np.isfinite(values), values, np.nan)
+
+
+def raw_to_voltage_array(raw, full_scale_v=4.096):
+    """Versão vetorizada de raw_to_voltage para uma coluna inteira."""
+    raw = _as_float_array(raw)
+    full_scale_v = safe_float(full_scale_v, 4.096)
+
+    if not np.isfinite(full_scale_v):
+        return np.full(raw.shape, np.nan)
+
+    return (raw / 32767.0) * full_scale_v
+
+
+def linear_map_array(values, source_min, source_max, eng_min, eng_max):
+    """Versão vetorizada de linear_map para uma coluna inteira."""
+    values = np.asarray(values, dtype=np.float64)
+    source_min = safe_float(source_min)
+    source_max = safe_float(source_max)
+    eng_min = safe_float(eng_min)
+    eng_max = safe_float(eng_max)
+
+    if not all(np.isfinite(v) for v in [
+        source_min, source_max, eng_min, eng_max
+    ]):
+        return np.full(values.shape, np.nan)
+
+    if source_max == source_min:
+        return np.full(values.shape, np.nan)
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        result = eng_min + (
+            (values - source_min)
+            * (eng_max - eng_min)
+            / (source_max - source_min)
+        )
+
+    return np.where(np.isfinite(values), result, np.nan)
+
+
+def convert_channel_array(raw, config, full_scale_v=4.096):
+    """
+    Converte uma coluna RAW inteira (aiNNN) em unidades de engenharia
+    numa única passada NumPy.
+
+    Produz exatamente os mesmos valores que convert_channel_value
+    aplicado linha a linha, para todos os modos.
+    """
+    if not config:
+        return raw_to_voltage_array(raw, full_scale_v)
+
+    modo = str(config.get("modo") or "raw_voltage").lower()
+
+    if modo == "disabled":
+        return np.full(_as_float_array(raw).shape, np.nan)
+
+    if modo == "raw_voltage":
+        return raw_to_voltage_array(raw, full_scale_v)
+
+    if modo == "linear_raw":
+        return linear_map_array(
+            _as_float_array(raw),
+            config.get("source_min", 0),
+            config.get("source_max", 32767),
+            config.get("eng_min", 0),
+            config.get("eng_max", 100),
+        )
+
+    voltage = raw_to_voltage_array(raw, full_scale_v)
+
+    if modo == "linear_voltage":
+        return linear_map_array(
+            voltage,
+            0.0,
+            3.0,
+            config.get("eng_min", 0),
+            config.get("eng_max", 100),
+        )
+
+    if modo == "linear_4_20ma":
+        shunt = safe_float(config.get("shunt_ohms"), 150.0)
+        if not np.isfinite(shunt) or shunt <= 0:
+            return np.full(voltage.shape, np.nan)
+
+        with np.errstate(over="ignore", invalid="ignore"):
+            current_ma = (voltage / shunt) * 1000.0
+
+        return linear_map_array(
+            current_ma,
+            4.0,
+            20.0,
+            config.get("eng_min", 0),
+            config.get("eng_max", 100),
+        )
+
+    # Compatibilidade com qualquer modo desconhecido.
+    return voltage
+
+
+def channel_affine(config, full_scale_v=4.096):
+    """
+    Coeficientes (ganho, offset) tais que
+    engenharia = ganho * RAW + offset, equivalentes a convert_channel_value.
+
+    Todos os modos são afins no RAW, o que permite converter agregados
+    (média, mínimo, máximo, desvio) sem voltar às leituras.
+    Modo desabilitado ou parâmetros inválidos retornam (nan, nan).
+    """
+    invalid = (np.nan, np.nan)
+    full_scale_v = safe_float(full_scale_v, 4.096)
+
+    if not np.isfinite(full_scale_v):
+        return invalid
+
+    volts_per_count = full_scale_v / 32767.0
+
+    if not config:
+        return volts_per_count, 0.0
+
+    modo = str(config.get("modo") or "raw_voltage").lower()
+
+    if modo == "disabled":
+        return invalid
+
+    if modo == "linear_raw":
+        source_min = safe_float(config.get("source_min", 0))
+        source_max = safe_float(config.get("source_max", 32767))
+        eng_min = safe_float(config.get("eng_min", 0))
+        eng_max = safe_float(config.get("eng_max", 100))
+
+        if not all(np.isfinite(v) for v in [
+            source_min, source_max, eng_min, eng_max
+        ]) or source_max == source_min:
+            return invalid
+
+        gain = (eng_max - eng_min) / (source_max - source_min)
+        return gain, eng_min - source_min * gain
+
+    if modo not in ("linear_voltage", "linear_4_20ma"):
+        return volts_per_count, 0.0
+
+    eng_min = safe_float(config.get("eng_min", 0))
+    eng_max = safe_float(config.get("eng_max", 100))
+
+    if not np.isfinite(eng_min) or not np.isfinite(eng_max):
+        return invalid
+
+    if modo == "linear_voltage":
+        gain = (eng_max - eng_min) / 3.0
+        return volts_per_count * gain, eng_min
+
+    shunt = safe_float(config.get("shunt_ohms"), 150.0)
+    if not np.isfinite(shunt) or shunt <= 0:
+        return invalid
+
+    gain = (eng_max - eng_min) / 16.0
+    ma_per_count = volts_per_count / shunt * 1000.0
+    return ma_per_count * gain, eng_min - 4.0 * gain
+
+
 def is_channel_active(configs, device_id, canal):
     cfg = get_channel_config(
         configs,
@@ -122,3 +297,22 @@ def get_channel_value(row, configs, device_id, canal, full_scale_v=4.096):
     raw = row.get(channel_field(canal))
     return convert_channel_value(raw, cfg, full_scale_v)
 
+
+def get_channel_series(df, configs, device_id, canal, full_scale_v=4.096):
+    """
+    Equivalente colunar de get_channel_value: converte a coluna aiNNN
+    de todo o DataFrame de uma vez e devolve uma Series com o mesmo índice.
+    """
+    cfg = get_channel_config(configs, device_id, canal)
+    field = channel_field(canal)
+
+    if field in df.columns:
+        raw = df[field]
+    else:
+        raw = np.full(len(df), np.nan)
+
+    return pd.Series(
+        convert_channel_array(raw, cfg, full_scale_v),
+        index=df.index,
+        dtype=np.float64,
+    )
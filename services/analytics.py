@@ -8,6 +8,7 @@ from core.constants import *
 from .utils import *
 from .data import *
 from .analog_inputs import *
+from .alarms import vibration_matrix
 
 
 def line_chart(df, columns, labels, title, yaxis):
@@ -159,88 +160,68 @@ def line_chart(df, columns, labels, title, yaxis):
     return fig
 
 
-def health_score(row):
-    if row.get("status") == "Offline":
-        return 0
+def health_scores(df, evaluator=None, blocks=None):
+    """
+    Índice de saúde (0–100) de cada linha de df — frota atual ou
+    histórico de um dispositivo — calculado com NumPy.
 
-    score = 100
-    configs = load_channel_configs()
-    devices = load_devices()
-    global_config = load_global_config()
+    Regras:
+      Offline                                  -> 0
+      AI acima do alarme_max                    -> -20
+      AI acima de 90% do alarme_max             -> -10
+      AI abaixo do alarme_min                   -> -20
+      pico de vibração acima do limite_rms      -> -35
+      pico de vibração acima de 70% do limite   -> -15
 
-    device_id = str(
-        row.get("device_id", "")
-    )
+    blocks: evaluator.device_blocks(df) já calculado (ex.: pelos alarmes).
+    """
+    if df.empty:
+        return pd.Series(index=df.index, dtype=np.int64)
 
-    full_scale = 4.096
-    if not devices.empty:
-        match = devices[
-            devices["device_id"].astype(str) == device_id
-        ]
-        if not match.empty:
-            full_scale = safe_float(
-                match.iloc[0].get("adc_full_scale_v"),
-                4.096
-            )
+    if evaluator is None:
+        evaluator = get_alarm_evaluator()
 
-    # Alarmes das entradas configuradas.
-    for canal_num in range(1, 17):
-        canal = f"AI{canal_num:03d}"
-        cfg = get_channel_config(
-            configs,
-            device_id,
-            canal
-        )
+    if blocks is None:
+        blocks = evaluator.device_blocks(df)
 
-        if not cfg or not bool(cfg.get("ativo", True)):
-            continue
+    score = np.full(len(df), 100, dtype=np.int64)
 
-        value = get_channel_value(
-            row,
-            configs,
-            device_id,
-            canal,
-            full_scale
-        )
+    for rows, thresholds, values in blocks:
+        with np.errstate(invalid="ignore"):
+            over = values > thresholds.alarm_max
+            near = ~over & (values > thresholds.alarm_max * 0.9)
+            under = values < thresholds.alarm_min
 
-        if not np.isfinite(value):
-            continue
+        score[rows] -= (
+            20 * over.sum(axis=1)
+            + 10 * near.sum(axis=1)
+            + 20 * under.sum(axis=1)
+        )
 
-        alarm_min = safe_float(cfg.get("alarme_min"))
-        alarm_max = safe_float(cfg.get("alarme_max"))
+    vib_limit = evaluator.vibration_limit
 
-        if np.isfinite(alarm_max):
-            if value > alarm_max:
-                score -= 20
-            elif value > alarm_max * 0.9:
-                score -= 10
+    if np.isfinite(vib_limit):
+        vibration = vibration_matrix(df)
+        finite = np.isfinite(vibration)
+        peak = np.where(finite, vibration, -np.inf).max(axis=1)
 
-        if np.isfinite(alarm_min) and value < alarm_min:
-            score -= 20
+        score -= np.where(
+            peak > vib_limit,
+            35,
+            np.where(peak > vib_limit * 0.7, 15, 0),
+        )
 
-    vibration = [
-        safe_float(row.get(f"{a}_mm_s"))
-        for a in ["x", "y", "z"]
-    ]
-    vibration = [
-        v for v in vibration
-        if np.isfinite(v)
-    ]
+    score = np.clip(score, 0, 100)
 
-    vib_limit = safe_float(
-        global_config.get("limite_rms")
-    )
+    if "status" in df.columns:
+        score[(df["status"] == "Offline").to_numpy()] = 0
 
-    if vibration and np.isfinite(vib_limit):
-        peak = max(vibration)
+    return pd.Series(score, index=df.index, dtype=np.int64)
 
-        if peak > vib_limit:
-            score -= 35
-        elif peak > vib_limit * 0.7:
-            score -= 15
 
+def health_score(row):
     return int(
-        max(0, min(100, score))
+        health_scores(pd.DataFrame([row])).iloc[0]
     )
 
 
@@ -251,3 +232,161 @@ def health_color(score):
         return "#f59e0b"
     return "#ef4444"
 
+
+
+STATISTICS_PERCENTILES = (5, 50, 95)
+
+
+def series_statistics(values):
+    """
+    Estatísticas de cada série de values (uma série por linha, leituras
+    nas colunas), ignorando NaN, calculadas para todas as séries de uma
+    vez.
+
+    Uma única ordenação por série fornece mínimo, máximo e os percentis
+    (interpolação linear, como np.percentile); média e desvio padrão
+    amostral saem de somas vetorizadas. Com as leituras contíguas em cada
+    linha a ordenação é bem mais rápida que por coluna.
+
+    Retorna dict de arrays com uma posição por série: leituras, media,
+    desvio, minimo, maximo, p5, p50, p95 e ultimo (última leitura válida).
+    Séries sem leituras ficam com NaN.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n_series, n_readings = values.shape
+    rows = np.arange(n_series)
+
+    # NaN vão para o fim de cada série: as leituras válidas ficam no
+    # início de cada linha de ordered.
+    ordered = np.sort(values, axis=1)
+
+    if not n_readings:
+        ordered = np.full((n_series, 1), np.nan)
+
+    missing = np.isnan(ordered)
+    count = (~missing).sum(axis=1)
+    empty = count == 0
+    top = np.maximum(count - 1, 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centered = np.where(missing, 0.0, ordered)
+        mean = centered.sum(axis=1) / count
+        centered -= mean[:, None]
+        centered[missing] = 0.0
+        std = np.sqrt(
+            np.einsum("ij,ij->i", centered, centered) / (count - 1)
+        )
+
+    std[count < 2] = np.nan
+
+    stats = {
+        "leituras": count,
+        "media": mean,
+        "desvio": std,
+        "minimo": ordered[:, 0].copy(),
+        "maximo": ordered[rows, top],
+    }
+
+    for percentile in STATISTICS_PERCENTILES:
+        position = percentile / 100 * top
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, top)
+        fraction = position - low
+        low_value = ordered[rows, low]
+        high_value = ordered[rows, high]
+
+        with np.errstate(invalid="ignore"):
+            stats[f"p{percentile}"] = np.where(
+                fraction > 0,
+                low_value + (high_value - low_value) * fraction,
+                low_value,
+            )
+
+    if n_readings:
+        valid = ~np.isnan(values[:, ::-1])
+        last = n_readings - 1 - np.argmax(valid, axis=1)
+        stats["ultimo"] = values[rows, last]
+    else:
+        stats["ultimo"] = np.full(n_series, np.nan)
+
+    for name, array in stats.items():
+        if name != "leituras":
+            array[empty] = np.nan
+
+    return stats
+
+
+def time_weighted_statistics(seconds, values, max_hold, end=None):
+    """
+    Média e desvio padrão de cada série de values (uma série por linha,
+    como em series_statistics) ponderados pela duração de cada leitura.
+
+    seconds traz o instante de cada coluna, em segundos. Cada leitura
+    válida vale até a próxima leitura válida da mesma série, no máximo
+    max_hold segundos; intervalos maiores contam como lacuna e não
+    arrastam o último valor. A última leitura vale até end (segundos) ou,
+    sem end, encerra o período.
+
+    Retorna dict de arrays com uma posição por série: media, desvio
+    (populacional, ponderado), duracao_s (tempo coberto) e lacunas
+    (intervalos acima de max_hold). Séries em que nenhuma leitura tem
+    duração usam a média simples.
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n_series, n_readings = values.shape
+
+    if not n_readings:
+        empty = np.full(n_series, np.nan)
+        return {
+            "media": empty,
+            "desvio": empty.copy(),
+            "duracao_s": np.zeros(n_series),
+            "lacunas": np.zeros(n_series, dtype=np.int64),
+        }
+
+    # Relógio do dispositivo pode vir fora de ordem.
+    if np.any(seconds[1:] < seconds[:-1]):
+        order = np.argsort(seconds, kind="stable")
+        seconds = seconds[order]
+        values = values[:, order]
+
+    valid = ~np.isnan(values)
+    close = seconds[-1] if end is None else max(float(end), seconds[-1])
+
+    # Instante da próxima leitura válida de cada série: mínimo acumulado
+    # da direita para a esquerda, deslocado de uma posição.
+    following = np.where(valid, seconds, np.inf)
+    following = np.minimum.accumulate(following[:, ::-1], axis=1)[:, ::-1]
+    following = np.concatenate(
+        [following[:, 1:], np.full((n_series, 1), np.inf)],
+        axis=1,
+    )
+    following[np.isinf(following)] = close
+
+    gap = np.maximum(following - seconds, 0.0)
+    weight = np.where(valid, np.minimum(gap, max_hold), 0.0)
+    lacunas = (valid & (gap > max_hold)).sum(axis=1)
+
+    filled = np.where(valid, values, 0.0)
+    total = weight.sum(axis=1)
+    count = valid.sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(
+            total > 0,
+            np.einsum("ij,ij->i", weight, filled) / total,
+            filled.sum(axis=1) / count,
+        )
+        filled -= mean[:, None]
+        variance = np.einsum("ij,ij,ij->i", weight, filled, filled) / total
+
+    std = np.sqrt(variance)
+    std[total <= 0] = np.nan
+
+    return {
+        "media": mean,
+        "desvio": std,
+        "duracao_s": total,
+        "lacunas": lacunas,
+    }
@@ -0,0 +1,608 @@
+import contextlib
+import copy
+import functools
+import hashlib
+import itertools
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+
+import pandas as pd
+from streamlit.runtime.scriptrunner import (
+    add_script_run_ctx,
+    get_script_run_ctx,
+)
+from streamlit.runtime.scriptrunner_utils.script_run_context import (
+    SCRIPT_RUN_CONTEXT_ATTR_NAME,
+)
+
+from core.constants import *
+from .cache_governor import estimate_nbytes, governor
+from .shared_frames import frame_view, share_frame
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=CACHE_REFRESH_WORKERS,
+    thread_name_prefix="axion-cache",
+)
+
+_registry = []
+_flights = {}
+_flights_lock = threading.Lock()
+
+# Marca as threads que estão executando um loader: loaders chamados de
+# dentro de outro rodam na mesma thread, sem ocupar outro worker.
+_loading = threading.local()
+
+# Versão de cada valor guardado, única no processo (ver SwrLoader.versioned).
+_versions = itertools.count(1)
+
+
+@contextlib.contextmanager
+def session_context(ctx):
+    """
+    Executa o bloco com o contexto de sessão ctx na thread atual (de um
+    pool) e restaura o anterior ao sair, para que a próxima tarefa da
+    mesma thread não use a sessão — e o cliente Supabase — de outra.
+    """
+    thread = threading.current_thread()
+    previous = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+
+    if ctx is not None:
+        add_script_run_ctx(thread, ctx)
+
+    try:
+        yield
+    finally:
+        setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous)
+
+
+def _session_id():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return None if ctx is None else ctx.session_id
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Uma única execução em andamento por chave, para todo o processo.
+
+    Quem chama do() enquanto a mesma chave está rodando espera e recebe o
+    mesmo resultado (ou a mesma exceção), sem repetir a consulta.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._metrics = {
+            "requests": 0,
+            "executions": 0,
+            "coalesced": 0,
+        }
+
+    def do(self, key, fn):
+        with self._lock:
+            self._metrics["requests"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._metrics["executions"] += 1
+            else:
+                self._metrics["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            call.done.set()
+
+        return call.result
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics)
+
+
+def single_flight(name):
+    """SingleFlight compartilhado do processo com este nome."""
+    with _flights_lock:
+        flight = _flights.get(name)
+
+        if flight is None:
+            flight = SingleFlight(name)
+            _flights[name] = flight
+
+        return flight
+
+
+@dataclass(frozen=True)
+class CacheStatus:
+    """Situação de uma entrada do cache, para avisos na interface."""
+    loader: str
+    label: str
+    has_value: bool
+    stale: bool
+    age_seconds: float
+    refreshing: bool
+    breaker_open: bool
+    error: str | None
+
+
+class _Entry:
+    __slots__ = (
+        "value",
+        "has_value",
+        "fetched_at",
+        "error",
+        "future",
+        "nbytes",
+        "sessions",
+        "version",
+    )
+
+    def __init__(self):
+        self.value = None
+        self.has_value = False
+        self.fetched_at = 0.0
+        self.error = None
+        self.future = None
+        self.nbytes = 0
+        # Sessões que pediram esta entrada (avisos de cache_issues).
+        self.sessions = set()
+        self.version = 0
+
+
+class CircuitBreaker:
+    """
+    Abre após failures falhas seguidas; enquanto aberto nenhuma consulta
+    é feita. Depois de cooldown segundos libera uma tentativa.
+    """
+
+    def __init__(self, failures, cooldown):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at = None
+
+    def is_open(self):
+        if self.opened_at is None:
+            return False
+
+        return time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self):
+        return not self.is_open()
+
+    def success(self):
+        self.consecutive = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.consecutive += 1
+
+        if self.consecutive >= self.failures:
+            self.opened_at = time.monotonic()
+
+
+def _read_value(value):
+    """
+    DataFrames ficam guardados somente leitura e cada chamada recebe uma
+    cópia rasa; os demais valores (dicts de configuração) são copiados.
+    """
+    if isinstance(value, pd.DataFrame):
+        return frame_view(value)
+
+    return copy.deepcopy(value)
+
+
+def _make_key(args, kwargs):
+    payload = pickle.dumps(
+        (args, sorted(kwargs.items())),
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+    return hashlib.sha1(payload).hexdigest()
+
+
+class SwrLoader:
+    """
+    Cache stale-while-revalidate de um loader.
+
+    - Valor dentro do ttl: devolvido direto.
+    - Valor vencido: devolvido na hora (stale) e uma única atualização
+      roda em segundo plano.
+    - Sem valor: espera a consulta no máximo timeout segundos; se não
+      terminar, devolve default() e a consulta continua em segundo plano.
+    - Falhas seguidas abrem o circuit breaker: o banco deixa de ser
+      consultado por um tempo e o último valor bom continua sendo usado.
+    - DataFrames são guardados somente leitura (services.shared_frames)
+      e cada chamada recebe uma cópia rasa, sem copiar os dados.
+    - Cada valor é medido em bytes e entra no orçamento global de memória
+      (services.cache_governor); max_entries limita as chaves por loader.
+    - Chamado de dentro de outro loader, roda na mesma thread (sem
+      esperar por um worker livre) e propaga a exceção em vez de
+      devolver default().
+    - Enquanto enabled() for falso (ex.: sessão sem cliente Supabase),
+      devolve default() sem consultar nem guardar nada.
+    - versioned() devolve também a versão do valor, que muda a cada
+      consulta guardada: serve de chave para o que é derivado dele.
+
+    O loader deve levantar exceção em caso de erro (sem st.error); a
+    falha fica registrada em status().
+    """
+
+    def __init__(
+        self,
+        func,
+        ttl,
+        timeout,
+        default,
+        label,
+        max_entries,
+        enabled=None,
+    ):
+        functools.update_wrapper(self, func)
+        self.name = func.__name__
+        self._func = func
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.label = label
+        self._default = default
+        self._enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+        self._breaker = CircuitBreaker(
+            CACHE_BREAKER_FAILURES,
+            CACHE_BREAKER_COOLDOWN_SECONDS,
+        )
+        self._metrics = {
+            "requests": 0,
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "executions": 0,
+            "coalesced": 0,
+        }
+
+    def __call__(self, *args, **kwargs):
+        return self.versioned(*args, **kwargs)[0]
+
+    def versioned(self, *args, **kwargs):
+        """
+        (valor, versão). A versão é None quando o valor é default(), que
+        não está no cache e não deve ser guardado por quem o deriva.
+        """
+        if self._enabled is not None and not self._enabled():
+            return self._default(), None
+
+        key = _make_key(args, kwargs)
+        nested = getattr(_loading, "active", False)
+        session_id = _session_id()
+
+        with self._lock:
+            self._metrics["requests"] += 1
+            entry = self._entries.get(key)
+
+            if entry is None:
+                entry = _Entry()
+                self._entries[key] = entry
+
+            if session_id is not None:
+                entry.sessions.add(session_id)
+
+            fresh = (
+                entry.has_value
+                and time.monotonic() - entry.fetched_at < self.ttl
+            )
+
+            if fresh:
+                self._metrics["hits"] += 1
+                governor.touch(self, key)
+                return _read_value(entry.value), entry.version
+
+            if entry.has_value:
+                self._metrics["stale_hits"] += 1
+                governor.touch(self, key)
+            else:
+                self._metrics["misses"] += 1
+
+            if nested and not entry.has_value:
+                self._metrics["executions"] += 1
+                generation = self._generation
+                future = None
+            else:
+                future = self._refresh(key, entry, args, kwargs)
+
+        with self._lock:
+            if entry.has_value:
+                return _read_value(entry.value), entry.version
+
+        if nested:
+            value = self._load(key, entry, generation, args, kwargs)
+
+            with self._lock:
+                version = entry.version if entry.value is value else None
+
+            return _read_value(value), version
+
+        if future is not None:
+            try:
+                future.result(timeout=self.timeout)
+            except FutureTimeout:
+                pass
+            except Exception:
+                pass
+
+        with self._lock:
+            if entry.has_value:
+                return _read_value(entry.value), entry.version
+
+        return self._default(), None
+
+    def _refresh(self, key, entry, args, kwargs):
+        """
+        Agenda a atualização de key (chamar com self._lock). Se já há uma
+        em andamento — de qualquer sessão —, reaproveita a mesma.
+        """
+        if entry.future is not None:
+            self._metrics["coalesced"] += 1
+            return entry.future
+
+        if not self._breaker.allow():
+            return None
+
+        self._metrics["executions"] += 1
+
+        entry.future = _executor.submit(
+            self._run,
+            key,
+            entry,
+            self._generation,
+            get_script_run_ctx(suppress_warning=True),
+            args,
+            kwargs,
+        )
+        return entry.future
+
+    def _run(self, key, entry, generation, ctx, args, kwargs):
+        # O loader usa o cliente Supabase da sessão que pediu a consulta.
+        try:
+            with session_context(ctx):
+                return self._load(key, entry, generation, args, kwargs)
+        finally:
+            with self._lock:
+                entry.future = None
+
+    def _load(self, key, entry, generation, args, kwargs):
+        """Executa o loader na thread atual e guarda o resultado."""
+        active = getattr(_loading, "active", False)
+        _loading.active = True
+
+        try:
+            value = self._func(*args, **kwargs)
+        except Exception as exc:
+            with self._lock:
+                entry.error = str(exc) or type(exc).__name__
+                self._breaker.failure()
+            raise
+        finally:
+            _loading.active = active
+
+        if isinstance(value, pd.DataFrame):
+            value = share_frame(value)
+
+        nbytes = estimate_nbytes(value)
+
+        with self._lock:
+            if generation != self._generation:
+                return value
+
+            entry.value = value
+            entry.has_value = True
+            entry.fetched_at = time.monotonic()
+            entry.error = None
+            entry.nbytes = nbytes
+            entry.version = next(_versions)
+            self._breaker.success()
+
+            # Entrada descartada pelo orçamento durante a consulta: quem
+            # esperava recebe o valor, mas ele não volta ao cache.
+            if self._entries.get(key) is entry:
+                governor.charge(self, key, nbytes)
+                self._evict()
+
+        governor.enforce()
+        return value
+
+    def _evict(self):
+        """Descarta as entradas mais antigas além de max_entries."""
+        excess = len(self._entries) - self.max_entries
+
+        if excess <= 0:
+            return
+
+        idle = sorted(
+            (
+                (entry.fetched_at, key)
+                for key, entry in self._entries.items()
+                if entry.future is None
+            ),
+        )
+
+        for _, key in idle[:excess]:
+            del self._entries[key]
+            governor.release(self, key)
+
+        governor.record_eviction(self, min(excess, len(idle)))
+
+    def drop(self, key):
+        """Descarte pedido pelo orçamento de memória."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            governor.release_all(self)
+
+    def status(self, *args, **kwargs):
+        with self._lock:
+            entry = self._entries.get(_make_key(args, kwargs))
+
+            if entry is None:
+                return None
+
+            return self._status(entry)
+
+    def _status(self, entry):
+        age = (
+            time.monotonic() - entry.fetched_at
+            if entry.has_value
+            else float("inf")
+        )
+
+        return CacheStatus(
+            loader=self.__name__,
+            label=self.label,
+            has_value=entry.has_value,
+            stale=age >= self.ttl,
+            age_seconds=age,
+            refreshing=entry.future is not None,
+            breaker_open=self._breaker.is_open(),
+            error=entry.error,
+        )
+
+    def metrics(self):
+        memory = governor.metrics().get(self.name, {})
+
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        metrics["entries"] = memory.get("entries", 0)
+        metrics["resident_bytes"] = memory.get("resident_bytes", 0)
+        metrics["evictions"] = memory.get("evictions", 0)
+        return metrics
+
+    def statuses(self, session_id=None):
+        """Situação das entradas (só as pedidas por session_id, se dado)."""
+        with self._lock:
+            return [
+                self._status(entry)
+                for entry in self._entries.values()
+                if session_id is None or session_id in entry.sessions
+            ]
+
+
+def swr_cache(
+    ttl,
+    default,
+    label,
+    timeout=CACHE_LOAD_TIMEOUT_SECONDS,
+    max_entries=64,
+    enabled=None,
+):
+    """Decorador: ver SwrLoader."""
+
+    def decorator(func):
+        loader = SwrLoader(
+            func,
+            ttl,
+            timeout,
+            default,
+            label,
+            max_entries,
+            enabled,
+        )
+        _registry.append(loader)
+        return loader
+
+    return decorator
+
+
+def clear_loader_caches():
+    for loader in _registry:
+        loader.clear()
+
+
+def request_metrics():
+    """
+    Contadores por loader e por SingleFlight: requests, executions
+    (consultas de fato ao banco) e coalesced (pedidos que aguardaram uma
+    consulta idêntica já em andamento). Nos loaders também hits, misses,
+    evictions e resident_bytes.
+    """
+    metrics = {
+        loader.__name__: loader.metrics()
+        for loader in _registry
+    }
+
+    with _flights_lock:
+        flights = list(_flights.values())
+
+    for flight in flights:
+        metrics[flight.name] = flight.metrics()
+
+    return metrics
+
+
+def cache_memory_metrics():
+    """
+    Uso de memória de todos os caches do orçamento: por cache, entries,
+    resident_bytes e evictions, mais o total e o limite.
+    """
+    return {
+        "budget_bytes": governor.budget_bytes,
+        "resident_bytes": governor.resident_bytes(),
+        "caches": governor.metrics(),
+    }
+
+
+def cache_issues(session_id=None):
+    """
+    Entradas pedidas pela sessão atual (ou por session_id) que estão
+    sendo servidas vencidas por falha/lentidão do banco, ou que ainda
+    não têm valor.
+    """
+    session_id = session_id or _session_id()
+    issues = []
+
+    if session_id is None:
+        return issues
+
+    for loader in _registry:
+        for status in loader.statuses(session_id):
+            if status.error or status.breaker_open or not status.has_value:
+                issues.append(status)
+            elif status.age_seconds >= 2 * loader.ttl:
+                issues.append(status)
+
+    return issues
@@ -0,0 +1,185 @@
+"""
+Orçamento de memória dos caches do processo.
+
+Cada cache participante (loaders SWR de services.cache e os buffers de
+services.history_store) informa o tamanho em bytes de cada valor guardado.
+O governador mantém uma única fila LRU com todas as entradas e, quando o
+total passa de CACHE_MEMORY_BUDGET_MB, pede ao dono de cada entrada menos
+usada que a descarte.
+
+Ordem de locks: o dono pode chamar o governador segurando o próprio lock;
+o governador nunca chama o dono segurando o dele.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from core.constants import *
+
+
+def _object_nbytes(values, sample=1000):
+    """Objetos Python de um array object, estimados por amostragem."""
+    if not len(values):
+        return 0
+
+    step = max(1, len(values) // sample)
+    picked = values[::step]
+    return int(
+        sum(sys.getsizeof(item) for item in picked)
+        / len(picked)
+        * len(values)
+    )
+
+
+def estimate_nbytes(value, _depth=0):
+    """
+    Tamanho aproximado de value em memória, em bytes.
+
+    Colunas object são estimadas por amostragem (memory_usage(deep=True)
+    percorre todos os objetos e não aceita arrays somente leitura).
+    """
+    if isinstance(value, pd.DataFrame):
+        size = int(value.memory_usage(index=True, deep=False).sum())
+
+        for position in range(value.shape[1]):
+            column = value.iloc[:, position]
+
+            if column.dtype == object:
+                size += _object_nbytes(column.to_numpy())
+
+        return size
+
+    if isinstance(value, (pd.Series, pd.Index)):
+        size = int(value.memory_usage(deep=False))
+
+        if value.dtype == object:
+            size += _object_nbytes(value.to_numpy())
+
+        return size
+
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+
+    size = sys.getsizeof(value)
+
+    if _depth >= 4:
+        return size
+
+    if isinstance(value, dict):
+        size += sum(
+            estimate_nbytes(key, _depth + 1)
+            + estimate_nbytes(item, _depth + 1)
+            for key, item in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_nbytes(item, _depth + 1) for item in value)
+
+    return size
+
+
+class CacheGovernor:
+    """
+    Teto de memória com despejo LRU entre todos os caches.
+
+    O dono registra entradas com charge(), marca uso com touch() e avisa
+    descartes próprios com release(). Depois de charge(), enforce() (fora
+    do lock do dono) despeja as entradas menos usadas chamando
+    owner.drop(key).
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._owners = {}
+        self._resident = 0
+        self._metrics = {}
+
+    def _owner_metrics(self, owner):
+        metrics = self._metrics.get(owner.name)
+
+        if metrics is None:
+            metrics = {
+                "entries": 0,
+                "resident_bytes": 0,
+                "evictions": 0,
+            }
+            self._metrics[owner.name] = metrics
+            self._owners[owner.name] = owner
+
+        return metrics
+
+    def charge(self, owner, key, nbytes):
+        with self._lock:
+            self._release(owner, key)
+            metrics = self._owner_metrics(owner)
+            self._entries[(owner.name, key)] = nbytes
+            self._resident += nbytes
+            metrics["entries"] += 1
+            metrics["resident_bytes"] += nbytes
+
+    def touch(self, owner, key):
+        with self._lock:
+            if (owner.name, key) in self._entries:
+                self._entries.move_to_end((owner.name, key))
+
+    def release(self, owner, key):
+        with self._lock:
+            self._release(owner, key)
+
+    def _release(self, owner, key):
+        nbytes = self._entries.pop((owner.name, key), None)
+
+        if nbytes is None:
+            return None
+
+        metrics = self._metrics[owner.name]
+        self._resident -= nbytes
+        metrics["entries"] -= 1
+        metrics["resident_bytes"] -= nbytes
+        return nbytes
+
+    def release_all(self, owner):
+        with self._lock:
+            for name, key in list(self._entries):
+                if name == owner.name:
+                    self._release(owner, key)
+
+    def record_eviction(self, owner, count=1):
+        with self._lock:
+            self._owner_metrics(owner)["evictions"] += count
+
+    def enforce(self):
+        """Despeja entradas menos usadas até caber no orçamento."""
+        victims = []
+
+        with self._lock:
+            while self._resident > self.budget_bytes and self._entries:
+                (name, key), _ = next(iter(self._entries.items()))
+                owner = self._owners[name]
+                self._release(owner, key)
+                self._metrics[name]["evictions"] += 1
+                victims.append((owner, key))
+
+        for owner, key in victims:
+            owner.drop(key)
+
+        return len(victims)
+
+    def resident_bytes(self):
+        with self._lock:
+            return self._resident
+
+    def metrics(self):
+        """Por cache: entries, resident_bytes e evictions."""
+        with self._lock:
+            return {
+                name: dict(metrics)
+                for name, metrics in self._metrics.items()
+            }
+
+
+governor = CacheGovernor(CACHE_MEMORY_BUDGET_MB * 1024 * 1024)
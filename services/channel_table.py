@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+
+from .utils import *
+from .analog_inputs import *
+
+
+CHANNEL_COUNT = 16
+
+# Códigos de public.configuracao_analogica.modo (modo desconhecido = raw_voltage).
+CHANNEL_MODES = (
+    "raw_voltage",
+    "linear_raw",
+    "linear_voltage",
+    "linear_4_20ma",
+    "disabled",
+)
+
+
+def _readonly(values, dtype):
+    array = np.array(values, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+
+class ChannelInfo:
+    """Configuração já interpretada de uma AI de um dispositivo."""
+
+    __slots__ = (
+        "canal",
+        "index",
+        "field",
+        "config",
+        "active",
+        "mode",
+        "label",
+        "unit",
+        "decimals",
+        "gain",
+        "offset",
+        "eng_min",
+        "eng_max",
+        "alarm_min",
+        "alarm_max",
+        "show_gauge",
+        "full_scale_v",
+    )
+
+    def __init__(self, canal, config, full_scale_v):
+        self.canal = canal
+        self.index = int(canal[2:]) - 1
+        self.field = channel_field(canal)
+        self.config = config
+        self.active = bool(config) and bool(config.get("ativo", True))
+        self.full_scale_v = full_scale_v
+
+        modo = str(config.get("modo") or "raw_voltage").lower()
+        self.mode = (
+            CHANNEL_MODES.index(modo)
+            if modo in CHANNEL_MODES
+            else 0
+        )
+
+        self.label = channel_display_name(config, canal)
+        self.unit = channel_unit(config, "")
+        self.decimals = int(safe_float(config.get("decimais"), 2))
+        self.gain, self.offset = channel_affine(config, full_scale_v)
+        self.eng_min = safe_float(config.get("eng_min"), 0)
+        self.eng_max = safe_float(config.get("eng_max"), 100)
+        self.alarm_min = safe_float(config.get("alarme_min"))
+        self.alarm_max = safe_float(config.get("alarme_max"))
+        self.show_gauge = bool(config.get("exibir_gauge", True))
+
+    def value(self, row):
+        """
+        Valor de engenharia de uma leitura: a mesma conversão de
+        get_channel_value e dos alarmes, bit a bit. gain/offset ficam para
+        os agregados (rollups), onde a forma afim é necessária.
+        """
+        return convert_channel_value(
+            row.get(self.field),
+            self.config,
+            self.full_scale_v,
+        )
+
+    def series(self, df):
+        """Coluna inteira convertida (mesmo que get_channel_series)."""
+        if self.field in df.columns:
+            raw = df[self.field]
+        else:
+            raw = np.full(len(df), np.nan)
+
+        return pd.Series(
+            convert_channel_array(raw, self.config, self.full_scale_v),
+            index=df.index,
+            dtype=np.float64,
+        )
+
+
+class DeviceChannels:
+    """
+    As 16 AI de um dispositivo: registros ChannelInfo e arrays somente
+    leitura (máscara de ativas, modo, ganho/offset, limites, decimais).
+    """
+
+    __slots__ = (
+        "device_id",
+        "full_scale_v",
+        "channels",
+        "active",
+        "active_mask",
+        "mode",
+        "gain",
+        "offset",
+        "alarm_min",
+        "alarm_max",
+        "decimals",
+    )
+
+    def __init__(self, device_id, configs, full_scale_v=4.096):
+        self.device_id = str(device_id)
+        self.full_scale_v = full_scale_v
+        self.channels = tuple(
+            ChannelInfo(
+                f"AI{canal_num:03d}",
+                get_channel_config(
+                    configs,
+                    self.device_id,
+                    f"AI{canal_num:03d}",
+                ),
+                full_scale_v,
+            )
+            for canal_num in range(1, CHANNEL_COUNT + 1)
+        )
+        self.active = tuple(
+            channel
+            for channel in self.channels
+            if channel.active
+        )
+
+        self.active_mask = _readonly(
+            [channel.active for channel in self.channels], bool
+        )
+        self.mode = _readonly(
+            [channel.mode for channel in self.channels], np.int8
+        )
+        self.gain = _readonly(
+            [channel.gain for channel in self.channels], np.float64
+        )
+        self.offset = _readonly(
+            [channel.offset for channel in self.channels], np.float64
+        )
+        self.alarm_min = _readonly(
+            [channel.alarm_min for channel in self.channels], np.float64
+        )
+        self.alarm_max = _readonly(
+            [channel.alarm_max for channel in self.channels], np.float64
+        )
+        self.decimals = _readonly(
+            [channel.decimals for channel in self.channels], np.int16
+        )
+
+    def channel(self, canal):
+        return self.channels[int(str(canal)[2:]) - 1]
+
+    def is_active(self, canal):
+        return self.channel(canal).active
+
+    def active_names(self, last=CHANNEL_COUNT):
+        """Nomes das AI ativas até AI{last:03d}."""
+        return [
+            channel.canal
+            for channel in self.active
+            if channel.index < last
+        ]
+
+
+class ChannelTable:
+    """
+    Tabela compilada de configuracao_analogica para uma versão da
+    configuração. Montada uma vez e compartilhada; não deve ser alterada.
+    """
+
+    __slots__ = ("version", "_devices", "_full_scales")
+
+    def __init__(self, configs, full_scales, version=None):
+        self.version = version
+        self._full_scales = dict(full_scales)
+        device_ids = {
+            device_id
+            for device_id, _ in configs
+        } | set(self._full_scales)
+
+        self._devices = {
+            device_id: DeviceChannels(
+                device_id,
+                configs,
+                self._full_scales.get(device_id, 4.096),
+            )
+            for device_id in device_ids
+        }
+
+    def device(self, device_id):
+        device = self._devices.get(str(device_id))
+
+        if device is None:
+            # Dispositivo sem cadastro nem configuração: AI em volts.
+            device = DeviceChannels(device_id, {})
+
+        return device
+
+    def __iter__(self):
+        return iter(self._devices.values())
@@ -1,58 +1,220 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
+import hashlib
 import json
 import math
+import time
+from types import MappingProxyType
 import numpy as np
 import pandas as pd
 import streamlit as st
+from streamlit.runtime.scriptrunner import (
+    add_script_run_ctx,
+    get_script_run_ctx,
+)
 from supabase import create_client
 
+from core.config import get_service_supabase
 from core.constants import *
 from .utils import *
 from .analog_inputs import *
+from .alarms import AlarmEvaluator
+from .channel_table import ChannelTable
+from .cache import swr_cache
+from .history_store import get_history_store
+from .poller import FleetSnapshot, start_poller
+from .mqtt_ingest import start_mqtt_ingest
+from .windows import *
+from .shared_frames import frame_view, share_frame
 
 
-_supabase_client = None
-
 def set_supabase_client(client):
-    global _supabase_client
-    _supabase_client = client
+    """
+    Registra o cliente da sessão atual. Fica em st.session_state, então
+    cada sessão consulta com o próprio token; threads de fundo recebem o
+    cliente explicitamente.
+    """
+    st.session_state.data_client = client
+
 
 def get_supabase():
-    return _supabase_client
+    return st.session_state.get("data_client")
+
+
+def session_identity():
+    """Usuário da sessão: escopo dos buffers de histórico."""
+    profile = st.session_state.get("user_profile") or {}
+    return profile.get("id")
+
+
+def _has_client():
+    """Loaders só consultam (e guardam) com um cliente na sessão."""
+    return get_supabase() is not None
+
+
+# Esquema de public.telemetria usado pelas consultas.
+# id identifica a leitura (deduplicação); vários registros podem ter o
+# mesmo recebido_em.
+TELEMETRY_TIME_COLUMNS = [
+    "id",
+    "device_id",
+    "timestamp_dispositivo",
+    "recebido_em",
+]
+
+TELEMETRY_AI_FIELDS = [
+    "ai001", "ai002", "ai003", "ai004",
+    "ai005", "ai006", "ai007", "ai008",
+]
+
+TELEMETRY_VIBRATION_COLUMNS = [
+    "x_mm_s", "x_rms",
+    "y_mm_s", "y_rms",
+    "z_mm_s", "z_rms",
+]
+
+
+def telemetry_columns(configs, device_id=None):
+    """
+    Colunas de telemetria realmente usadas: tempo, vibração e somente as
+    aiNNN ativas em configuracao_analogica (de um dispositivo ou da frota).
+    """
+    active_fields = {
+        channel_field(canal)
+        for (cfg_device, canal), cfg in configs.items()
+        if (device_id is None or cfg_device == str(device_id))
+        and bool(cfg.get("ativo", True))
+    }
+
+    return (
+        TELEMETRY_TIME_COLUMNS
+        + [
+            field
+            for field in TELEMETRY_AI_FIELDS
+            if field in active_fields
+        ]
+        + TELEMETRY_VIBRATION_COLUMNS
+    )
+
+
+def _decode_float32(values):
+    try:
+        return np.array(values, dtype=np.float32)
+    except (TypeError, ValueError):
+        return pd.to_numeric(
+            pd.Series(values, dtype=object),
+            errors="coerce",
+        ).to_numpy(dtype=np.float32, na_value=np.nan)
+
 
-@st.cache_data(ttl=60)
+def _decode_adc(values):
+    """
+    Contagens do ADS1115 cabem em int16; colunas com lacunas ou valores
+    fora da faixa ficam em float32 (exato para inteiros de 16 bits).
+    """
+    array = _decode_float32(values)
+
+    if (
+        array.size
+        and np.isfinite(array).all()
+        and (array == np.round(array)).all()
+        and array.min() >= -32768
+        and array.max() <= 32767
+    ):
+        return array.astype(np.int16)
+
+    return array
+
+
+def _decode_id(values):
+    try:
+        return np.array(values, dtype=np.int64)
+    except (TypeError, ValueError):
+        return pd.to_numeric(
+            pd.Series(values, dtype=object),
+            errors="coerce",
+        ).to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def decode_telemetry(rows, columns):
+    """
+    Monta o DataFrame de telemetria direto das linhas JSON, coluna a
+    coluna, com tipos definidos: int64 para id, datetime64 UTC para
+    horários, int16/float32 para as AI e float32 para a vibração.
+    """
+    data = {}
+
+    for col in columns:
+        values = [row.get(col) for row in rows]
+
+        if col == "id":
+            data[col] = _decode_id(values)
+        elif col == "device_id":
+            data[col] = pd.Series(values, dtype=object)
+        elif col in TELEMETRY_TIME_COLUMNS:
+            data[col] = pd.to_datetime(
+                values,
+                utc=True,
+                errors="coerce",
+                format="ISO8601",
+            )
+        elif col in TELEMETRY_AI_FIELDS:
+            data[col] = _decode_adc(values)
+        else:
+            data[col] = _decode_float32(values)
+
+    return pd.DataFrame(data, columns=columns)
+
+
+DEFAULT_LOCATIONS = (
+    "Jacutinga",
+    "Intermediária",
+)
+
+DEVICE_COLUMNS = [
+    "device_id",
+    "nome_exibicao",
+    "nome",
+    "local",
+    "descricao",
+    "ativo",
+    "ordem",
+    "adc_full_scale_v",
+]
+
+
+@swr_cache(
+    ttl=60,
+    default=lambda: list(DEFAULT_LOCATIONS),
+    label="locais",
+    enabled=_has_client,
+)
 def load_locations():
     supabase = get_supabase()
     """Carrega os locais ativos."""
-    defaults = [
-        "Jacutinga",
-        "Intermediária",
-    ]
+    defaults = list(DEFAULT_LOCATIONS)
 
     if supabase is None:
         return defaults
 
-    try:
-        response = (
-            supabase
-            .table("locais")
-            .select("nome, ativo, ordem")
-            .eq("ativo", True)
-            .order("ordem")
-            .order("nome")
-            .execute()
-        )
-
-        names = [
-            str(row.get("nome", "")).strip()
-            for row in (response.data or [])
-            if str(row.get("nome", "")).strip()
-        ]
+    response = (
+        supabase
+        .table("locais")
+        .select("nome, ativo, ordem")
+        .eq("ativo", True)
+        .order("ordem")
+        .order("nome")
+        .execute()
+    )
 
-        return names or defaults
+    names = [
+        str(row.get("nome", "")).strip()
+        for row in (response.data or [])
+        if str(row.get("nome", "")).strip()
+    ]
 
-    except Exception:
-        return defaults
+    return names or defaults
 
 
 def create_location(nome, ordem=999):
@@ -88,7 +250,12 @@ def create_location(nome, ordem=999):
         return False, str(exc)
 
 
-@st.cache_data(ttl=30)
+@swr_cache(
+    ttl=30,
+    default=lambda: pd.DataFrame(columns=DEVICE_COLUMNS),
+    label="dispositivos",
+    enabled=_has_client,
+)
 def load_devices():
     supabase = get_supabase()
     """
@@ -103,98 +270,168 @@ def load_devices():
       ordem
       adc_full_scale_v
     """
-    empty = pd.DataFrame(columns=[
-        "device_id",
-        "nome_exibicao",
-        "nome",
-        "local",
-        "descricao",
-        "ativo",
-        "ordem",
-        "adc_full_scale_v",
-    ])
+    empty = pd.DataFrame(columns=DEVICE_COLUMNS)
 
     if supabase is None:
         return empty
 
-    try:
-        response = (
-            supabase
-            .table("dispositivos")
-            .select("*")
-            .execute()
-        )
+    response = (
+        supabase
+        .table("dispositivos")
+        .select("*")
+        .execute()
+    )
 
-        data = response.data or []
-        if not data:
-            return empty
+    data = response.data or []
+    if not data:
+        return empty
 
-        df = pd.DataFrame(data)
+    df = pd.DataFrame(data)
 
-        if "device_id" not in df.columns:
-            return empty
+    if "device_id" not in df.columns:
+        return empty
 
-        defaults = {
-            "nome_exibicao": None,
-            "nome": None,
-            "local": "Sem local",
-            "descricao": None,
-            "ativo": True,
-            "ordem": 999,
-            "adc_full_scale_v": 4.096,
-        }
+    defaults = {
+        "nome_exibicao": None,
+        "nome": None,
+        "local": "Sem local",
+        "descricao": None,
+        "ativo": True,
+        "ordem": 999,
+        "adc_full_scale_v": 4.096,
+    }
+
+    for col, default in defaults.items():
+        if col not in df.columns:
+            df[col] = default
+
+    df["nome_exibicao"] = (
+        df["nome_exibicao"]
+        .fillna(df["nome"])
+        .fillna(df["device_id"])
+        .astype(str)
+        .str.strip()
+    )
 
-        for col, default in defaults.items():
-            if col not in df.columns:
-                df[col] = default
+    df["nome"] = df["nome_exibicao"]
 
-        df["nome_exibicao"] = (
-            df["nome_exibicao"]
-            .fillna(df["nome"])
-            .fillna(df["device_id"])
-            .astype(str)
-            .str.strip()
-        )
+    df["local"] = (
+        df["local"]
+        .fillna("Sem local")
+        .astype(str)
+        .str.strip()
+    )
 
-        df["nome"] = df["nome_exibicao"]
+    df.loc[df["local"] == "", "local"] = "Sem local"
 
-        df["local"] = (
-            df["local"]
-            .fillna("Sem local")
-            .astype(str)
-            .str.strip()
-        )
+    df["descricao"] = df["descricao"].where(
+        df["descricao"].notna(), None
+    )
 
-        df.loc[df["local"] == "", "local"] = "Sem local"
+    df["ativo"] = (
+        df["ativo"]
+        .fillna(True)
+        .astype(bool)
+    )
 
-        df["descricao"] = df["descricao"].where(
-            df["descricao"].notna(), None
-        )
+    df["ordem"] = pd.to_numeric(
+        df["ordem"],
+        errors="coerce"
+    ).fillna(999)
+
+    df["adc_full_scale_v"] = pd.to_numeric(
+        df["adc_full_scale_v"],
+        errors="coerce"
+    ).fillna(4.096)
+
+    return df
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceRecord:
+    """Cadastro de um dispositivo (linha de load_devices, imutável)."""
+
+    device_id: str
+    nome: str
+    nome_exibicao: str
+    local: str
+    descricao: object
+    ativo: bool
+    ordem: float
+    adc_full_scale_v: float
+
+
+def load_device_index():
+    """
+    Índice device_id -> DeviceRecord sobre load_devices, para consultas
+    O(1) de cadastro e fundo de escala. Montado uma vez por versão do
+    valor de load_devices; o default (sem cliente ou sem resposta) não
+    é guardado.
+    """
+    return _device_index(*load_devices.versioned())
+
+
+def _device_index(devices, version):
+    if version is None:
+        return _build_device_index(devices)
+
+    return _compile_device_index(version, devices)
 
-        df["ativo"] = (
-            df["ativo"]
-            .fillna(True)
-            .astype(bool)
+
+@st.cache_resource(max_entries=4)
+def _compile_device_index(version, _devices):
+    return _build_device_index(_devices)
+
+
+def _build_device_index(devices):
+    index = {}
+
+    if devices.empty:
+        return MappingProxyType(index)
+
+    for record in devices.to_dict("records"):
+        device_id = str(record.get("device_id"))
+
+        # Cadastro duplicado: vale a primeira linha.
+        if device_id in index:
+            continue
+
+        index[device_id] = DeviceRecord(
+            device_id=device_id,
+            nome=record.get("nome") or device_id,
+            nome_exibicao=record.get("nome_exibicao") or device_id,
+            local=record.get("local") or "Sem local",
+            descricao=record.get("descricao"),
+            ativo=bool(record.get("ativo", True)),
+            ordem=safe_float(record.get("ordem"), 999),
+            adc_full_scale_v=safe_float(
+                record.get("adc_full_scale_v"),
+                4.096,
+            ),
         )
 
-        df["ordem"] = pd.to_numeric(
-            df["ordem"],
-            errors="coerce"
-        ).fillna(999)
+    return MappingProxyType(index)
 
-        df["adc_full_scale_v"] = pd.to_numeric(
-            df["adc_full_scale_v"],
-            errors="coerce"
-        ).fillna(4.096)
 
-        return df
+def get_device(device_id):
+    return load_device_index().get(str(device_id))
 
-    except Exception as exc:
-        st.error(f"Erro ao carregar dispositivos: {exc}")
-        return empty
+
+def device_full_scale(device_id):
+    record = get_device(device_id)
+    return record.adc_full_scale_v if record is not None else 4.096
+
+
+def clear_device_cache():
+    load_devices.clear()
 
 
-@st.cache_data(ttl=30)
+@swr_cache(
+    ttl=30,
+    default=dict,
+    label="configurações das entradas",
+    enabled=_has_client,
+)
 def load_channel_configs():
     supabase = get_supabase()
     """
@@ -204,65 +441,64 @@ def load_channel_configs():
     if supabase is None:
         return {}
 
-    try:
-        response = (
-            supabase
-            .table("configuracao_analogica")
-            .select("*")
-            .order("device_id")
-            .order("canal")
-            .execute()
-        )
+    response = (
+        supabase
+        .table("configuracao_analogica")
+        .select("*")
+        .order("device_id")
+        .order("canal")
+        .execute()
+    )
 
-        configs = {}
+    configs = {}
 
-        for row in response.data or []:
-            device_id = str(row.get("device_id", "")).strip()
+    for row in response.data or []:
+        device_id = str(row.get("device_id", "")).strip()
 
-            try:
-                canal_number = int(row.get("canal"))
-            except (TypeError, ValueError):
-                continue
+        try:
+            canal_number = int(row.get("canal"))
+        except (TypeError, ValueError):
+            continue
 
-            if canal_number < 1 or canal_number > 16:
-                continue
+        if canal_number < 1 or canal_number > 16:
+            continue
 
-            canal = channel_name_from_number(canal_number)
-            normalized = dict(row)
+        canal = channel_name_from_number(canal_number)
+        normalized = dict(row)
 
-            normalized["canal"] = canal
-            normalized["nome_exibicao"] = (
-                row.get("nome_exibicao")
-                or row.get("nome")
-                or canal
-            )
-            normalized["tipo_entrada"] = (
-                row.get("tipo_entrada")
-                or (
-                    "4–20 mA"
-                    if str(row.get("modo", "")).lower() == "linear_4_20ma"
-                    else "0–3 V"
-                )
+        normalized["canal"] = canal
+        normalized["nome_exibicao"] = (
+            row.get("nome_exibicao")
+            or row.get("nome")
+            or canal
+        )
+        normalized["tipo_entrada"] = (
+            row.get("tipo_entrada")
+            or (
+                "4–20 mA"
+                if str(row.get("modo", "")).lower() == "linear_4_20ma"
+                else "0–3 V"
             )
-            normalized["shunt_150r"] = bool(
-                row.get(
-                    "shunt_150r",
-                    str(row.get("modo", "")).lower() == "linear_4_20ma"
-                )
+        )
+        normalized["shunt_150r"] = bool(
+            row.get(
+                "shunt_150r",
+                str(row.get("modo", "")).lower() == "linear_4_20ma"
             )
-            normalized["unidade"] = row.get("unidade") or "Sem unidade"
+        )
+        normalized["unidade"] = row.get("unidade") or "Sem unidade"
 
-            configs[(device_id, canal)] = normalized
+        configs[(device_id, canal)] = normalized
 
-        return configs
+    return configs
 
-    except Exception as exc:
-        st.error("Erro ao carregar configurações das entradas.")
-        st.exception(exc)
-        return {}
 
-
-@st.cache_data(ttl=30)
+@swr_cache(
+    ttl=30,
+    default=get_default_config,
+    label="configuração geral",
+    enabled=_has_client,
+)
 def load_global_config():
     supabase = get_supabase()
     config = get_default_config()
@@ -270,102 +506,244 @@ def load_global_config():
     if supabase is None:
         return config
 
-    try:
-        response = (
-            supabase
-            .table("configuracoes")
-            .select("*")
-            .eq("id", 1)
-            .limit(1)
-            .execute()
-        )
-
-        if response.data:
-            config.update(response.data[0])
+    response = (
+        supabase
+        .table("configuracoes")
+        .select("*")
+        .eq("id", 1)
+        .limit(1)
+        .execute()
+    )
 
-    except Exception:
-        pass
+    if response.data:
+        config.update(response.data[0])
 
     return config
 
 
-@st.cache_data(ttl=10)
-def load_telemetry():
+TELEMETRY_SNAPSHOT_COLUMNS = (
+    TELEMETRY_TIME_COLUMNS
+    + TELEMETRY_AI_FIELDS
+    + TELEMETRY_VIBRATION_COLUMNS
+)
+
+
+def fetch_latest_telemetry(supabase, channel_configs):
+    """
+    Consulta a última leitura de cada dispositivo.
+    Não usa cache nem elementos do Streamlit: é chamada pelo poller.
+    """
+    columns = TELEMETRY_SNAPSHOT_COLUMNS
+    selected = telemetry_columns(channel_configs)
+
+    # Uma linha por dispositivo (view da migration
+    # telemetria_ultima_leitura), independente do volume da tabela.
+    response = (
+        supabase
+        .table("telemetria_ultima_leitura")
+        .select(",".join(selected))
+        .execute()
+    )
+
+    data = response.data or []
+    if not data:
+        return pd.DataFrame(columns=columns)
+
+    df = decode_telemetry(data, selected)
+
+    for col in columns:
+        if col not in df.columns:
+            df[col] = np.float32(np.nan)
+
+    # Proteção caso a view retorne mais de uma linha por dispositivo.
+    return (
+        df.sort_values("recebido_em", ascending=False)
+        .drop_duplicates("device_id", keep="first")
+        .reset_index(drop=True)
+    )
+
+
+def communication_status(received_at):
+    """
+    STATUS DE COMUNICAÇÃO no momento da chamada: Online/Offline depende
+    exclusivamente da idade da telemetria (sem leitura = Offline).
+    Alarmes de processo não devem fazer o equipamento parecer offline.
+    """
+    age = (
+        pd.Timestamp.now(tz="UTC")
+        - pd.to_datetime(received_at, utc=True)
+    ).dt.total_seconds()
+
+    return np.where(
+        age <= OFFLINE_AFTER_SECONDS,
+        "Online",
+        "Offline",
+    )
+
+
+@st.cache_resource(on_release=lambda poller: poller.stop())
+def get_telemetry_poller():
+    """Poller único do processo, compartilhado por todas as sessões."""
+    return start_poller(fetch_latest_telemetry)
+
+
+def get_fleet_snapshot():
+    """
+    Snapshot atual da frota.
+
+    Com a chave de serviço (get_service_supabase), um poller único
+    consulta para todas as sessões e a leitura aqui não faz I/O de rede;
+    build_devices_view só mostra os dispositivos do cadastro visível para
+    a sessão. Sem ela, cada sessão consulta com o próprio cliente (e a
+    própria RLS), no máximo a cada TELEMETRY_POLL_SECONDS: um cliente de
+    sessão nunca é usado por outra.
+    """
+    service = get_service_supabase()
+
+    if service is None:
+        return _session_fleet_snapshot()
+
+    poller = get_telemetry_poller()
+    poller.attach(service, load_channel_configs())
+    return poller.snapshot()
+
+
+def _session_fleet_snapshot():
+    snapshot, polled_at = st.session_state.get(
+        "fleet_snapshot",
+        (FleetSnapshot(), None),
+    )
+
+    if (
+        polled_at is not None
+        and time.monotonic() - polled_at < TELEMETRY_POLL_SECONDS
+    ):
+        return snapshot
+
     supabase = get_supabase()
-    columns = [
-        "device_id",
-        "timestamp_dispositivo",
-        "recebido_em",
-        "ai001", "ai002", "ai003", "ai004",
-        "ai005", "ai006", "ai007", "ai008",
-        "x_mm_s", "x_rms",
-        "y_mm_s", "y_rms",
-        "z_mm_s", "z_rms",
-    ]
 
     if supabase is None:
-        return pd.DataFrame(columns=columns + ["status"])
+        return snapshot
 
     try:
-        response = (
-            supabase
-            .table("telemetria")
-            .select("*")
-            .order("recebido_em", desc=True)
-            .limit(1000)
-            .execute()
+        telemetry = fetch_latest_telemetry(supabase, load_channel_configs())
+    except Exception as exc:
+        # Mantém a última leitura boa, sinalizando o erro.
+        snapshot = FleetSnapshot(
+            version=snapshot.version,
+            telemetry=snapshot.telemetry,
+            fetched_at=snapshot.fetched_at,
+            error=str(exc),
+        )
+    else:
+        snapshot = FleetSnapshot(
+            version=snapshot.version + 1,
+            telemetry=share_frame(telemetry),
+            fetched_at=datetime.now(timezone.utc),
         )
 
-        data = response.data or []
-        if not data:
-            return pd.DataFrame(columns=columns + ["status"])
+    st.session_state.fleet_snapshot = (snapshot, time.monotonic())
+    return snapshot
 
-        df = pd.DataFrame(data)
 
-        for col in columns:
-            if col not in df.columns:
-                df[col] = np.nan
+def telemetry_poller_metrics():
+    """Contadores do poller da frota, ou None sem a chave de serviço."""
+    if get_service_supabase() is None:
+        return None
 
-        df["recebido_em"] = pd.to_datetime(
-            df["recebido_em"],
-            utc=True,
-            errors="coerce",
-        )
+    return get_telemetry_poller().metrics()
 
-        # Última leitura por dispositivo para o dashboard.
-        df = (
-            df.sort_values("recebido_em", ascending=False)
-            .drop_duplicates("device_id", keep="first")
-            .reset_index(drop=True)
-        )
 
-        global_config = load_global_config()
-        channel_configs = load_channel_configs()
+def refresh_telemetry():
+    """Pede uma nova consulta da frota sem esperar o intervalo."""
+    if get_service_supabase() is None:
+        st.session_state.pop("fleet_snapshot", None)
+    else:
+        get_telemetry_poller().request_refresh()
 
-        def row_status(row):
-            # STATUS DE COMUNICAÇÃO:
-            # Online/Offline depende exclusivamente da idade da telemetria.
-            # Alarmes de processo não devem fazer o equipamento parecer offline.
-            age = latest_age_seconds(
-                row.get("recebido_em")
-            )
 
-            if age > OFFLINE_AFTER_SECONDS:
-                return "Offline"
+def _mqtt_settings():
+    try:
+        host = st.secrets.get("mqtt_host")
+    except Exception:
+        return None
 
-            return "Online"
+    if not host:
+        return None
 
-        df["status"] = df.apply(
-            row_status,
-            axis=1
-        )
+    return {
+        "host": host,
+        "port": st.secrets.get("mqtt_port", MQTT_DEFAULT_PORT),
+        "topic": st.secrets.get("mqtt_topic", MQTT_DEFAULT_TOPIC),
+        "username": st.secrets.get("mqtt_username"),
+        "password": st.secrets.get("mqtt_password"),
+        "tls": st.secrets.get("mqtt_tls", False),
+    }
 
-        return df
 
-    except Exception as exc:
-        st.error("Erro ao carregar a telemetria.")
-        st.exception(exc)
-        return pd.DataFrame(columns=columns + ["status"])
+@st.cache_resource(
+    on_release=lambda ingest: ingest.stop() if ingest is not None else None
+)
+def get_mqtt_ingest():
+    """
+    Assinante MQTT único do processo, ou None quando mqtt_host não está
+    configurado (modo somente-banco).
+    """
+    settings = _mqtt_settings()
+
+    if settings is None:
+        return None
+
+    return start_mqtt_ingest(
+        TELEMETRY_AI_FIELDS + TELEMETRY_VIBRATION_COLUMNS,
+        **settings,
+    )
+
+
+def _merge_live_telemetry(telemetry, live):
+    """Por dispositivo, fica a leitura mais recente entre banco e MQTT."""
+    if live.empty:
+        return telemetry
+
+    if telemetry.empty:
+        return live
+
+    merged = pd.concat([telemetry, live], ignore_index=True)
+
+    return (
+        merged
+        .sort_values("recebido_em", ascending=False, kind="stable")
+        .drop_duplicates(subset=["device_id"])
+        .reset_index(drop=True)
+    )
+
+
+def load_telemetry():
+    snapshot = get_fleet_snapshot()
+
+    if snapshot.version == 0:
+        if snapshot.error:
+            st.error("Erro ao carregar a telemetria.")
+            st.caption(snapshot.error)
+        else:
+            st.info("Carregando leituras da frota…")
+
+        telemetry = pd.DataFrame(columns=TELEMETRY_SNAPSHOT_COLUMNS)
+    else:
+        telemetry = snapshot.telemetry
+
+    ingest = get_mqtt_ingest()
+
+    if ingest is not None:
+        devices, version = load_devices.versioned()
+
+        # Só o cadastro de fato (não o default) define quem tem buffer.
+        if version is not None:
+            ingest.set_devices(_device_index(devices, version))
+
+        telemetry = _merge_live_telemetry(telemetry, ingest.latest_frame())
+
+    return telemetry
 
 
 def build_devices_view():
@@ -378,16 +756,19 @@ def build_devices_view():
     telemetry = load_telemetry()
 
     if devices.empty:
-        if telemetry.empty:
+        # Leituras sem cadastro só aparecem quando o snapshot foi lido com
+        # as permissões da própria sessão (sem chave de serviço).
+        if telemetry.empty or get_service_supabase() is not None:
             return pd.DataFrame()
 
-        result = telemetry.copy()
+        result = frame_view(telemetry)
         result["nome"] = result["device_id"].astype(str)
         result["local"] = "Sem cadastro"
         result["descricao"] = None
         result["ordem"] = 999
         result["ativo"] = True
         result["adc_full_scale_v"] = 4.096
+        result["status"] = communication_status(result["recebido_em"])
         return result
 
     devices = devices[
@@ -449,85 +830,267 @@ def build_devices_view():
         errors="coerce"
     ).fillna(4.096)
 
-    result["status"] = (
-        result["status"]
-        .fillna("Offline")
-    )
+    result["status"] = communication_status(result["recebido_em"])
 
     return result
 
 
-@st.cache_data(ttl=30)
-def load_history(device_id, days):
-    supabase = get_supabase()
-    if supabase is None or not device_id:
-        return pd.DataFrame()
+def _history_slices(start, end):
+    """
+    Divide [start, end) em fatias alinhadas à grade UTC de
+    HISTORY_SLICE_HOURS. Somente a primeira e a última fatia podem
+    ser parciais.
+    """
+    step = timedelta(hours=HISTORY_SLICE_HOURS)
+    slices = []
+    cursor = start
 
-    start = datetime.now(timezone.utc) - timedelta(days=days)
+    while cursor < end:
+        boundary = floor_time(cursor, step) + step
+        slices.append((cursor, min(boundary, end)))
+        cursor = boundary
 
-    try:
+    return slices
+
+
+def _fetch_paged(build_query):
+    """
+    Executa a consulta montada por build_query() em páginas de
+    HISTORY_PAGE_SIZE com range(), para não depender do limite
+    max-rows do servidor.
+    """
+    rows = []
+    offset = 0
+
+    while True:
         response = (
+            build_query()
+            .range(offset, offset + HISTORY_PAGE_SIZE - 1)
+            .execute()
+        )
+
+        page = response.data or []
+        rows.extend(page)
+
+        if len(page) < HISTORY_PAGE_SIZE:
+            return rows
+
+        offset += len(page)
+
+
+def _fetch_history_rows(supabase, device_id, start, end, columns):
+    """Busca as leituras de device_id em [start, end)."""
+    return _fetch_paged(
+        lambda: (
             supabase
             .table("telemetria")
-            .select("*")
+            .select(",".join(columns))
             .eq("device_id", device_id)
             .gte("recebido_em", start.isoformat())
+            .lt("recebido_em", end.isoformat())
+            # id desempata leituras com o mesmo recebido_em: sem ordem
+            # total, range() pode repetir ou pular linhas entre páginas.
             .order("recebido_em", desc=False)
-            .execute()
+            .order("id", desc=False)
         )
+    )
 
-        data = response.data or []
-        if not data:
-            return pd.DataFrame()
 
-        df = pd.DataFrame(data)
+def fetch_history_range(
+    supabase,
+    device_id,
+    start,
+    end,
+    columns,
+    progress=None,
+):
+    """
+    Busca o período [start, end) em fatias paralelas
+    (HISTORY_FETCH_WORKERS) e devolve as linhas em ordem cronológica.
+
+    progress(concluidas, total) é chamado na thread que fez a chamada a
+    cada fatia concluída.
+    """
+    slices = _history_slices(start, end)
+
+    if not slices:
+        return []
+
+    ctx = get_script_run_ctx()
 
-        df["timestamp"] = pd.to_datetime(
-            df["recebido_em"], utc=True, errors="coerce"
+    def fetch(slice_start, slice_end):
+        return _fetch_history_rows(
+            supabase,
+            device_id,
+            slice_start,
+            slice_end,
+            columns,
         )
 
-        numeric_cols = [
-            "ai001", "ai002", "ai003", "ai004",
-            "ai005", "ai006", "ai007", "ai008",
-            "x_mm_s",
-            "y_mm_s",
-            "z_mm_s",
-            "x_rms",
-            "y_rms",
-            "z_rms",
-        ]
+    results = [None] * len(slices)
+
+    with ThreadPoolExecutor(
+        max_workers=min(HISTORY_FETCH_WORKERS, len(slices)),
+        initializer=(
+            (lambda: add_script_run_ctx(None, ctx))
+            if ctx is not None
+            else None
+        ),
+    ) as pool:
+        futures = {
+            pool.submit(fetch, slice_start, slice_end): index
+            for index, (slice_start, slice_end) in enumerate(slices)
+        }
 
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(
-                    df[col],
-                    errors="coerce"
-                )
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
 
+            if progress is not None:
+                progress(done, len(slices))
+
+    # As fatias são disjuntas (gte/lt); basta concatenar na ordem.
+    return [
+        row
+        for part in results
+        for row in part
+    ]
+
+
+def _fetch_history_frame(
+    supabase,
+    device_id,
+    start,
+    end,
+    columns,
+    progress=None,
+):
+    rows = fetch_history_range(
+        supabase,
+        device_id,
+        start,
+        end,
+        columns,
+        progress,
+    )
+
+    df = decode_telemetry(rows, columns)
+
+    # Fatias vizinhas e a sobreposição do buffer podem repetir linhas;
+    # leituras distintas com o mesmo recebido_em são mantidas.
+    df = df.drop_duplicates(subset=["id"])
+
+    df.index = pd.DatetimeIndex(df["recebido_em"], name=None)
+    return df
+
+
+def _append_live_history(df, device_id, start, columns):
+    """
+    Completa o histórico com as leituras MQTT em memória posteriores à
+    última linha do buffer do banco.
+    """
+    ingest = get_mqtt_ingest()
+
+    if ingest is None:
+        return df
+
+    live = ingest.recent_frame(device_id)
+
+    if live.empty:
+        return df
+
+    after = pd.Timestamp(start)
+
+    if not df.empty:
+        after = max(after, df["recebido_em"].max())
+
+    live = live[live["recebido_em"] > after]
+
+    if live.empty:
+        return df
+
+    live = live[[column for column in columns if column in live.columns]]
+    live.index = pd.DatetimeIndex(live["recebido_em"], name=None)
+
+    if df.empty:
+        return live
+
+    return pd.concat([df, live])
+
+
+def load_history(
+    device_id,
+    window,
+    progress=None,
+    timeout=CACHE_LOAD_TIMEOUT_SECONDS,
+):
+    """
+    Histórico de device_id na janela (HistoryWindow) [start, end).
+
+    As leituras vêm do buffer incremental compartilhado
+    (services.history_store): cada atualização baixa somente as linhas
+    novas, e janelas sobrepostas usam o mesmo buffer.
+
+    Se a consulta passa de timeout segundos (ou o banco está com o
+    circuit breaker aberto), mostra o que já está em memória com um
+    aviso. timeout=None espera a consulta inteira (relatórios).
+    """
+    supabase = get_supabase()
+    if supabase is None or not device_id:
+        return pd.DataFrame()
+
+    start = window.start
+
+    try:
         configs = load_channel_configs()
-        device_cfg = load_devices()
-        full_scale = 4.096
-
-        if not device_cfg.empty:
-            match = device_cfg[
-                device_cfg["device_id"].astype(str)
-                == str(device_id)
-            ]
-            if not match.empty:
-                full_scale = safe_float(
-                    match.iloc[0].get("adc_full_scale_v"),
-                    4.096
+        columns = telemetry_columns(configs, device_id)
+
+        df, complete = get_history_store().window(
+            device_id,
+            start,
+            columns,
+            lambda fetch_start, fetch_end, fetch_progress: (
+                _fetch_history_frame(
+                    supabase,
+                    device_id,
+                    fetch_start,
+                    fetch_end,
+                    columns,
+                    fetch_progress,
                 )
-
-        df["pressao"] = df.apply(
-            lambda r: get_channel_value(
-                r,
-                configs,
-                str(device_id),
-                "AI004",
-                full_scale
             ),
-            axis=1
+            progress,
+            timeout,
+            scope=session_identity(),
+        )
+
+        if not complete:
+            st.info(
+                "Histórico ainda carregando; exibindo as leituras "
+                "já disponíveis."
+            )
+
+        if df is None:
+            df = pd.DataFrame()
+
+        df = _append_live_history(df, device_id, start, columns)
+
+        # O buffer é compartilhado e somente leitura: as colunas derivadas
+        # vão para uma cópia rasa.
+        df = frame_view(df.iloc[:df.index.searchsorted(window.end)])
+
+        if df.empty:
+            return pd.DataFrame()
+
+        df["timestamp"] = df["recebido_em"]
+
+        full_scale = device_full_scale(device_id)
+
+        df["pressao"] = get_channel_series(
+            df,
+            configs,
+            str(device_id),
+            "AI004",
+            full_scale
         )
 
         pressure_cfg = get_channel_config(
@@ -539,22 +1102,17 @@ def load_history(device_id, days):
         if str(
             pressure_cfg.get("unidade", "")
         ).lower() == "bar":
-            df["pressao_mca"] = df["pressao"].apply(
-                bar_to_mca
-            )
+            df["pressao_mca"] = df["pressao"] * MCA_PER_BAR
         else:
             df["pressao_mca"] = np.nan
 
         for canal in ["AI006", "AI007", "AI008"]:
-            df[canal] = df.apply(
-                lambda r, c=canal: get_channel_value(
-                    r,
-                    configs,
-                    str(device_id),
-                    c,
-                    full_scale
-                ),
-                axis=1
+            df[canal] = get_channel_series(
+                df,
+                configs,
+                str(device_id),
+                canal,
+                full_scale
             )
 
         df["vibra"] = df[
@@ -572,195 +1130,679 @@ def load_history(device_id, days):
         return pd.DataFrame()
 
 
-@st.cache_data(ttl=30)
-def load_alarm_events(device_id, days):
-    supabase = get_supabase()
+# ------------------------------------------------------------
+# AGREGADOS (telemetria_rollup_hora / telemetria_rollup_dia)
+# ------------------------------------------------------------
+
+ROLLUP_FIELDS = TELEMETRY_AI_FIELDS + [
+    "x_mm_s", "y_mm_s", "z_mm_s",
+    "x_rms", "y_rms", "z_rms",
+]
+
+ROLLUP_COLUMNS = [
+    "device_id",
+    "grandeza",
+    "leituras",
+    "soma",
+    "soma_quadrados",
+    "minimo",
+    "maximo",
+    "primeiro",
+    "ultimo",
+    "primeiro_em",
+    "ultimo_em",
+]
+
+
+def _rollup_plan(start, end, edges=True, watermark=None):
     """
-    Carrega eventos de alarme cujo intervalo se sobrepõe ao período solicitado.
-    Horários são mantidos em UTC no banco e convertidos apenas na apresentação.
+    Decompõe [start, end) em intervalos de dias completos, horas
+    completas e bordas brutas.
+
+    Com edges=False, a janela é ampliada para as horas que a contêm e
+    nenhuma leitura bruta é consultada no início.
+
+    watermark (processado_ate dos rollups) limita os agregados às horas
+    já processadas; o trecho depois dela vem da telemetria bruta.
     """
-    if supabase is None or not device_id:
-        return pd.DataFrame()
+    hour = timedelta(hours=1)
+    day = timedelta(days=1)
+
+    if edges:
+        first_hour = ceil_time(start, hour)
+        last_hour = floor_time(end, hour)
+    else:
+        first_hour = floor_time(start, hour)
+        last_hour = ceil_time(end, hour)
+
+    if watermark is not None:
+        last_hour = min(last_hour, floor_time(watermark, hour))
+
+    if first_hour >= last_hour:
+        return [], [], [(start, end)] if edges or last_hour < end else []
 
-    start = (
-        datetime.now(timezone.utc)
-        - timedelta(days=days)
+    first_day = ceil_time(first_hour, day)
+    last_day = floor_time(last_hour, day)
+
+    if first_day < last_day:
+        days = [(first_day, last_day)]
+        hours = [
+            (first_hour, first_day),
+            (last_day, last_hour),
+        ]
+    else:
+        days = []
+        hours = [(first_hour, last_hour)]
+
+    raw = [(start, first_hour)] if edges else []
+    raw.append((last_hour, end))
+
+    return (
+        days,
+        [(a, b) for a, b in hours if a < b],
+        [(a, b) for a, b in raw if a < b],
     )
 
-    try:
-        response = (
+
+def _rollup_watermark(supabase):
+    """
+    processado_ate de telemetria_rollup_estado: agregados de horas que
+    terminam depois dela podem estar ausentes ou incompletos. Sem a marca
+    d'água, nenhum agregado é considerado pronto.
+    """
+    response = (
+        supabase
+        .table("telemetria_rollup_estado")
+        .select("processado_ate")
+        .eq("id", 1)
+        .execute()
+    )
+
+    if not response.data:
+        return TIME_EPOCH
+
+    watermark = pd.to_datetime(
+        response.data[0].get("processado_ate"),
+        utc=True,
+        errors="coerce",
+    )
+
+    return TIME_EPOCH if pd.isna(watermark) else watermark.to_pydatetime()
+
+
+def _decode_rollups(rows):
+    df = pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
+
+    for col in ["leituras", "soma", "soma_quadrados", "minimo",
+                "maximo", "primeiro", "ultimo"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    for col in ["primeiro_em", "ultimo_em"]:
+        df[col] = pd.to_datetime(
+            df[col],
+            utc=True,
+            errors="coerce",
+            format="ISO8601",
+        )
+
+    return df
+
+
+def _rollup_fields():
+    """Somente as AI ativas (em algum dispositivo) e a vibração."""
+    return [
+        field
+        for field in telemetry_columns(load_channel_configs())
+        if field in ROLLUP_FIELDS
+    ]
+
+
+def _fetch_rollups(supabase, table, device_ids, fields, start, end):
+    """Linhas de table com bucket em [start, end), já decodificadas."""
+    rows = _fetch_paged(
+        lambda: (
             supabase
-            .table("alarm_eventos")
-            .select(
-                "id,device_id,grandeza,canal,unidade,"
-                "motivo,valor_inicio,valor_fim,limite,"
-                "inicio_em,fim_em,ativo"
-            )
-            .eq("device_id", str(device_id))
-            .lt("inicio_em", datetime.now(timezone.utc).isoformat())
-            .or_(
-                "fim_em.is.null,"
-                f"fim_em.gte.{start.isoformat()}"
-            )
-            .order("inicio_em", desc=False)
-            .execute()
+            .table(table)
+            .select(",".join(ROLLUP_COLUMNS))
+            .in_("device_id", device_ids)
+            .in_("grandeza", fields)
+            .gte("bucket", start.isoformat())
+            .lt("bucket", end.isoformat())
+            # Chave primária completa: com ordem total, range() não
+            # repete nem pula linhas entre páginas.
+            .order("bucket", desc=False)
+            .order("device_id", desc=False)
+            .order("grandeza", desc=False)
         )
+    )
+    return _decode_rollups(rows)
 
-        rows = response.data or []
 
-        if not rows:
-            return pd.DataFrame()
+def _fetch_raw_rows(supabase, device_ids, fields, start, end):
+    """Leituras brutas de [start, end) com os campos dos rollups."""
+    return _fetch_paged(
+        lambda: (
+            supabase
+            .table("telemetria")
+            .select(",".join(["device_id", "recebido_em"] + fields))
+            .in_("device_id", device_ids)
+            .gte("recebido_em", start.isoformat())
+            .lt("recebido_em", end.isoformat())
+            .order("recebido_em", desc=False)
+            .order("id", desc=False)
+        )
+    )
 
-        df = pd.DataFrame(rows)
-
-        for col in [
-            "inicio_em",
-            "fim_em",
-        ]:
-            if col in df.columns:
-                df[col] = pd.to_datetime(
-                    df[col],
-                    utc=True,
-                    errors="coerce",
-                )
 
-        return df
+def _reading_rollups(rows, fields):
+    """
+    Leituras brutas no formato dos rollups, uma linha por (leitura,
+    grandeza): nos trechos sem agregado, a ponderação no tempo usa o
+    instante exato de cada leitura.
+    """
+    if not rows:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    df = decode_telemetry(rows, ["device_id", "recebido_em"] + fields)
+
+    long = df.melt(
+        id_vars=["device_id", "recebido_em"],
+        value_vars=fields,
+        var_name="grandeza",
+        value_name="valor",
+    ).dropna(subset=["valor"])
+
+    valor = long["valor"].to_numpy(dtype=np.float64)
+
+    return pd.DataFrame({
+        "device_id": long["device_id"].astype(str).to_numpy(),
+        "grandeza": long["grandeza"].to_numpy(),
+        "leituras": np.ones(len(long), dtype=np.int64),
+        "soma": valor,
+        "soma_quadrados": valor * valor,
+        "minimo": valor,
+        "maximo": valor,
+        "primeiro": valor,
+        "ultimo": valor,
+        "primeiro_em": long["recebido_em"].array,
+        "ultimo_em": long["recebido_em"].array,
+    }, columns=ROLLUP_COLUMNS)
+
+
+def _aggregate_raw_rows(rows, fields):
+    """Agrega leituras brutas no mesmo formato dos rollups."""
+    if not rows:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    df = decode_telemetry(rows, ["device_id", "recebido_em"] + fields)
+
+    long = df.melt(
+        id_vars=["device_id", "recebido_em"],
+        value_vars=fields,
+        var_name="grandeza",
+        value_name="valor",
+    ).dropna(subset=["valor"])
+
+    long["valor"] = long["valor"].astype(np.float64)
+    long["quadrado"] = long["valor"] * long["valor"]
+    long = long.sort_values("recebido_em", kind="stable")
+
+    return (
+        long
+        .groupby(["device_id", "grandeza"], sort=False)
+        .agg(
+            leituras=("valor", "size"),
+            soma=("valor", "sum"),
+            soma_quadrados=("quadrado", "sum"),
+            minimo=("valor", "min"),
+            maximo=("valor", "max"),
+            primeiro=("valor", "first"),
+            ultimo=("valor", "last"),
+            primeiro_em=("recebido_em", "min"),
+            ultimo_em=("recebido_em", "max"),
+        )
+        .reset_index()
+    )
 
-    except Exception as exc:
-        st.error("Erro ao carregar histórico de alarmes.")
-        st.exception(exc)
-        return pd.DataFrame()
+
+def _combine_rollups(parts):
+    """Soma agregados de intervalos disjuntos por (device_id, grandeza)."""
+    parts = [part for part in parts if not part.empty]
+
+    if not parts:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    # Os intervalos não se sobrepõem: ordenar por primeiro_em também
+    # ordena por ultimo_em, e first/last dão o primeiro e o último valor.
+    frame = pd.concat(parts, ignore_index=True).sort_values(
+        "primeiro_em",
+        kind="stable",
+    )
+
+    return (
+        frame
+        .groupby(["device_id", "grandeza"], sort=True)
+        .agg(
+            leituras=("leituras", "sum"),
+            soma=("soma", "sum"),
+            soma_quadrados=("soma_quadrados", "sum"),
+            minimo=("minimo", "min"),
+            maximo=("maximo", "max"),
+            primeiro=("primeiro", "first"),
+            ultimo=("ultimo", "last"),
+            primeiro_em=("primeiro_em", "min"),
+            ultimo_em=("ultimo_em", "max"),
+        )
+        .reset_index()
+    )
 
 
-def get_current_device_alarms(row):
+@swr_cache(
+    ttl=60,
+    default=lambda: pd.DataFrame(columns=ROLLUP_COLUMNS),
+    label="estatísticas agregadas",
+    enabled=_has_client,
+)
+def load_period_rollups(device_ids, window, edges=True):
+    """
+    Agregados por (device_id, grandeza) na janela (HistoryWindow), nas
+    unidades da telemetria (contagens RAW para aiNNN).
+
+    Dias completos vêm de telemetria_rollup_dia, horas completas de
+    telemetria_rollup_hora e, com edges=True, os trechos de hora
+    incompleta nas bordas vêm da telemetria bruta. Horas posteriores à
+    marca d'água dos agregados também vêm da telemetria bruta.
+    """
     supabase = get_supabase()
+    device_ids = [str(device_id) for device_id in device_ids]
+
+    if supabase is None or not device_ids:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    days, hours, raw = _rollup_plan(
+        window.start,
+        window.end,
+        edges,
+        _rollup_watermark(supabase),
+    )
+    parts = []
+
+    fields = _rollup_fields()
+
+    for table, intervals in [
+        ("telemetria_rollup_dia", days),
+        ("telemetria_rollup_hora", hours),
+    ]:
+        for interval_start, interval_end in intervals:
+            parts.append(_fetch_rollups(
+                supabase,
+                table,
+                device_ids,
+                fields,
+                interval_start,
+                interval_end,
+            ))
+
+    for interval_start, interval_end in raw:
+        parts.append(_aggregate_raw_rows(
+            _fetch_raw_rows(
+                supabase,
+                device_ids,
+                fields,
+                interval_start,
+                interval_end,
+            ),
+            fields,
+        ))
+
+    return _combine_rollups(parts)
+
+
+@swr_cache(
+    ttl=60,
+    default=lambda: pd.DataFrame(columns=ROLLUP_COLUMNS),
+    label="agregados por hora",
+    enabled=_has_client,
+)
+def load_hourly_rollups(device_ids, window):
     """
-    Retorna os alarmes ativos da leitura atual do equipamento.
+    Série de agregados da janela (HistoryWindow) para a ponderação no
+    tempo (services.reports.time_weighted_rollups), ordenada por
+    primeiro_em, nas unidades da telemetria.
+
+    Horas completas já processadas vêm de telemetria_rollup_hora, uma
+    linha por (device_id, grandeza, hora). Os trechos restantes — bordas
+    da janela e horas depois da marca d'água — vêm da telemetria bruta,
+    uma linha por leitura, então a janela é respeitada exatamente.
     """
-    try:
-        alarms = build_alarms(
-            pd.DataFrame([row])
+    supabase = get_supabase()
+    device_ids = [str(device_id) for device_id in device_ids]
+
+    if supabase is None or not device_ids:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    days, hours, raw = _rollup_plan(
+        window.start,
+        window.end,
+        True,
+        _rollup_watermark(supabase),
+    )
+    fields = _rollup_fields()
+    parts = [
+        _fetch_rollups(
+            supabase,
+            "telemetria_rollup_hora",
+            device_ids,
+            fields,
+            interval_start,
+            interval_end,
         )
+        for interval_start, interval_end in days + hours
+    ]
 
-        if alarms.empty:
-            return alarms
+    for interval_start, interval_end in raw:
+        parts.append(_reading_rollups(
+            _fetch_raw_rows(
+                supabase,
+                device_ids,
+                fields,
+                interval_start,
+                interval_end,
+            ),
+            fields,
+        ))
 
-        return alarms[
-            alarms["Equipamento"].astype(str)
-            == str(row.get("device_id", ""))
-        ].copy()
+    parts = [part for part in parts if not part.empty]
 
-    except Exception:
-        return pd.DataFrame()
+    if not parts:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
 
+    return pd.concat(parts, ignore_index=True).sort_values(
+        "primeiro_em",
+        kind="stable",
+        ignore_index=True,
+    )
 
-def build_alarms(df):
-    supabase = get_supabase()
-    alarms = []
 
-    if df.empty:
-        return pd.DataFrame()
+def rollup_channel_coefficients(rollups):
+    """
+    Canal (AI00N ou eixo X/Y/Z) e coeficientes afins (gain, offset) de
+    cada linha de rollups, para levar os agregados às unidades de
+    engenharia; vibração e RMS já estão nas unidades finais.
 
-    configs = load_channel_configs()
-    devices = load_devices()
-    global_config = load_global_config()
-    for _, row in df.iterrows():
-        device_id = str(
-            row.get("device_id", "—")
+    Os coeficientes são buscados uma vez por (device_id, canal) e
+    distribuídos às linhas pelos códigos do grupo.
+    """
+    channel_table = get_channel_table()
+
+    is_ai = rollups["grandeza"].isin(TELEMETRY_AI_FIELDS).to_numpy()
+    canal = np.where(
+        is_ai,
+        rollups["grandeza"].str.upper(),
+        rollups["grandeza"].str[0].str.upper(),
+    )
+
+    codes, pairs = pd.factorize(
+        pd.MultiIndex.from_arrays([
+            rollups["device_id"].astype(str).to_numpy(),
+            canal,
+        ])
+    )
+
+    gain = np.ones(len(pairs), dtype=np.float64)
+    offset = np.zeros(len(pairs), dtype=np.float64)
+
+    for position, (device_id, name) in enumerate(pairs):
+        if name.startswith("AI"):
+            channel = channel_table.device(device_id).channel(name)
+            gain[position] = channel.gain
+            offset[position] = channel.offset
+
+    return canal, gain[codes], offset[codes]
+
+
+def load_period_statistics(device_ids, window, edges=True):
+    """
+    Estatísticas da janela (HistoryWindow) em unidades de engenharia, por
+    (device_id, grandeza): leituras, media, minimo, maximo, desvio,
+    primeiro, ultimo.
+
+    As AI são convertidas pelos coeficientes afins de cada canal;
+    vibração e RMS já estão nas unidades finais.
+    """
+    rollups = load_period_rollups(
+        tuple(sorted({str(device_id) for device_id in device_ids})),
+        window,
+        edges,
+    )
+
+    if rollups.empty:
+        return pd.DataFrame(columns=[
+            "device_id", "grandeza", "canal", "leituras", "media",
+            "minimo", "maximo", "desvio", "primeiro", "ultimo",
+            "primeiro_em", "ultimo_em",
+        ])
+
+    canal, gain, offset = rollup_channel_coefficients(rollups)
+
+    n = rollups["leituras"].to_numpy(dtype=np.float64)
+    soma = rollups["soma"].to_numpy(dtype=np.float64)
+    soma_q = rollups["soma_quadrados"].to_numpy(dtype=np.float64)
+    minimo = rollups["minimo"].to_numpy(dtype=np.float64)
+    maximo = rollups["maximo"].to_numpy(dtype=np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_raw = soma / n
+        var_raw = np.where(
+            n > 1,
+            np.maximum(soma_q - soma * mean_raw, 0.0) / (n - 1),
+            np.nan,
         )
-        when = row.get("recebido_em")
-
-        full_scale = 4.096
-        if not devices.empty:
-            match = devices[
-                devices["device_id"].astype(str) == device_id
-            ]
-            if not match.empty:
-                full_scale = safe_float(
-                    match.iloc[0].get("adc_full_scale_v"),
-                    4.096
-                )
 
-        # Alarmes configurados das AI.
-        for canal_num in range(1, 17):
-            canal = f"AI{canal_num:03d}"
-            cfg = get_channel_config(
-                configs,
-                device_id,
-                canal
-            )
+    low = gain * minimo + offset
+    high = gain * maximo + offset
+
+    return pd.DataFrame({
+        "device_id": rollups["device_id"].astype(str),
+        "grandeza": rollups["grandeza"],
+        "canal": canal,
+        "leituras": rollups["leituras"].astype(int),
+        "media": gain * mean_raw + offset,
+        "minimo": np.fmin(low, high),
+        "maximo": np.fmax(low, high),
+        "desvio": np.abs(gain) * np.sqrt(var_raw),
+        "primeiro": gain * rollups["primeiro"].to_numpy(np.float64) + offset,
+        "ultimo": gain * rollups["ultimo"].to_numpy(np.float64) + offset,
+        "primeiro_em": rollups["primeiro_em"],
+        "ultimo_em": rollups["ultimo_em"],
+    })
+
+
+def load_fleet_channel_statistics(device_ids, days):
+    """
+    Média/mínimo/máximo das AI de todos os dispositivos nos últimos
+    days dias, em uma única busca de rollups.
+
+    A janela é alinhada à hora (sem bordas brutas), então a mesma entrada
+    de cache atende todas as sessões durante a hora. Horas que os rollups
+    ainda não processaram (agendamento atrasado ou ausente) vêm da
+    telemetria bruta.
+    Retorna {(device_id, "AI004"): {"media": ..., "minimo": ..., "maximo": ...}}.
+    """
+    stats = load_period_statistics(
+        device_ids,
+        HistoryWindow.last(days, grid=timedelta(hours=1)),
+        edges=False,
+    )
 
-            if not cfg or not bool(cfg.get("ativo", True)):
-                continue
+    stats = stats[stats["grandeza"].isin(TELEMETRY_AI_FIELDS)]
 
-            value = get_channel_value(
-                row,
-                configs,
-                device_id,
-                canal,
-                full_scale
-            )
+    return {
+        (device_id, canal): {
+            "media": media,
+            "minimo": minimo,
+            "maximo": maximo,
+        }
+        for device_id, canal, media, minimo, maximo in zip(
+            stats["device_id"],
+            stats["canal"],
+            stats["media"],
+            stats["minimo"],
+            stats["maximo"],
+        )
+    }
 
-            if not np.isfinite(value):
-                continue
 
-            alarm_min = safe_float(cfg.get("alarme_min"))
-            alarm_max = safe_float(cfg.get("alarme_max"))
+@swr_cache(
+    ttl=30,
+    default=pd.DataFrame,
+    label="histórico de alarmes",
+    enabled=_has_client,
+)
+def load_alarm_events(device_id, window):
+    supabase = get_supabase()
+    """
+    Carrega eventos de alarme cujo intervalo se sobrepõe à janela
+    (HistoryWindow) solicitada.
+    Horários são mantidos em UTC no banco e convertidos apenas na apresentação.
+    """
+    if supabase is None or not device_id:
+        return pd.DataFrame()
 
-            label = channel_display_name(
-                cfg,
-                canal
-            )
-            unit = channel_unit(
-                cfg,
-                ""
-            )
+    start = window.start
 
-            if np.isfinite(alarm_min) and value < alarm_min:
-                alarms.append({
-                    "Equipamento": device_id,
-                    "Grandeza": label,
-                    "Valor": value,
-                    "Limite": alarm_min,
-                    "Unidade": unit,
-                    "Data/Hora": when,
-                })
-
-            if np.isfinite(alarm_max) and value > alarm_max:
-                alarms.append({
-                    "Equipamento": device_id,
-                    "Grandeza": label,
-                    "Valor": value,
-                    "Limite": alarm_max,
-                    "Unidade": unit,
-                    "Data/Hora": when,
-                })
-
-        # Vibração.
-        v_limit = safe_float(
-            global_config.get("limite_rms")
+    response = (
+        supabase
+        .table("alarm_eventos")
+        .select(
+            "id,device_id,grandeza,canal,unidade,"
+            "motivo,valor_inicio,valor_fim,limite,"
+            "inicio_em,fim_em,ativo"
         )
+        .eq("device_id", str(device_id))
+        .lt("inicio_em", window.end.isoformat())
+        .or_(
+            "fim_em.is.null,"
+            f"fim_em.gte.{start.isoformat()}"
+        )
+        .order("inicio_em", desc=False)
+        .execute()
+    )
+
+    rows = response.data or []
 
-        for axis in ["x", "y", "z"]:
-            value = safe_float(
-                row.get(f"{axis}_mm_s")
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows)
+
+    for col in [
+        "inicio_em",
+        "fim_em",
+    ]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(
+                df[col],
+                utc=True,
+                errors="coerce",
             )
 
-            if (
-                np.isfinite(value)
-                and np.isfinite(v_limit)
-                and value > v_limit
-            ):
-                alarms.append({
-                    "Equipamento": device_id,
-                    "Grandeza": f"Vibração {axis.upper()}",
-                    "Valor": value,
-                    "Limite": v_limit,
-                    "Unidade": "mm/s RMS",
-                    "Data/Hora": when,
-                })
+    return df
+
+
+def config_version(*parts):
+    """Impressão digital da configuração (canais, fundo de escala, limites)."""
+    payload = json.dumps(
+        [
+            sorted((list(key), value) for key, value in part.items())
+            if isinstance(part, dict)
+            else part
+            for part in parts
+        ],
+        sort_keys=True,
+        default=str,
+    )
+
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _device_full_scales(device_index):
+    return {
+        device_id: record.adc_full_scale_v
+        for device_id, record in device_index.items()
+    }
+
+
+def _build_channel_table(configs, device_index):
+    full_scales = _device_full_scales(device_index)
+
+    return ChannelTable(
+        configs,
+        full_scales,
+        config_version(configs, full_scales),
+    )
+
+
+@st.cache_resource(max_entries=4)
+def _compile_channel_table(versions, _configs, _device_index):
+    return _build_channel_table(_configs, _device_index)
+
+
+def get_channel_table():
+    """
+    Tabela compilada das AI (services.channel_table), montada uma vez por
+    versão dos valores de load_channel_configs e load_devices. A impressão
+    digital do conteúdo (ChannelTable.version) só é calculada ao montar.
+    """
+    configs, configs_version = load_channel_configs.versioned()
+    devices, devices_version = load_devices.versioned()
+    device_index = _device_index(devices, devices_version)
+
+    if configs_version is None or devices_version is None:
+        return _build_channel_table(configs, device_index)
+
+    return _compile_channel_table(
+        (configs_version, devices_version),
+        configs,
+        device_index,
+    )
+
+
+@st.cache_resource(max_entries=4)
+def _compile_alarm_evaluator(version, _channel_table, _vibration_limit):
+    return AlarmEvaluator(_channel_table, _vibration_limit, version)
+
+
+def get_alarm_evaluator():
+    """
+    Avaliador de alarmes da versão atual da configuração. A versão cobre
+    todos os limites globais (limite_*), não só o limite_rms avaliado.
+    """
+    channel_table = get_channel_table()
+    global_config = load_global_config()
+    vibration_limit = safe_float(global_config.get("limite_rms"))
+    limits = {
+        key: value
+        for key, value in global_config.items()
+        if str(key).startswith("limite_")
+    }
+
+    return _compile_alarm_evaluator(
+        config_version(channel_table.version, limits),
+        channel_table,
+        vibration_limit,
+    )
+
+
+def build_alarms(df):
+    """
+    Alarmes de um DataFrame de telemetria (uma ou muitas leituras por
+    dispositivo), avaliados de forma vetorizada.
+    """
+    if df.empty:
+        return pd.DataFrame()
 
-    return pd.DataFrame(alarms)
+    return get_alarm_evaluator().evaluate(df)
 
 
 def update_channel(device_id, canal, payload):
@@ -885,8 +1927,8 @@ def update_device(device_id, payload):
                 "para atualização."
             )
 
-        load_devices.clear()
-        load_telemetry.clear()
+        clear_device_cache()
+        refresh_telemetry()
         return True, None
 
     except Exception as exc:
@@ -0,0 +1,139 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from .utils import *
+from .data import *
+from .alarms import VIBRATION_AXES
+from .analytics import health_scores
+from .channel_table import CHANNEL_COUNT
+
+
+# Colunas de device_rows lidas pelo status da frota (alarmes e saúde).
+# Só elas entram na versão dos dados: as demais vêm de select("*") e
+# podem ter dict/list (colunas JSON), que hash_pandas_object não aceita.
+FLEET_STATUS_COLUMNS = (
+    ["device_id", "recebido_em", "status"]
+    + [channel_field(f"AI{n:03d}") for n in range(1, CHANNEL_COUNT + 1)]
+    + [f"{axis}_mm_s" for axis in VIBRATION_AXES]
+)
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "builds": 0,
+    "device_evaluations": 0,
+}
+
+
+def fleet_status_metrics():
+    """
+    Quantas vezes o status da frota foi montado e quantas leituras de
+    dispositivo foram convertidas (uma passada por montagem).
+    """
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+class FleetStatus:
+    """
+    Alarmes, saúde e entradas ativas de todos os dispositivos para uma
+    versão dos dados (leituras + configuração).
+
+    Montado uma vez por versão e compartilhado entre páginas e sessões;
+    não deve ser alterado depois de criado.
+    """
+
+    def __init__(self, device_rows, evaluator):
+        # Canais convertidos uma única vez, para alarmes e saúde.
+        blocks = list(evaluator.device_blocks(device_rows))
+
+        self.version = evaluator.version
+        self.alarms = evaluator.evaluate(device_rows, blocks)
+        self.alarm_count = len(self.alarms)
+        self._alarms_by_device = {}
+        self.health = {}
+        self.active_channels = {}
+
+        if not self.alarms.empty:
+            for device_id, alarms in self.alarms.groupby(
+                "Equipamento",
+                sort=False,
+            ):
+                self._alarms_by_device[device_id] = alarms.reset_index(
+                    drop=True
+                )
+
+        if device_rows.empty:
+            return
+
+        device_ids = device_rows["device_id"].astype(str)
+
+        self.health = dict(zip(
+            device_ids,
+            health_scores(device_rows, evaluator, blocks).tolist(),
+        ))
+
+        for device_id in device_ids:
+            self.active_channels[device_id] = (
+                evaluator.channel_table
+                .device(device_id)
+                .active_names(8)
+            )
+
+    def alarms_for(self, device_id):
+        return self._alarms_by_device.get(
+            str(device_id),
+            pd.DataFrame(),
+        )
+
+    def health_for(self, device_id):
+        return self.health.get(str(device_id), 0)
+
+    def active_channels_for(self, device_id):
+        return self.active_channels.get(str(device_id), [])
+
+
+def _data_version(device_rows):
+    if device_rows.empty:
+        return 0
+
+    columns = [
+        column
+        for column in FLEET_STATUS_COLUMNS
+        if column in device_rows.columns
+    ]
+
+    return int(
+        pd.util.hash_pandas_object(device_rows[columns], index=False)
+        .sum()
+    )
+
+
+@st.cache_resource(max_entries=4)
+def _build_fleet_status(
+    data_version,
+    config_version,
+    _device_rows,
+    _evaluator,
+):
+    status = FleetStatus(_device_rows, _evaluator)
+
+    with _metrics_lock:
+        _metrics["builds"] += 1
+        _metrics["device_evaluations"] += len(_device_rows)
+
+    return status
+
+
+def get_fleet_status(device_rows):
+    """Status da frota para as leituras atuais (montado uma vez por versão)."""
+    evaluator = get_alarm_evaluator()
+
+    return _build_fleet_status(
+        _data_version(device_rows),
+        evaluator.version,
+        device_rows,
+        evaluator,
+    )
@@ -0,0 +1,436 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone, timedelta
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from core.constants import *
+from .cache import CircuitBreaker, session_context
+from .cache_governor import estimate_nbytes, governor
+from .shared_frames import share_frame
+
+
+# Intervalo com que window() repassa o andamento da consulta.
+_PROGRESS_POLL_SECONDS = 0.25
+
+
+class DeviceHistory:
+    """
+    Buffer append-only das leituras de um dispositivo.
+
+    Guarda o período já baixado, ordenado por recebido_em. Cada
+    atualização busca apenas o que chegou depois da marca d'água
+    (fetched_until) e descarta o que saiu da maior janela pedida nos
+    últimos HISTORY_RETENTION_SECONDS.
+
+    lock protege só o estado: as consultas ao banco rodam fora dele, uma
+    por vez por dispositivo (future, em segundo plano no HistoryStore), e
+    o resultado é publicado de uma vez.
+
+    O frame é somente leitura (services.shared_frames): since() devolve
+    uma fatia sem cópia, compartilhada por todas as sessões.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.columns = None
+        self.frame = None
+        self.covered_start = None
+        self.fetched_until = None
+        self.refreshed_at = 0.0
+        self.retention = timedelta(0)
+        self.retention_at = 0.0
+        self.wanted_start = None
+        self.future = None
+        self.progress = None
+
+    def request(self, start, now):
+        """
+        Registra uma janela pedida (com lock). A retenção cresce na hora;
+        encolhe quando a janela maior não é pedida há
+        HISTORY_RETENTION_SECONDS.
+        """
+        span = min(now - start, timedelta(days=HISTORY_MAX_DAYS))
+        idle = time.monotonic() - self.retention_at
+
+        if span >= self.retention or idle >= HISTORY_RETENTION_SECONDS:
+            self.retention = span
+            self.retention_at = time.monotonic()
+
+    def want(self, start):
+        """Janela que a próxima atualização deve cobrir (com lock)."""
+        if self.wanted_start is None or start < self.wanted_start:
+            self.wanted_start = start
+
+    def update(self, columns, fetch, progress=None):
+        """
+        Atualiza o buffer para a janela mais antiga pedida (want). Chamar
+        sem lock e no máximo uma vez por vez.
+        """
+        now = datetime.now(timezone.utc)
+        columns = tuple(columns)
+
+        with self.lock:
+            start = self.wanted_start or now
+            self.wanted_start = None
+
+            # Mudou o conjunto de AI ativas: o buffer não tem as colunas novas.
+            if self.columns != columns:
+                frame = None
+            else:
+                frame = self.frame
+
+            covered_start = self.covered_start
+            fetched_until = self.fetched_until
+            refreshed_at = self.refreshed_at
+            retention = self.retention
+
+        if frame is None:
+            frame = fetch(start, now, progress)
+            covered_start = start
+            fetched_until = now
+            refreshed_at = time.monotonic()
+
+        if start < covered_start:
+            older = fetch(start, covered_start, progress)
+            frame = _merge(frame, older)
+            covered_start = start
+
+        if time.monotonic() - refreshed_at >= HISTORY_REFRESH_SECONDS:
+            newer = fetch(
+                fetched_until
+                - timedelta(seconds=HISTORY_OVERLAP_SECONDS),
+                now,
+                None,
+            )
+            frame = _merge(frame, newer)
+            fetched_until = now
+            refreshed_at = time.monotonic()
+
+        # Nunca corta o que esta atualização foi buscar.
+        keep_from = min(now - retention, start)
+
+        if covered_start < keep_from:
+            first = frame.index.searchsorted(keep_from)
+            frame = frame.iloc[first:]
+            covered_start = keep_from
+
+        frame = share_frame(frame)
+
+        with self.lock:
+            self.columns = columns
+            self.frame = frame
+            self.covered_start = covered_start
+            self.fetched_until = fetched_until
+            self.refreshed_at = refreshed_at
+
+    def covers(self, start, columns, requested_at=0.0):
+        """
+        Buffer atual já atende start/columns sem consultar o banco. Uma
+        atualização concluída depois de requested_at também conta como
+        recente, mesmo que a consulta tenha demorado mais que
+        HISTORY_REFRESH_SECONDS.
+        """
+        return (
+            self.frame is not None
+            and self.columns == tuple(columns)
+            and self.covered_start <= start
+            and (
+                time.monotonic() - self.refreshed_at
+                < HISTORY_REFRESH_SECONDS
+                or self.refreshed_at >= requested_at
+            )
+        )
+
+    def since(self, start):
+        first = self.frame.index.searchsorted(start)
+        return self.frame.iloc[first:]
+
+    def buffered(self, start, columns):
+        """O que o buffer já tem desde start (com lock), ou None."""
+        if self.frame is None or self.columns != tuple(columns):
+            return None
+
+        return self.since(start)
+
+
+def _merge(frame, part):
+    if part.empty:
+        return frame
+
+    if frame.empty:
+        return part
+
+    merged = pd.concat([frame, part])
+    merged = merged[
+        ~merged.duplicated(
+            subset=["id"],
+            keep="first",
+        )
+    ]
+
+    if not merged.index.is_monotonic_increasing:
+        merged = merged.sort_index(kind="stable")
+
+    return merged
+
+
+class HistoryStore:
+    """
+    Buffers de histórico compartilhados pelas sessões de um mesmo escopo
+    (o usuário: cada um lê com o próprio token e a própria RLS).
+
+    Cada buffer entra no orçamento de memória (services.cache_governor)
+    com o tamanho do seu DataFrame; buffers despejados são baixados de
+    novo no próximo acesso.
+
+    As atualizações rodam em segundo plano, com o mesmo timeout e
+    circuit breaker dos loaders de services.cache: quem não pode esperar
+    recebe o que o buffer já tem.
+    """
+
+    name = "history"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=CACHE_REFRESH_WORKERS,
+            thread_name_prefix="axion-history",
+        )
+        self._breaker = CircuitBreaker(
+            CACHE_BREAKER_FAILURES,
+            CACHE_BREAKER_COOLDOWN_SECONDS,
+        )
+        self._metrics = {
+            "requests": 0,
+            "hits": 0,
+            "misses": 0,
+            "partial": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "failures": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def _device(self, key):
+        with self._lock:
+            return self._devices.setdefault(key, DeviceHistory())
+
+    def window(
+        self,
+        device_id,
+        start,
+        columns,
+        fetch,
+        progress=None,
+        timeout=CACHE_LOAD_TIMEOUT_SECONDS,
+        scope=None,
+    ):
+        """
+        (frame, completo): as leituras de device_id desde start, no buffer
+        do escopo scope.
+
+        fetch(inicio, fim, progress) deve retornar o DataFrame decodificado
+        de [inicio, fim), indexado por recebido_em.
+
+        Se a atualização não termina em timeout segundos, o circuit
+        breaker está aberto ou a consulta falha com algo já em memória,
+        devolve o que o buffer tem (None se nada) e completo=False; a
+        consulta continua em segundo plano. timeout=None espera até o fim,
+        sem consultar o breaker (relatórios não saem com dados parciais).
+        """
+        key = (scope, str(device_id))
+        history = self._device(key)
+        columns = tuple(columns)
+        requested_at = time.monotonic()
+        missed = False
+        self._count("requests")
+
+        if timeout is not None:
+            deadline = requested_at + timeout
+
+        while True:
+            with history.lock:
+                history.request(start, datetime.now(timezone.utc))
+
+                if history.covers(start, columns, requested_at):
+                    governor.touch(self, key)
+                    frame = history.since(start)
+                    complete = True
+                    break
+
+                history.want(start)
+
+                future = self._refresh(
+                    key,
+                    history,
+                    columns,
+                    fetch,
+                    check_breaker=timeout is not None,
+                )
+
+            if not missed:
+                self._count("misses")
+                missed = True
+
+            # Sessões que chegam durante a consulta esperam pela mesma e,
+            # se pediram uma janela maior depois que ela começou, entram
+            # na próxima.
+            try:
+                done = future is not None and self._wait(
+                    history,
+                    future,
+                    None if timeout is None else deadline,
+                    progress,
+                )
+            except Exception:
+                with history.lock:
+                    frame = history.buffered(start, columns)
+
+                if frame is None:
+                    raise
+
+                done = False
+
+            if not done:
+                with history.lock:
+                    frame = history.buffered(start, columns)
+
+                complete = False
+                break
+
+        if not missed:
+            self._count("hits")
+
+        if not complete:
+            self._count("partial")
+
+        governor.enforce()
+        return frame, complete
+
+    def _refresh(self, key, history, columns, fetch, check_breaker):
+        """
+        Agenda a atualização do buffer (chamar com history.lock). Se já há
+        uma em andamento, reaproveita a mesma.
+        """
+        if history.future is not None:
+            self._count("coalesced")
+            return history.future
+
+        with self._lock:
+            if check_breaker and not self._breaker.allow():
+                return None
+
+            self._metrics["executions"] += 1
+
+        history.progress = None
+        history.future = self._executor.submit(
+            self._run,
+            key,
+            history,
+            columns,
+            fetch,
+            get_script_run_ctx(suppress_warning=True),
+        )
+        return history.future
+
+    def _wait(self, history, future, deadline, progress):
+        """
+        Espera future até deadline (None: sem limite), repassando o
+        andamento a progress na thread de quem chamou. True se terminou.
+        """
+        while True:
+            wait = _PROGRESS_POLL_SECONDS
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    return False
+
+                wait = min(wait, remaining)
+
+            try:
+                future.result(timeout=wait)
+                return True
+            except FutureTimeout:
+                if progress is not None and history.progress is not None:
+                    progress(*history.progress)
+
+    def _run(self, key, history, columns, fetch, ctx):
+        # A consulta usa o cliente Supabase da sessão que a pediu.
+        def report(done, total):
+            history.progress = (done, total)
+
+        try:
+            with session_context(ctx):
+                self._update(key, history, columns, fetch, report)
+        except Exception:
+            with self._lock:
+                self._metrics["failures"] += 1
+                self._breaker.failure()
+            raise
+        else:
+            with self._lock:
+                self._breaker.success()
+        finally:
+            with history.lock:
+                history.future = None
+
+    def _update(self, key, history, columns, fetch, progress):
+        """Atualiza o buffer e o recontabiliza."""
+        history.update(columns, fetch, progress)
+
+        with self._lock:
+            # Buffer já despejado pelo orçamento: não volta a contar.
+            if self._devices.get(key) is not history:
+                return
+
+        governor.charge(self, key, estimate_nbytes(history.frame))
+
+    def metrics(self):
+        """
+        requests, hits (buffer já atendia), misses, partial (devolvido
+        incompleto), executions (atualizações), coalesced (esperaram uma
+        atualização em andamento) e failures, mais entries,
+        resident_bytes e evictions do orçamento de memória.
+        """
+        memory = governor.metrics().get(self.name, {})
+
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["breaker_open"] = self._breaker.is_open()
+
+        metrics["entries"] = memory.get("entries", 0)
+        metrics["resident_bytes"] = memory.get("resident_bytes", 0)
+        metrics["evictions"] = memory.get("evictions", 0)
+        return metrics
+
+    def drop(self, key):
+        """Descarte pedido pelo orçamento de memória."""
+        with self._lock:
+            self._devices.pop(key, None)
+
+    def clear_scope(self, scope):
+        """Descarta os buffers de scope (ex.: no logout do usuário)."""
+        with self._lock:
+            for key in [key for key in self._devices if key[0] == scope]:
+                del self._devices[key]
+                governor.release(self, key)
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+            governor.release_all(self)
+
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
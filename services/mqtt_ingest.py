@@ -0,0 +1,321 @@
+import json
+import threading
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import paho.mqtt.client as mqtt
+
+from core.constants import *
+
+
+class DeviceRingBuffer:
+    """
+    Últimas capacity leituras de um dispositivo em arrays NumPy de
+    tamanho fixo: horários em datetime64[ns] (UTC) e grandezas em float32.
+    Mantidas em ordem de recebido_em, mesmo com mensagens fora de ordem.
+    """
+
+    def __init__(self, fields, capacity=MQTT_BUFFER_SIZE):
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.received = np.full(capacity, np.datetime64("NaT"), "datetime64[ns]")
+        self.device_time = np.full(capacity, np.datetime64("NaT"), "datetime64[ns]")
+        self.values = np.full((capacity, len(self.fields)), np.nan, np.float32)
+        self.next = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, received, device_time, values):
+        with self.lock:
+            if self.count:
+                newest = self.received[(self.next - 1) % self.capacity]
+
+                if received < newest:
+                    self._insert(received, device_time, values)
+                    return
+
+            index = self.next
+            self.received[index] = received
+            self.device_time[index] = device_time
+            self.values[index] = values
+            self.next = (index + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def _insert(self, received, device_time, values):
+        """
+        Mensagem atrasada: entra na posição de recebido_em. Com o buffer
+        cheio, a mais antiga sai (ou a própria, se for mais antiga que
+        todas). Raro; reorganiza os arrays em O(capacity).
+        """
+        order = self._order()
+        position = int(
+            np.searchsorted(self.received[order], received, side="right")
+        )
+
+        if self.count == self.capacity and position == 0:
+            return
+
+        received_all = np.insert(self.received[order], position, received)
+        device_time_all = np.insert(
+            self.device_time[order],
+            position,
+            device_time,
+        )
+        values_all = np.insert(self.values[order], position, values, axis=0)
+
+        keep = min(len(received_all), self.capacity)
+        self.received[:keep] = received_all[-keep:]
+        self.device_time[:keep] = device_time_all[-keep:]
+        self.values[:keep] = values_all[-keep:]
+        self.count = keep
+        self.next = keep % self.capacity
+
+    def _order(self):
+        if self.count < self.capacity:
+            return np.arange(self.count)
+
+        return (np.arange(self.capacity) + self.next) % self.capacity
+
+    def frame(self, device_id, last=None):
+        """Leituras em ordem cronológica, no esquema de public.telemetria."""
+        with self.lock:
+            order = self._order()
+
+            if last is not None:
+                order = order[-last:]
+
+            data = {
+                "device_id": np.full(len(order), device_id, dtype=object),
+                "timestamp_dispositivo": pd.to_datetime(
+                    self.device_time[order]
+                ).tz_localize("UTC"),
+                "recebido_em": pd.to_datetime(
+                    self.received[order]
+                ).tz_localize("UTC"),
+            }
+
+            for column, field in enumerate(self.fields):
+                data[field] = self.values[order, column].copy()
+
+        return pd.DataFrame(data)
+
+
+def decode_message(topic, payload, fields):
+    """
+    Decodifica uma mensagem de telemetria AXION (JSON com os mesmos campos
+    de public.telemetria). device_id pode vir no payload ou no tópico
+    axion/<device_id>/telemetria.
+    """
+    data = json.loads(payload)
+
+    if not isinstance(data, dict):
+        raise ValueError("Payload de telemetria deve ser um objeto JSON.")
+
+    device_id = str(data.get("device_id") or "").strip()
+
+    if not device_id:
+        parts = str(topic).split("/")
+        device_id = parts[-2] if len(parts) >= 2 else ""
+
+    if not device_id:
+        raise ValueError("Mensagem de telemetria sem device_id.")
+
+    received = pd.to_datetime(
+        data.get("recebido_em") or datetime.now(timezone.utc),
+        utc=True,
+        errors="coerce",
+    )
+    device_time = pd.to_datetime(
+        data.get("timestamp_dispositivo"),
+        utc=True,
+        errors="coerce",
+    )
+
+    values = np.array([
+        np.nan if data.get(field) is None else data.get(field)
+        for field in fields
+    ], dtype=np.float32)
+
+    return (
+        device_id,
+        np.datetime64(received.tz_localize(None), "ns")
+        if not pd.isna(received)
+        else np.datetime64("NaT"),
+        np.datetime64(device_time.tz_localize(None), "ns")
+        if not pd.isna(device_time)
+        else np.datetime64("NaT"),
+        values,
+    )
+
+
+class MqttTelemetryIngest:
+    """
+    Assinante MQTT em thread própria (loop do paho) que mantém um
+    DeviceRingBuffer por dispositivo cadastrado (set_devices). Mensagens
+    de outros device_id são descartadas, para que tópicos arbitrários não
+    criem buffers sem limite.
+
+    client_factory permite usar outro cliente compatível com paho
+    (ex.: um broker embutido nos testes).
+    """
+
+    def __init__(
+        self,
+        fields,
+        host,
+        port=MQTT_DEFAULT_PORT,
+        topic=MQTT_DEFAULT_TOPIC,
+        username=None,
+        password=None,
+        tls=False,
+        capacity=MQTT_BUFFER_SIZE,
+        client_factory=mqtt.Client,
+    ):
+        self.fields = list(fields)
+        self.host = host
+        self.port = int(port)
+        self.topic = topic
+        self.username = username
+        self.password = password
+        self.tls = bool(tls)
+        self.capacity = capacity
+        self._client_factory = client_factory
+        self._client = None
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._devices = frozenset()
+        self._metrics = {
+            "messages": 0,
+            "decode_errors": 0,
+            "unknown_devices": 0,
+            "connected": False,
+            "last_message_at": None,
+        }
+
+    def start(self):
+        client = self._client_factory(
+            client_id=f"axion-dashboard-{uuid.uuid4().hex[:8]}",
+            clean_session=True,
+        )
+
+        if self.username:
+            client.username_pw_set(self.username, self.password)
+
+        if self.tls:
+            client.tls_set()
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.connect_async(self.host, self.port, keepalive=30)
+        client.loop_start()
+        self._client = client
+
+    def stop(self):
+        client = self._client
+        self._client = None
+
+        if client is not None:
+            client.loop_stop()
+            client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self._metrics["connected"] = rc == 0
+
+        if rc == 0:
+            # Reassina a cada reconexão (clean_session).
+            client.subscribe(self.topic, qos=0)
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._metrics["connected"] = False
+
+    def _on_message(self, client, userdata, message):
+        self.handle_message(message.topic, message.payload)
+
+    def handle_message(self, topic, payload):
+        try:
+            device_id, received, device_time, values = decode_message(
+                topic,
+                payload,
+                self.fields,
+            )
+        except (ValueError, TypeError):
+            self._metrics["decode_errors"] += 1
+            return
+
+        buffer = self._buffer(device_id)
+
+        if buffer is None:
+            self._metrics["unknown_devices"] += 1
+            return
+
+        buffer.append(received, device_time, values)
+        self._metrics["messages"] += 1
+        self._metrics["last_message_at"] = datetime.now(timezone.utc)
+
+    def set_devices(self, device_ids):
+        """
+        Dispositivos cadastrados que podem receber leituras. Buffers de
+        dispositivos que saíram do cadastro são liberados.
+        """
+        devices = frozenset(str(device_id) for device_id in device_ids)
+
+        with self._lock:
+            if devices == self._devices:
+                return
+
+            self._devices = devices
+
+            for device_id in list(self._buffers):
+                if device_id not in devices:
+                    del self._buffers[device_id]
+
+    def _buffer(self, device_id):
+        with self._lock:
+            buffer = self._buffers.get(device_id)
+
+            if buffer is None and device_id in self._devices:
+                buffer = DeviceRingBuffer(self.fields, self.capacity)
+                self._buffers[device_id] = buffer
+
+            return buffer
+
+    def metrics(self):
+        return dict(self._metrics)
+
+    def recent_frame(self, device_id, last=None):
+        """Leituras recentes de um dispositivo, direto da memória."""
+        with self._lock:
+            buffer = self._buffers.get(str(device_id))
+
+        if buffer is None:
+            return pd.DataFrame(
+                columns=["device_id", "timestamp_dispositivo", "recebido_em"]
+                + self.fields
+            )
+
+        return buffer.frame(str(device_id), last)
+
+    def latest_frame(self):
+        """Última leitura de cada dispositivo."""
+        with self._lock:
+            buffers = list(self._buffers.items())
+
+        frames = [
+            buffer.frame(device_id, last=1)
+            for device_id, buffer in buffers
+        ]
+        frames = [frame for frame in frames if not frame.empty]
+
+        if not frames:
+            return pd.DataFrame()
+
+        return pd.concat(frames, ignore_index=True)
+
+
+def start_mqtt_ingest(fields, **settings):
+    ingest = MqttTelemetryIngest(fields, **settings)
+    ingest.start()
+    return ingest
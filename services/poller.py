@@ -0,0 +1,211 @@
+import atexit
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from core.constants import *
+from .cache import single_flight
+from .shared_frames import share_frame
+
+
+@dataclass(frozen=True)
+class FleetSnapshot:
+    """
+    Última leitura da frota publicada pelo poller.
+
+    Imutável: cada consulta publica um novo objeto com version + 1.
+    O DataFrame é compartilhado entre sessões, com colunas somente
+    leitura (services.shared_frames).
+    """
+    version: int = 0
+    telemetry: pd.DataFrame = field(default_factory=pd.DataFrame)
+    fetched_at: datetime | None = None
+    error: str | None = None
+
+    def age_seconds(self):
+        if self.fetched_at is None:
+            return float("inf")
+
+        return max(
+            0.0,
+            (datetime.now(timezone.utc) - self.fetched_at).total_seconds(),
+        )
+
+    def is_stale(self):
+        return self.age_seconds() > 3 * TELEMETRY_POLL_SECONDS
+
+
+class TelemetryPoller:
+    """
+    Thread única por processo que consulta a última leitura da frota a
+    cada interval segundos e publica um FleetSnapshot.
+
+    As sessões só leem snapshot(), sem I/O de rede. O cliente (com a
+    chave de serviço, nunca o de uma sessão) e as configurações das AI
+    vêm de attach().
+    Nem a primeira consulta roda na thread da sessão: attach() espera por
+    ela no máximo CACHE_LOAD_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, fetch, interval=TELEMETRY_POLL_SECONDS):
+        self._fetch = fetch
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._flight = single_flight("telemetry_poll")
+        self._wake = threading.Event()
+        # Marcado ao fim de cada consulta (com ou sem sucesso).
+        self._polled = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._client = None
+        self._configs = {}
+        self._attached_at = 0.0
+        self._snapshot = FleetSnapshot()
+        self._metrics = {
+            "polls": 0,
+            "failures": 0,
+            "consecutive_failures": 0,
+            "last_duration_s": None,
+            "total_duration_s": 0.0,
+            "last_error": None,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="axion-telemetry-poller",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def attach(self, client, configs, timeout=CACHE_LOAD_TIMEOUT_SECONDS):
+        """
+        Registra o cliente de serviço e a configuração atual. Sem nenhuma
+        leitura ainda, antecipa a consulta da thread e espera por ela no
+        máximo timeout segundos; depois disso a sessão segue com o
+        snapshot vazio e recebe os dados num próximo rerun.
+        """
+        with self._lock:
+            self._client = client
+            self._configs = configs
+            self._attached_at = time.monotonic()
+
+        if client is not None and self._snapshot.version == 0:
+            self._wake.set()
+            self._polled.wait(timeout)
+
+    def request_refresh(self):
+        """Antecipa a próxima consulta (ex.: após cadastrar equipamento)."""
+        self._wake.set()
+
+    def snapshot(self):
+        return self._snapshot
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        polls = metrics["polls"]
+        metrics["avg_duration_s"] = (
+            metrics["total_duration_s"] / polls
+            if polls
+            else None
+        )
+        metrics["coalesced_polls"] = self._flight.metrics()["coalesced"]
+        metrics["snapshot_version"] = self._snapshot.version
+        metrics["snapshot_age_s"] = self._snapshot.age_seconds()
+        return metrics
+
+    def poll(self):
+        with self._lock:
+            client = self._client
+            configs = self._configs
+
+        if client is None:
+            return self._snapshot
+
+        # Sessões abrindo juntas (attach) e a thread compartilham a mesma
+        # consulta em andamento.
+        return self._flight.do(
+            "telemetria_ultima_leitura",
+            lambda: self._poll(client, configs),
+        )
+
+    def _poll(self, client, configs):
+        with self._poll_lock:
+            started = time.monotonic()
+
+            try:
+                telemetry = self._fetch(client, configs)
+                error = None
+            except Exception as exc:
+                telemetry = None
+                error = str(exc)
+
+            duration = time.monotonic() - started
+
+            with self._lock:
+                self._metrics["polls"] += 1
+                self._metrics["last_duration_s"] = duration
+                self._metrics["total_duration_s"] += duration
+
+                if error is None:
+                    self._metrics["consecutive_failures"] = 0
+                    snapshot = FleetSnapshot(
+                        version=self._snapshot.version + 1,
+                        telemetry=share_frame(telemetry),
+                        fetched_at=datetime.now(timezone.utc),
+                    )
+                else:
+                    self._metrics["failures"] += 1
+                    self._metrics["consecutive_failures"] += 1
+                    self._metrics["last_error"] = error
+                    # Mantém a última leitura boa, sinalizando o erro.
+                    snapshot = FleetSnapshot(
+                        version=self._snapshot.version,
+                        telemetry=self._snapshot.telemetry,
+                        fetched_at=self._snapshot.fetched_at,
+                        error=error,
+                    )
+
+                self._snapshot = snapshot
+
+            self._polled.set()
+            return snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            idle = (
+                time.monotonic() - self._attached_at
+                > TELEMETRY_POLL_IDLE_SECONDS
+            )
+
+            if not idle:
+                self.poll()
+
+            self._wake.wait(self._interval)
+            self._wake.clear()
+
+
+def start_poller(fetch, interval=TELEMETRY_POLL_SECONDS):
+    poller = TelemetryPoller(fetch, interval)
+    poller.start()
+    atexit.register(poller.stop)
+    return poller
@@ -0,0 +1,676 @@
+"""
+Geração de relatórios PDF em segundo plano.
+
+submit() devolve na hora o id do job; a página acompanha status() e, ao
+final, lê os bytes com result(). Cada job passa pelas fases:
+
+- fetch: leituras e eventos do período (thread do servidor, com o
+  contexto da sessão que pediu, para usar o cliente Supabase dela);
+- stats, layout, render: em um processo services.report_worker, sem
+  bloquear o servidor Streamlit e aproveitando vários núcleos.
+
+Cada thread do pool mantém o seu processo de relatório, iniciado pelo
+módulo services.report_worker (o app.py não é executado nele); se o
+processo morrer, a thread inicia outro no próximo job.
+
+O progresso e o pedido de cancelamento são trocados por arquivos no
+diretório do cache; os PDFs prontos ficam no mesmo diretório, limitados
+por REPORT_CACHE_MAX_FILES e REPORT_CACHE_MAX_MB (os mais antigos saem).
+O id do job é derivado do conteúdo (service_report_key), então pedidos
+iguais de sessões diferentes reaproveitam o mesmo job e o mesmo arquivo.
+
+submit_batch() agenda vários relatórios de uma vez (exportação de um
+local inteiro) e grava um ZIP à medida que cada PDF fica pronto, lendo
+os arquivos do disco — os PDFs nunca ficam todos em memória.
+"""
+import hashlib
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from core.constants import *
+from .cache import session_context
+from .data import get_channel_table, load_alarm_events, load_history
+from .report_worker import ReportCancelled, job_path, write_atomic
+
+
+REPORT_PHASES = ("fetch", "stats", "layout", "render")
+
+REPORT_CACHE_DIR = os.path.join(
+    tempfile.gettempdir(),
+    "axion_relatorios",
+)
+
+# Raiz do projeto, para o processo encontrar o pacote services.
+_PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)
+
+
+@dataclass(frozen=True)
+class ReportJobStatus:
+    """Situação de um job: queued, running, done, failed ou cancelled."""
+    job_id: str
+    state: str
+    phase: str | None = None
+    error: str | None = None
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    @property
+    def progress(self):
+        if self.state == "done":
+            return 1.0
+
+        if self.phase not in REPORT_PHASES:
+            return 0.0
+
+        return REPORT_PHASES.index(self.phase) / len(REPORT_PHASES)
+
+
+def report_job_id(key):
+    """Id estável do job para o conteúdo key (ver service_report_key)."""
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+
+
+def report_batch_id(name, items):
+    """Id estável do lote (ver ReportJobs.submit_batch)."""
+    return report_job_id(("lote", name, tuple(key for key, _, _ in items)))
+
+
+class _Worker:
+    """Processo services.report_worker de uma thread de ReportJobs."""
+
+    def __init__(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            path
+            for path in (_PROJECT_DIR, env.get("PYTHONPATH"))
+            if path
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "services.report_worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+            text=True,
+        )
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def render(self, directory, job_id):
+        """Resposta do processo para job_id (ver services.report_worker)."""
+        request = {"directory": directory, "job_id": job_id}
+
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            reply = self.process.stdout.readline()
+        except (OSError, ValueError):
+            reply = ""
+
+        if not reply:
+            self.close()
+            raise RuntimeError(
+                "processo do relatório encerrado "
+                f"(código {self.process.returncode})"
+            )
+
+        return json.loads(reply)
+
+    def close(self):
+        if self.alive:
+            self.process.kill()
+
+        self.process.wait()
+
+
+@dataclass(frozen=True)
+class ReportBatchStatus:
+    """Situação de um lote: running, done, cancelled ou failed."""
+    batch_id: str
+    state: str
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+
+    @property
+    def active(self):
+        return self.state == "running"
+
+    @property
+    def progress(self):
+        if self.state == "done" or not self.total:
+            return 1.0 if self.state == "done" else 0.0
+
+        return (self.completed + self.failed) / self.total
+
+
+class _Job:
+    __slots__ = ("state", "phase", "error")
+
+    def __init__(self):
+        self.state = "queued"
+        self.phase = None
+        self.error = None
+
+
+class _Batch:
+    __slots__ = ("state", "total", "completed", "failed", "job_ids")
+
+    def __init__(self, total):
+        self.state = "running"
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.job_ids = []
+
+
+class ReportJobs:
+    """Fila de relatórios compartilhada pelo servidor."""
+
+    def __init__(
+        self,
+        directory=REPORT_CACHE_DIR,
+        workers=REPORT_WORKERS,
+        max_files=REPORT_CACHE_MAX_FILES,
+        max_bytes=REPORT_CACHE_MAX_MB * 1024 * 1024,
+    ):
+        workers = workers or os.cpu_count() or 2
+
+        self.workers = workers
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._batches = {}
+        self._threads = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="axion-report",
+        )
+        self._local = threading.local()
+        self._workers_lock = threading.Lock()
+        self._workers = []
+
+    def submit(self, key, fetch):
+        """
+        Agenda o relatório de key. fetch() deve devolver um dict com
+        device_id, row, history, period_label, alarm_events e
+        device_channels, e opcionalmente weighting. Devolve o id do job.
+        """
+        job_id = report_job_id(key)
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+            if job is not None and job.state in ("queued", "running"):
+                return job_id
+
+            if self._cached(job_id):
+                return job_id
+
+            job = _Job()
+            self._jobs[job_id] = job
+
+        self._remove(job_id, ".cancel")
+        self._remove(job_id, ".json")
+
+        self._threads.submit(
+            self._run,
+            job_id,
+            job,
+            fetch,
+            get_script_run_ctx(suppress_warning=True),
+        )
+        return job_id
+
+    def _worker(self):
+        """Processo de relatório da thread atual (um novo se morreu)."""
+        worker = getattr(self._local, "worker", None)
+
+        if worker is None or not worker.alive:
+            worker = _Worker()
+            self._local.worker = worker
+
+            with self._workers_lock:
+                self._workers = [
+                    running
+                    for running in self._workers
+                    if running.alive
+                ]
+                self._workers.append(worker)
+
+        return worker
+
+    def _render(self, job_id, *args):
+        """Gera o PDF de job_id no processo de relatório da thread."""
+        write_atomic(
+            job_path(self.directory, job_id, ".input"),
+            pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+
+        reply = self._worker().render(self.directory, job_id)
+
+        if reply["state"] == "cancelled":
+            raise ReportCancelled()
+
+        if reply["state"] == "failed":
+            raise RuntimeError(reply["error"])
+
+    def _run(self, job_id, job, fetch, ctx):
+        # fetch usa o cliente Supabase da sessão que pediu o relatório.
+        with session_context(ctx):
+            self._run_job(job_id, job, fetch)
+
+    def _run_job(self, job_id, job, fetch):
+        try:
+            self._set(job, state="running", phase="fetch")
+            inputs = fetch()
+
+            if self._cancel_requested(job_id):
+                raise ReportCancelled()
+
+            self._render(
+                job_id,
+                inputs["device_id"],
+                inputs["row"],
+                inputs["history"],
+                inputs["period_label"],
+                inputs["alarm_events"],
+                inputs["device_channels"],
+                inputs.get("weighting", "leitura"),
+            )
+        except ReportCancelled:
+            self._set(job, state="cancelled")
+        except Exception as exc:
+            self._set(
+                job,
+                state="failed",
+                error=str(exc) or type(exc).__name__,
+            )
+        else:
+            self._set(job, state="done", phase=None)
+            self._prune()
+        finally:
+            self._remove(job_id, ".input")
+            self._remove(job_id, ".json")
+            self._remove(job_id, ".cancel")
+            self._forget_finished()
+
+    def _forget_finished(self):
+        """Esquece os jobs encerrados mais antigos (o PDF segue em disco)."""
+        with self._lock:
+            finished = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.state not in ("queued", "running")
+            ]
+
+            for job_id in finished[:-self.max_files]:
+                del self._jobs[job_id]
+
+    def _set(self, job, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+            if job is None:
+                state = "done" if self._cached(job_id) else None
+                return ReportJobStatus(job_id, state) if state else None
+
+            state = job.state
+            phase = job.phase
+            error = job.error
+
+        # PDF já removido pela limpeza do cache: precisa ser gerado de novo.
+        if state == "done" and not self._cached(job_id):
+            return None
+
+        # Fases que rodam no processo filho.
+        if state == "running":
+            phase = self._read_phase(job_id) or phase
+
+        return ReportJobStatus(job_id, state, phase, error)
+
+    def result(self, job_id):
+        """Bytes do PDF pronto, ou None."""
+        return self._read(job_id, ".pdf")
+
+    def _read(self, name, suffix):
+        path = job_path(self.directory, name, suffix)
+
+        try:
+            with open(path, "rb") as handle:
+                data = handle.read()
+        except FileNotFoundError:
+            return None
+
+        # Uso recente: fica por último na limpeza.
+        os.utime(path)
+        return data
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+            if job is None or job.state not in ("queued", "running"):
+                return False
+
+        write_atomic(job_path(self.directory, job_id, ".cancel"), b"")
+        return True
+
+    def submit_batch(self, name, items):
+        """
+        Agenda um relatório por item e monta <lote>.zip com os PDFs.
+
+        items: lista de (key, fetch, arcname), como em submit(); arcname é
+        o nome do PDF dentro do ZIP. Os relatórios rodam em paralelo no
+        pool. Devolve o id do lote.
+        """
+        batch_id = report_batch_id(name, items)
+
+        with self._lock:
+            batch = self._batches.get(batch_id)
+
+            if batch is not None and batch.state == "running":
+                return batch_id
+
+            if os.path.exists(job_path(self.directory, batch_id, ".zip")):
+                return batch_id
+
+            batch = _Batch(len(items))
+            self._batches[batch_id] = batch
+
+        members = [
+            (self.submit(key, fetch), arcname)
+            for key, fetch, arcname in items
+        ]
+        batch.job_ids = [job_id for job_id, _ in members]
+
+        threading.Thread(
+            target=self._run_batch,
+            args=(batch_id, batch, members),
+            name="axion-report-batch",
+            daemon=True,
+        ).start()
+        return batch_id
+
+    def _run_batch(self, batch_id, batch, members):
+        path = job_path(self.directory, batch_id, ".zip")
+        temp = f"{path}.tmp"
+        pending = dict(members)
+        errors = []
+
+        try:
+            with zipfile.ZipFile(
+                temp,
+                "w",
+                compression=zipfile.ZIP_DEFLATED,
+            ) as archive:
+                while pending and batch.state == "running":
+                    for job_id, arcname in list(pending.items()):
+                        status = self.status(job_id)
+
+                        if status is not None and status.active:
+                            continue
+
+                        del pending[job_id]
+                        pdf = job_path(self.directory, job_id, ".pdf")
+
+                        if status is not None and status.state == "done":
+                            try:
+                                # Copia do disco para o ZIP em blocos.
+                                archive.write(pdf, arcname)
+                            except FileNotFoundError:
+                                pass
+                            else:
+                                self._set(
+                                    batch,
+                                    completed=batch.completed + 1,
+                                )
+                                continue
+
+                        reason = (
+                            (status.error or status.state)
+                            if status is not None
+                            else "PDF removido do cache"
+                        )
+                        errors.append(f"{arcname}: {reason}")
+                        self._set(batch, failed=batch.failed + 1)
+
+                    if pending:
+                        time.sleep(0.25)
+
+                if errors:
+                    archive.writestr(
+                        "ERROS.txt",
+                        "\n".join(errors) + "\n",
+                    )
+
+            if batch.state != "running":
+                os.remove(temp)
+                return
+
+            os.replace(temp, path)
+            self._set(batch, state="done")
+            self._prune()
+        except Exception:
+            self._set(batch, state="failed")
+
+            if os.path.exists(temp):
+                os.remove(temp)
+
+            raise
+
+    def batch_status(self, batch_id):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+
+            if batch is not None:
+                status = ReportBatchStatus(
+                    batch_id,
+                    batch.state,
+                    batch.total,
+                    batch.completed,
+                    batch.failed,
+                )
+            else:
+                status = None
+
+        zip_path = job_path(self.directory, batch_id, ".zip")
+
+        if status is None or status.state == "done":
+            if not os.path.exists(zip_path):
+                return None
+
+            if status is None:
+                status = ReportBatchStatus(batch_id, "done")
+
+        return status
+
+    def batch_result(self, batch_id):
+        """Bytes do ZIP pronto, ou None (ler só no download)."""
+        return self._read(batch_id, ".zip")
+
+    def cancel_batch(self, batch_id):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+
+            if batch is None or batch.state != "running":
+                return False
+
+            batch.state = "cancelled"
+            job_ids = list(batch.job_ids)
+
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+        return True
+
+    def _cancel_requested(self, job_id):
+        return os.path.exists(job_path(self.directory, job_id, ".cancel"))
+
+    def _cached(self, job_id):
+        return os.path.exists(job_path(self.directory, job_id, ".pdf"))
+
+    def _read_phase(self, job_id):
+        path = job_path(self.directory, job_id, ".json")
+
+        try:
+            with open(path, "rb") as handle:
+                return json.loads(handle.read()).get("phase")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _remove(self, job_id, suffix):
+        try:
+            os.remove(job_path(self.directory, job_id, suffix))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self):
+        """
+        Mantém no máximo max_files arquivos prontos (PDFs e ZIPs) e
+        max_bytes no diretório; os usados há mais tempo saem primeiro.
+        """
+        files = []
+
+        for name in os.listdir(self.directory):
+            if not name.endswith((".pdf", ".zip")):
+                continue
+
+            path = os.path.join(self.directory, name)
+
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            files.append((info.st_mtime, info.st_size, path))
+
+        files.sort(reverse=True)
+        total = 0
+
+        for position, (_, size, path) in enumerate(files):
+            total += size
+
+            if position >= self.max_files or total > self.max_bytes:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def metrics(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+
+        return {
+            state: states.count(state)
+            for state in ("queued", "running", "done", "failed", "cancelled")
+        }
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+        with self._workers_lock:
+            workers, self._workers = self._workers, []
+
+        for worker in workers:
+            worker.close()
+
+
+def location_device_rows(device_rows, location):
+    """Linhas de device_rows dos ativos de location."""
+    if device_rows.empty or "local" not in device_rows.columns:
+        return device_rows.iloc[0:0]
+
+    return device_rows[device_rows["local"].astype(str) == str(location)]
+
+
+def location_report_items(
+    device_rows,
+    location,
+    window,
+    period_label,
+    weighting="leitura",
+):
+    """
+    Itens de submit_batch() para todos os ativos de location: um relatório
+    de serviço por dispositivo na mesma janela, com a tabela de canais
+    compilada uma única vez.
+
+    Nada é consultado aqui: histórico e eventos de alarme são carregados
+    pelo fetch() de cada item, nas threads do pool de relatórios. A chave
+    usa a janela (alinhada à grade de HISTORY_WINDOW_GRID_SECONDS), a
+    última leitura do snapshot da frota e a versão da configuração, então
+    leituras novas mudam o id do lote sem baixar o histórico.
+    """
+    rows = location_device_rows(device_rows, location)
+    channel_table = get_channel_table()
+    items = []
+
+    for _, row in rows.iterrows():
+        device_id = str(row["device_id"])
+
+        def fetch(device_id=device_id, row=row):
+            return {
+                "device_id": device_id,
+                "row": row,
+                "history": load_history(
+                    device_id,
+                    window,
+                    timeout=None,
+                ),
+                "period_label": period_label,
+                "alarm_events": load_alarm_events(device_id, window),
+                "device_channels": channel_table.device(device_id),
+                "weighting": weighting,
+            }
+
+        key = (
+            device_id,
+            window,
+            period_label,
+            weighting,
+            (
+                str(row.get("recebido_em")),
+                str(row.get("nome", device_id)),
+                str(row.get("local", location)),
+                str(row.get("status", "Offline")),
+            ),
+            channel_table.version,
+        )
+        arcname = (
+            f"AXION_{device_id}_Relatorio_"
+            f"{period_label.replace(' ', '_')}.pdf"
+        )
+        items.append((key, fetch, arcname))
+
+    return items
+
+
+@st.cache_resource(on_release=lambda jobs: jobs.shutdown())
+def get_report_jobs():
+    return ReportJobs()
@@ -0,0 +1,107 @@
+"""
+Processo que gera os PDFs de services.report_jobs.
+
+Iniciado como `python -m services.report_worker`: o interpretador começa
+por este módulo, então o app.py nunca é executado no processo do
+relatório, sem mexer no __main__ do servidor.
+
+Protocolo, uma linha JSON por job:
+
+- stdin: {"directory": ..., "job_id": ...}; os argumentos do relatório
+  estão em <job_id>.input (pickle) no diretório;
+- stdout: {"state": "done"}, {"state": "cancelled"} ou
+  {"state": "failed", "error": ...}.
+
+O processo atende jobs até o stdin fechar (o servidor encerrou).
+"""
+import json
+import os
+import pickle
+import sys
+
+from .reports import generate_service_report_pdf
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+def job_path(directory, job_id, suffix):
+    return os.path.join(directory, f"{job_id}{suffix}")
+
+
+def write_atomic(path, data):
+    temp = f"{path}.{os.getpid()}.tmp"
+
+    with open(temp, "wb") as handle:
+        handle.write(data)
+
+    os.replace(temp, path)
+
+
+def _write_phase(directory, job_id, phase):
+    write_atomic(
+        job_path(directory, job_id, ".json"),
+        json.dumps({"phase": phase}).encode("utf-8"),
+    )
+
+
+def render_job(directory, job_id):
+    """stats, layout e render de job_id a partir de <job_id>.input."""
+    with open(job_path(directory, job_id, ".input"), "rb") as handle:
+        (
+            device_id,
+            row,
+            history,
+            period_label,
+            alarm_events,
+            device_channels,
+            weighting,
+        ) = pickle.load(handle)
+
+    def progress(phase):
+        if os.path.exists(job_path(directory, job_id, ".cancel")):
+            raise ReportCancelled()
+
+        _write_phase(directory, job_id, phase)
+
+    buffer = generate_service_report_pdf(
+        device_id,
+        row,
+        history,
+        period_label,
+        alarm_events,
+        device_channels=device_channels,
+        progress=progress,
+        weighting=weighting,
+    )
+
+    write_atomic(job_path(directory, job_id, ".pdf"), buffer.getvalue())
+
+
+def serve(requests, replies):
+    for line in requests:
+        request = json.loads(line)
+
+        try:
+            render_job(request["directory"], request["job_id"])
+        except ReportCancelled:
+            reply = {"state": "cancelled"}
+        except Exception as exc:
+            reply = {
+                "state": "failed",
+                "error": str(exc) or type(exc).__name__,
+            }
+        else:
+            reply = {"state": "done"}
+
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    # stdout é o canal das respostas: o que as bibliotecas imprimirem
+    # vai para o stderr.
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    serve(sys.stdin, replies)
@@ -14,152 +14,296 @@ from core.constants import *
 from .utils import *
 from .data import *
 from .analog_inputs import *
+from .analytics import series_statistics, time_weighted_statistics
+
+
+# Média por leitura (simples) ou ponderada pela duração de cada leitura.
+REPORT_WEIGHTINGS = ("leitura", "tempo")
+
+
+def _epoch_seconds(values):
+    return values.astype("datetime64[ns]").astype(np.int64) / 1e9
+
+
+def report_sample_seconds(history):
+    """
+    Instante de cada leitura do histórico, em segundos desde a época.
+
+    Usa timestamp_dispositivo quando válido — leituras guardadas no
+    dispositivo e enviadas na reconexão mantêm o horário da medição — e
+    recebido_em nas demais (sem relógio ou com horário no futuro).
+    """
+    received = history["recebido_em"]
+
+    if "timestamp_dispositivo" in history.columns:
+        measured = history["timestamp_dispositivo"]
+        received = measured.where(
+            measured.notna() & (measured <= received),
+            received,
+        )
+
+    return _epoch_seconds(received.to_numpy(dtype="datetime64[ns]"))
 
 
 def build_report_statistics(
     device_id,
     history,
+    device_channels=None,
+    weighting="leitura",
+    max_hold=REPORT_MAX_HOLD_SECONDS,
+    end=None,
 ):
     """
     Constrói estatísticas de engenharia para o período selecionado.
 
+    device_channels (DeviceChannels) evita consultar a configuração, por
+    exemplo em um processo de relatório sem sessão Streamlit.
+
+    Todas as séries (AI ativas convertidas, vibração e RMS por eixo) são
+    montadas em uma matriz e reduzidas de uma vez por series_statistics.
+
+    Com weighting="tempo", media e desvio são ponderados pela duração de
+    cada leitura (time_weighted_statistics, lacunas limitadas a max_hold
+    segundos, a última leitura vale até end), e cada item ganha
+    duracao_s e lacunas. Mínimo, máximo e percentis continuam por leitura.
+
     Retorna uma lista de dicionários com:
-      nome, unidade, media, minimo, maximo, ultimo, leituras
+      categoria, nome, canal, unidade, media, minimo, maximo, ultimo,
+      leituras, desvio, p5, p50, p95
     """
     if history.empty:
         return []
 
-    configs = load_channel_configs()
-    devices = load_devices()
+    if device_channels is None:
+        device_channels = get_channel_table().device(device_id)
 
-    full_scale_v = 4.096
+    series = []
+    columns = []
 
-    if not devices.empty:
-        match = devices[
-            devices["device_id"].astype(str)
-            == str(device_id)
-        ]
-        if not match.empty:
-            full_scale_v = safe_float(
-                match.iloc[0].get("adc_full_scale_v"),
-                4.096
+    # Entradas analógicas ativas.
+    for channel in device_channels.active:
+        series.append((
+            "Entrada analógica",
+            channel.label,
+            channel.canal,
+            channel.unit,
+        ))
+        columns.append(channel.series(history).to_numpy())
+
+    # Vibração e RMS de aceleração por eixo.
+    for categoria, suffix, prefix, unit in [
+        ("Vibracao", "mm_s", "Vibracao", "mm/s RMS"),
+        ("Aceleracao RMS", "rms", "RMS", "g RMS"),
+    ]:
+        for axis in ["x", "y", "z"]:
+            column = f"{axis}_{suffix}"
+
+            if column not in history.columns:
+                continue
+
+            series.append((
+                categoria,
+                f"{prefix} {axis.upper()}",
+                axis.upper(),
+                unit,
+            ))
+            columns.append(
+                pd.to_numeric(history[column], errors="coerce")
+                .to_numpy(dtype=np.float64, na_value=np.nan)
             )
 
-    stats = []
+    if not columns:
+        return []
 
-    # Entradas analógicas ativas.
-    for canal_num in range(1, 17):
-        canal = f"AI{canal_num:03d}"
-
-        if not is_channel_active(
-            configs,
-            device_id,
-            canal
-        ):
-            continue
+    matrix = np.vstack(columns)
+    summary = series_statistics(matrix)
 
-        cfg = get_channel_config(
-            configs,
-            device_id,
-            canal
+    if weighting == "tempo":
+        weighted = time_weighted_statistics(
+            report_sample_seconds(history),
+            matrix,
+            max_hold,
+            None if end is None else pd.Timestamp(end).timestamp(),
         )
+        summary.update(weighted)
 
-        values = history.apply(
-            lambda row: get_channel_value(
-                row,
-                configs,
-                device_id,
-                canal,
-                full_scale_v
-            ),
-            axis=1,
-        )
+    stats = []
 
-        values = pd.to_numeric(
-            values,
-            errors="coerce"
-        ).dropna()
+    for position, (categoria, nome, canal, unidade) in enumerate(series):
+        leituras = int(summary["leituras"][position])
 
-        if values.empty:
+        if not leituras:
             continue
 
-        nome = channel_display_name(
-            cfg,
-            canal
+        item = {
+            "categoria": categoria,
+            "nome": nome,
+            "canal": canal,
+            "unidade": unidade,
+            "leituras": leituras,
+        }
+
+        for name in [
+            "media",
+            "minimo",
+            "maximo",
+            "ultimo",
+            "desvio",
+            "p5",
+            "p50",
+            "p95",
+        ]:
+            item[name] = float(summary[name][position])
+
+        if weighting == "tempo":
+            item["duracao_s"] = float(summary["duracao_s"][position])
+            item["lacunas"] = int(summary["lacunas"][position])
+
+        stats.append(item)
+
+    return stats
+
+
+def time_weighted_rollups(rollups, max_hold=REPORT_MAX_HOLD_SECONDS, end=None):
+    """
+    Média e desvio ponderados no tempo a partir de agregados
+    (load_hourly_rollups), por (device_id, grandeza), nas unidades da
+    telemetria — o mesmo que time_weighted_statistics sobre as leituras.
+
+    Dentro de cada linha as leituras são tomadas como igualmente
+    espaçadas entre primeiro_em e ultimo_em: cada uma, menos a última,
+    vale esse passo (no máximo max_hold). A última (ultimo) vale até a
+    primeira leitura da linha seguinte da mesma grandeza, ou até end, no
+    máximo max_hold. Linhas de uma leitura (trechos brutos) reproduzem o
+    cálculo por leitura exatamente. lacunas conta os intervalos acima de
+    max_hold.
+    """
+    columns = [
+        "device_id", "grandeza", "leituras", "media", "desvio",
+        "duracao_s", "lacunas",
+    ]
+
+    frame = rollups.dropna(
+        subset=["leituras", "soma", "ultimo", "primeiro_em"],
+    )
+    frame = frame[frame["leituras"] > 0]
+
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+
+    frame = frame.sort_values(
+        ["device_id", "grandeza", "primeiro_em"],
+        kind="stable",
+        ignore_index=True,
+    )
+    group = frame.groupby(
+        ["device_id", "grandeza"],
+        sort=False,
+    ).ngroup().to_numpy()
+
+    n = frame["leituras"].to_numpy(dtype=np.float64)
+    soma = frame["soma"].to_numpy(dtype=np.float64)
+    soma_q = frame["soma_quadrados"].to_numpy(dtype=np.float64)
+    ultimo = frame["ultimo"].to_numpy(dtype=np.float64)
+    first = _epoch_seconds(frame["primeiro_em"].to_numpy("datetime64[ns]"))
+    last = _epoch_seconds(
+        frame["ultimo_em"].fillna(frame["primeiro_em"])
+        .to_numpy("datetime64[ns]")
+    )
+
+    # Próxima linha da mesma grandeza; na última, end (ou nada).
+    same = np.append(group[1:] == group[:-1], False)
+    close = last if end is None else np.maximum(
+        pd.Timestamp(end).timestamp(),
+        last,
+    )
+    following = np.where(same, np.append(first[1:], 0.0), close)
+
+    gap = np.maximum(following - last, 0.0)
+    hold = np.minimum(gap, max_hold)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        spacing = np.where(
+            n > 1,
+            np.maximum(last - first, 0.0) / np.maximum(n - 1, 1.0),
+            0.0,
         )
 
-        unidade = channel_unit(
-            cfg,
-            ""
+    step = np.minimum(spacing, max_hold)
+    weight = step * (n - 1) + hold
+    weighted_sum = step * (soma - ultimo) + hold * ultimo
+    weighted_square = (
+        step * (soma_q - ultimo * ultimo)
+        + hold * ultimo * ultimo
+    )
+    gaps = (gap > max_hold) + np.where(spacing > max_hold, n - 1, 0.0)
+
+    size = group.max() + 1
+    total = np.bincount(group, weight, size)
+    readings = np.bincount(group, n, size)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.where(
+            total > 0,
+            np.bincount(group, weighted_sum, size) / total,
+            np.bincount(group, soma, size) / readings,
+        )
+        variance = (
+            np.bincount(group, weighted_square, size) / total
+            - media * media
         )
 
-        stats.append({
-            "categoria": "Entrada analógica",
-            "nome": nome,
-            "canal": canal,
-            "unidade": unidade,
-            "media": float(values.mean()),
-            "minimo": float(values.min()),
-            "maximo": float(values.max()),
-            "ultimo": float(values.iloc[-1]),
-            "leituras": int(values.count()),
-        })
-
-    # Vibração por eixo.
-    for axis in ["x", "y", "z"]:
-        column = f"{axis}_mm_s"
-
-        if column not in history.columns:
-            continue
+    desvio = np.sqrt(np.maximum(variance, 0.0))
+    desvio[total <= 0] = np.nan
 
-        values = pd.to_numeric(
-            history[column],
-            errors="coerce"
-        ).dropna()
+    starts = np.flatnonzero(np.append(True, ~same[:-1]))
+    keys = frame.loc[starts, ["device_id", "grandeza"]]
 
-        if values.empty:
-            continue
+    return pd.DataFrame({
+        "device_id": keys["device_id"].astype(str).to_numpy(),
+        "grandeza": keys["grandeza"].to_numpy(),
+        "leituras": readings.astype(int),
+        "media": media,
+        "desvio": desvio,
+        "duracao_s": total,
+        "lacunas": np.bincount(group, gaps, size).astype(int),
+    }, columns=columns)
 
-        stats.append({
-            "categoria": "Vibracao",
-            "nome": f"Vibracao {axis.upper()}",
-            "canal": axis.upper(),
-            "unidade": "mm/s RMS",
-            "media": float(values.mean()),
-            "minimo": float(values.min()),
-            "maximo": float(values.max()),
-            "ultimo": float(values.iloc[-1]),
-            "leituras": int(values.count()),
-        })
-
-    # RMS de aceleracao por eixo.
-    for axis in ["x", "y", "z"]:
-        column = f"{axis}_rms"
-
-        if column not in history.columns:
-            continue
 
-        values = pd.to_numeric(
-            history[column],
-            errors="coerce"
-        ).dropna()
+def load_time_weighted_statistics(
+    device_ids,
+    window,
+    max_hold=REPORT_MAX_HOLD_SECONDS,
+):
+    """
+    Média e desvio ponderados no tempo na janela (HistoryWindow), em
+    unidades de engenharia, das horas agregadas mais as bordas brutas
+    (load_hourly_rollups) — sem baixar todas as leituras. Mesmas colunas
+    de time_weighted_rollups, mais canal.
+    """
+    weighted = time_weighted_rollups(
+        load_hourly_rollups(
+            tuple(sorted({str(device_id) for device_id in device_ids})),
+            window,
+        ),
+        max_hold,
+        window.end,
+    )
 
-        if values.empty:
-            continue
+    if weighted.empty:
+        return weighted.assign(canal=pd.Series(dtype=object))
 
-        stats.append({
-            "categoria": "Aceleracao RMS",
-            "nome": f"RMS {axis.upper()}",
-            "canal": axis.upper(),
-            "unidade": "g RMS",
-            "media": float(values.mean()),
-            "minimo": float(values.min()),
-            "maximo": float(values.max()),
-            "ultimo": float(values.iloc[-1]),
-            "leituras": int(values.count()),
-        })
+    canal, gain, offset = rollup_channel_coefficients(weighted)
 
-    return stats
+    return weighted.assign(
+        canal=canal,
+        media=gain * weighted["media"].to_numpy() + offset,
+        desvio=np.abs(gain) * weighted["desvio"].to_numpy(),
+    )
+
+
+def _no_progress(phase):
+    pass
 
 
 def generate_service_report_pdf(
@@ -168,12 +312,22 @@ def generate_service_report_pdf(
     history,
     period_label,
     alarm_events=None,
+    device_channels=None,
+    progress=None,
+    weighting="leitura",
 ):
     """
     Gera o relatório de serviço do ativo em PDF.
     O banco permanece em UTC; datas do relatório são exibidas em
     America/Sao_Paulo.
+
+    weighting escolhe a média do resumo (ver build_report_statistics).
+
+    progress(fase), se informado, é chamado no início de cada fase
+    ("stats", "layout", "render") e pode levantar exceção para cancelar.
     """
+    progress = progress or _no_progress
+
     buffer = io.BytesIO()
 
     doc = SimpleDocTemplate(
@@ -252,13 +406,18 @@ def generate_service_report_pdf(
                 styles["BodyText"],
             )
         )
+        progress("render")
         doc.build(story)
         buffer.seek(0)
         return buffer
 
+    progress("stats")
+
     stats = build_report_statistics(
         device_id,
         history,
+        device_channels,
+        weighting,
     )
 
     if not stats:
@@ -269,10 +428,13 @@ def generate_service_report_pdf(
                 styles["BodyText"],
             )
         )
+        progress("render")
         doc.build(story)
         buffer.seek(0)
         return buffer
 
+    progress("layout")
+
     story.append(
         Paragraph(
             "Resumo do comportamento do ativo",
@@ -285,7 +447,7 @@ def generate_service_report_pdf(
             "Categoria",
             "Grandeza",
             "Unidade",
-            "Media",
+            "Media (tempo)" if weighting == "tempo" else "Media",
             "Minimo",
             "Maximo",
             "Ultimo",
@@ -545,11 +707,63 @@ def generate_service_report_pdf(
         )
     )
 
+    progress("render")
     doc.build(story)
     buffer.seek(0)
     return buffer
 
 
+def service_report_key(
+    device_id,
+    window,
+    period_label,
+    row,
+    history,
+    alarm_events=None,
+    weighting="leitura",
+):
+    """
+    Identifica o conteúdo do relatório de serviço: dispositivo, janela,
+    tipo de média, versão dos dados (leituras, eventos de alarme e cadastro/status) e
+    versão da configuração das AI.
+
+    O histórico é append-only, então quantidade e primeira/última leitura
+    bastam como versão; os eventos de alarme são poucos e entram por hash.
+    """
+    if history.empty or "recebido_em" not in history.columns:
+        history_version = (0, None, None)
+    else:
+        history_version = (
+            len(history),
+            str(history["recebido_em"].iloc[0]),
+            str(history["recebido_em"].iloc[-1]),
+        )
+
+    if alarm_events is None or alarm_events.empty:
+        alarm_version = 0
+    else:
+        alarm_version = int(
+            pd.util.hash_pandas_object(alarm_events, index=False).sum()
+        )
+
+    data_version = (
+        history_version,
+        alarm_version,
+        str(row.get("nome", device_id)),
+        str(row.get("local", "Sem local")),
+        str(row.get("status", "Offline")),
+    )
+
+    return (
+        str(device_id),
+        window,
+        period_label,
+        weighting,
+        data_version,
+        get_channel_table().version,
+    )
+
+
 def generate_pdf(device_id, row, history):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -565,18 +779,7 @@ def generate_pdf(device_id, row, history):
     story.append(Spacer(1, 0.25 * inch))
 
     channel_configs = load_channel_configs()
-    devices = load_devices()
-
-    full_scale = 4.096
-    if not devices.empty:
-        match = devices[
-            devices["device_id"].astype(str) == str(device_id)
-        ]
-        if not match.empty:
-            full_scale = safe_float(
-                match.iloc[0].get("adc_full_scale_v"),
-                4.096
-            )
+    full_scale = device_full_scale(device_id)
 
     pressure_cfg = get_channel_config(
         channel_configs,
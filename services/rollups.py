@@ -0,0 +1,84 @@
+"""
+Manutenção dos agregados horários/diários da telemetria
+(public.telemetria_rollup_hora e public.telemetria_rollup_dia).
+
+O recálculo acontece no banco, pela função
+public.atualizar_rollups_telemetria, a partir da marca d'água guardada em
+public.telemetria_rollup_estado. Com pg_cron, a migration
+telemetria_rollups_agendamento já agenda a chamada a cada 5 minutos;
+sem ele, este módulo faz o agendamento.
+
+Uso (chave service_role, fora do Streamlit):
+
+    SUPABASE_URL=... SUPABASE_SERVICE_KEY=... python -m services.rollups
+    python -m services.rollups --intervalo 300
+    python -m services.rollups --desde 2026-01-01T00:00:00+00:00
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+from supabase import create_client
+
+
+def refresh_rollups(client, since=None):
+    """
+    Atualiza os agregados de forma incremental. Com since, recalcula
+    todas as horas a partir dessa data (reprocessamento).
+    Retorna a quantidade de buckets horários gravados.
+    """
+    response = client.rpc(
+        "atualizar_rollups_telemetria",
+        {
+            "p_desde": since.isoformat() if since else None,
+        },
+    ).execute()
+
+    return int(response.data or 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Atualiza os agregados da telemetria AXION.",
+    )
+    parser.add_argument(
+        "--intervalo",
+        type=int,
+        default=0,
+        help="Repete a cada N segundos (0 executa uma única vez).",
+    )
+    parser.add_argument(
+        "--desde",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Reprocessa a partir desta data ISO 8601.",
+    )
+    args = parser.parse_args(argv)
+
+    client = create_client(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_SERVICE_KEY"],
+    )
+
+    since = args.desde
+
+    while True:
+        started = time.monotonic()
+        buckets = refresh_rollups(client, since)
+        since = None
+
+        print(
+            f"{datetime.now(timezone.utc).isoformat()} "
+            f"{buckets} bucket(s) horário(s) atualizados em "
+            f"{time.monotonic() - started:.2f}s"
+        )
+
+        if args.intervalo <= 0:
+            return
+
+        time.sleep(args.intervalo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+DataFrames compartilhados entre sessões sem cópia.
+
+share_frame() guarda cada coluna em um array NumPy próprio marcado como
+somente leitura. Fatias (iloc/loc) e cópias rasas (copy(deep=False))
+reaproveitam esses arrays; qualquer escrita no lugar (df.loc[...] = ...,
+fillna(inplace=True), ...) levanta ValueError em vez de alterar os dados
+das outras sessões. Para acrescentar ou trocar colunas, use
+frame_view(), que devolve uma cópia rasa.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _freeze_values(values):
+    """Cópia de values (array de uma coluna) somente leitura."""
+    values = values.copy()
+
+    # DatetimeArray/TimedeltaArray guardam um ndarray datetime64 interno.
+    backing = getattr(values, "_ndarray", values)
+
+    if isinstance(backing, np.ndarray):
+        backing.setflags(write=False)
+
+    return values
+
+
+def _column_values(df, position):
+    values = df.iloc[:, position].array
+
+    if isinstance(values, pd.arrays.NumpyExtensionArray):
+        values = values.to_numpy()
+
+    return values
+
+
+def _is_frozen(values):
+    backing = getattr(values, "_ndarray", values)
+    return isinstance(backing, np.ndarray) and not backing.flags.writeable
+
+
+def share_frame(df):
+    """
+    Versão somente leitura de df, com uma coluna por array.
+    Colunas que já vêm de um frame compartilhado não são copiadas.
+    """
+    if df is None or is_shared(df):
+        return df
+
+    columns = {}
+
+    for position, name in enumerate(df.columns):
+        values = _column_values(df, position)
+        columns[name] = (
+            values if _is_frozen(values) else _freeze_values(values)
+        )
+
+    index = df.index
+
+    if isinstance(index, pd.DatetimeIndex):
+        index = pd.DatetimeIndex(
+            _freeze_values(index.array),
+            name=index.name,
+        )
+
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def is_shared(df):
+    """Todas as colunas de df já estão em arrays somente leitura."""
+    return isinstance(df, pd.DataFrame) and all(
+        _is_frozen(_column_values(df, position))
+        for position in range(df.shape[1])
+    )
+
+
+def frame_view(df):
+    """
+    Cópia rasa de um frame compartilhado: novas colunas ficam só nela,
+    as existentes continuam protegidas contra escrita no lugar.
+    """
+    return df.copy(deep=False)
@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+
+from core.constants import *
+
+
+TIME_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def floor_time(ts, step):
+    """Maior múltiplo de step (grade UTC a partir da época) <= ts."""
+    return TIME_EPOCH + ((ts - TIME_EPOCH) // step) * step
+
+
+def ceil_time(ts, step):
+    floor = floor_time(ts, step)
+    return floor if floor == ts else floor + step
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryWindow:
+    """
+    Período [start, end) em UTC, com as bordas alinhadas a uma grade.
+
+    É a chave dos loaders de histórico (load_history, load_alarm_events,
+    load_period_rollups/statistics): todas as sessões que pedem "últimos
+    7 dias" dentro do mesmo passo da grade usam a mesma janela, e portanto
+    a mesma entrada de cache, e o resultado é reproduzível.
+    """
+    start: datetime
+    end: datetime
+
+    @classmethod
+    def last(cls, days, grid=None, now=None):
+        """
+        Últimos days dias até agora; end é arredondado para cima na grade
+        (HISTORY_WINDOW_GRID_SECONDS por padrão) para incluir a leitura
+        mais recente.
+        """
+        grid = grid or timedelta(seconds=HISTORY_WINDOW_GRID_SECONDS)
+        now = now or datetime.now(timezone.utc)
+        end = ceil_time(now, grid)
+        return cls(end - timedelta(days=days), end)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def days(self):
+        return self.duration / timedelta(days=1)
+
+    def contains(self, ts):
+        return self.start <= ts < self.end
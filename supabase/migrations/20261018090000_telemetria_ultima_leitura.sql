@@ -0,0 +1,46 @@
+-- Última leitura por dispositivo para o painel da frota.
+--
+-- O custo da consulta depende da quantidade de dispositivos, não do
+-- tamanho da tabela telemetria: os device_id distintos são percorridos
+-- pelo índice (skip scan via CTE recursiva) e, para cada um, apenas a
+-- linha mais recente é lida pelo mesmo índice.
+
+create index if not exists telemetria_device_recebido_idx
+    on public.telemetria (device_id, recebido_em desc);
+
+create or replace view public.telemetria_ultima_leitura
+with (security_invoker = true)
+as
+with recursive dispositivos_com_dados as (
+    (
+        select t.device_id
+        from public.telemetria t
+        where t.device_id is not null
+        order by t.device_id
+        limit 1
+    )
+
+    union all
+
+    select (
+        select t.device_id
+        from public.telemetria t
+        where t.device_id > d.device_id
+        order by t.device_id
+        limit 1
+    ) as device_id
+    from dispositivos_com_dados d
+    where d.device_id is not null
+)
+select ultima.*
+from dispositivos_com_dados d
+cross join lateral (
+    select t.*
+    from public.telemetria t
+    where t.device_id = d.device_id
+    order by t.recebido_em desc
+    limit 1
+) ultima
+where d.device_id is not null;
+
+grant select on public.telemetria_ultima_leitura to authenticated;
@@ -0,0 +1,180 @@
+-- Agregados horários e diários da telemetria por dispositivo e grandeza.
+--
+-- grandeza é o nome da coluna de origem em public.telemetria
+-- (ai001..ai008 em contagens RAW, x_mm_s.. e x_rms.. em unidades nativas).
+-- A conversão para engenharia é afim e feita no aplicativo, então
+-- mudanças em configuracao_analogica não invalidam os agregados.
+
+create table if not exists public.telemetria_rollup_hora (
+    device_id text not null,
+    grandeza text not null,
+    bucket timestamptz not null,
+    leituras bigint not null,
+    soma double precision not null,
+    soma_quadrados double precision not null,
+    minimo double precision not null,
+    maximo double precision not null,
+    primeiro double precision not null,
+    ultimo double precision not null,
+    primeiro_em timestamptz not null,
+    ultimo_em timestamptz not null,
+    primary key (device_id, grandeza, bucket)
+);
+
+create table if not exists public.telemetria_rollup_dia (
+    like public.telemetria_rollup_hora including all
+);
+
+create index if not exists telemetria_rollup_hora_bucket_idx
+    on public.telemetria_rollup_hora (bucket);
+
+create index if not exists telemetria_rollup_dia_bucket_idx
+    on public.telemetria_rollup_dia (bucket);
+
+-- Marca d'água da última atualização incremental.
+create table if not exists public.telemetria_rollup_estado (
+    id smallint primary key default 1 check (id = 1),
+    processado_ate timestamptz not null default '1970-01-01 00:00:00+00'
+);
+
+insert into public.telemetria_rollup_estado (id)
+values (1)
+on conflict (id) do nothing;
+
+
+-- Recalcula as horas tocadas desde a marca d'água (ou desde p_desde) e
+-- os dias que contêm essas horas. Cada bucket é recalculado por inteiro,
+-- então a função é idempotente e pode ser executada com qualquer
+-- frequência (ex.: a cada 5 minutos via services/rollups.py ou pg_cron).
+create or replace function public.atualizar_rollups_telemetria(
+    p_desde timestamptz default null
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_ate timestamptz := now();
+    v_hora_inicio timestamptz;
+    v_dia_inicio timestamptz;
+    v_linhas integer;
+begin
+    select date_trunc(
+        'hour',
+        coalesce(p_desde, processado_ate) - interval '1 hour'
+    )
+    into v_hora_inicio
+    from public.telemetria_rollup_estado
+    where id = 1
+    for update;
+
+    v_dia_inicio := date_trunc('day', v_hora_inicio);
+
+    insert into public.telemetria_rollup_hora as r (
+        device_id, grandeza, bucket, leituras, soma, soma_quadrados,
+        minimo, maximo, primeiro, ultimo, primeiro_em, ultimo_em
+    )
+    select
+        t.device_id,
+        v.grandeza,
+        date_trunc('hour', t.recebido_em) as bucket,
+        count(*),
+        sum(v.valor),
+        sum(v.valor * v.valor),
+        min(v.valor),
+        max(v.valor),
+        (array_agg(v.valor order by t.recebido_em asc))[1],
+        (array_agg(v.valor order by t.recebido_em desc))[1],
+        min(t.recebido_em),
+        max(t.recebido_em)
+    from public.telemetria t
+    cross join lateral (
+        values
+            ('ai001', t.ai001::double precision),
+            ('ai002', t.ai002::double precision),
+            ('ai003', t.ai003::double precision),
+            ('ai004', t.ai004::double precision),
+            ('ai005', t.ai005::double precision),
+            ('ai006', t.ai006::double precision),
+            ('ai007', t.ai007::double precision),
+            ('ai008', t.ai008::double precision),
+            ('x_mm_s', t.x_mm_s::double precision),
+            ('y_mm_s', t.y_mm_s::double precision),
+            ('z_mm_s', t.z_mm_s::double precision),
+            ('x_rms', t.x_rms::double precision),
+            ('y_rms', t.y_rms::double precision),
+            ('z_rms', t.z_rms::double precision)
+    ) as v (grandeza, valor)
+    where t.recebido_em >= v_hora_inicio
+      and t.recebido_em < v_ate
+      and v.valor is not null
+    group by t.device_id, v.grandeza, date_trunc('hour', t.recebido_em)
+    on conflict (device_id, grandeza, bucket) do update set
+        leituras = excluded.leituras,
+        soma = excluded.soma,
+        soma_quadrados = excluded.soma_quadrados,
+        minimo = excluded.minimo,
+        maximo = excluded.maximo,
+        primeiro = excluded.primeiro,
+        ultimo = excluded.ultimo,
+        primeiro_em = excluded.primeiro_em,
+        ultimo_em = excluded.ultimo_em;
+
+    get diagnostics v_linhas = row_count;
+
+    insert into public.telemetria_rollup_dia as r (
+        device_id, grandeza, bucket, leituras, soma, soma_quadrados,
+        minimo, maximo, primeiro, ultimo, primeiro_em, ultimo_em
+    )
+    select
+        h.device_id,
+        h.grandeza,
+        date_trunc('day', h.bucket) as bucket,
+        sum(h.leituras),
+        sum(h.soma),
+        sum(h.soma_quadrados),
+        min(h.minimo),
+        max(h.maximo),
+        (array_agg(h.primeiro order by h.primeiro_em asc))[1],
+        (array_agg(h.ultimo order by h.ultimo_em desc))[1],
+        min(h.primeiro_em),
+        max(h.ultimo_em)
+    from public.telemetria_rollup_hora h
+    where h.bucket >= v_dia_inicio
+    group by h.device_id, h.grandeza, date_trunc('day', h.bucket)
+    on conflict (device_id, grandeza, bucket) do update set
+        leituras = excluded.leituras,
+        soma = excluded.soma,
+        soma_quadrados = excluded.soma_quadrados,
+        minimo = excluded.minimo,
+        maximo = excluded.maximo,
+        primeiro = excluded.primeiro,
+        ultimo = excluded.ultimo,
+        primeiro_em = excluded.primeiro_em,
+        ultimo_em = excluded.ultimo_em;
+
+    update public.telemetria_rollup_estado
+    set processado_ate = v_ate
+    where id = 1;
+
+    return v_linhas;
+end;
+$$;
+
+revoke all on function public.atualizar_rollups_telemetria(timestamptz)
+    from public, anon, authenticated;
+grant execute on function public.atualizar_rollups_telemetria(timestamptz)
+    to service_role;
+
+alter table public.telemetria_rollup_hora enable row level security;
+alter table public.telemetria_rollup_dia enable row level security;
+alter table public.telemetria_rollup_estado enable row level security;
+
+create policy telemetria_rollup_hora_leitura
+    on public.telemetria_rollup_hora
+    for select to authenticated using (true);
+
+create policy telemetria_rollup_dia_leitura
+    on public.telemetria_rollup_dia
+    for select to authenticated using (true);
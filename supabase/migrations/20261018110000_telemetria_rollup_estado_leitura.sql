@@ -0,0 +1,7 @@
+-- O aplicativo lê a marca d'água dos agregados (processado_ate) para
+-- usar telemetria_rollup_hora/dia somente nas horas já processadas; o
+-- trecho mais recente vem da telemetria bruta.
+
+create policy telemetria_rollup_estado_leitura
+    on public.telemetria_rollup_estado
+    for select to authenticated using (true);
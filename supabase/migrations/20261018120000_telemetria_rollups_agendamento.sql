@@ -0,0 +1,25 @@
+-- Agenda a atualização incremental dos agregados a cada 5 minutos com
+-- pg_cron, quando a extensão está disponível no projeto.
+--
+-- Sem pg_cron, execute services/rollups.py periodicamente. Enquanto a
+-- marca d'água (telemetria_rollup_estado.processado_ate) estiver
+-- atrasada ou ausente, o aplicativo lê da telemetria bruta o trecho
+-- ainda não processado, então os gauges não perdem as estatísticas.
+
+do $$
+begin
+    if exists (
+        select 1
+        from pg_available_extensions
+        where name = 'pg_cron'
+    ) then
+        create extension if not exists pg_cron;
+
+        perform cron.schedule(
+            'atualizar_rollups_telemetria',
+            '*/5 * * * *',
+            'select public.atualizar_rollups_telemetria()'
+        );
+    end if;
+end;
+$$;
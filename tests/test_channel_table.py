@@ -0,0 +1,40 @@
+"""
+ChannelInfo.value (cards e detalhes) contra a conversão colunar usada
+nos alarmes e gráficos: os valores devem ser idênticos bit a bit.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.channel_table import DeviceChannels
+
+
+CONFIGS = {
+    ("d1", "AI001"): {"modo": "raw_voltage"},
+    ("d1", "AI002"): {
+        "modo": "linear_raw",
+        "source_min": 120,
+        "source_max": 31000,
+        "eng_min": -3.5,
+        "eng_max": 17.25,
+    },
+    ("d1", "AI003"): {"modo": "linear_voltage", "eng_min": 0, "eng_max": 7},
+    ("d1", "AI004"): {
+        "modo": "linear_4_20ma",
+        "shunt_ohms": 150,
+        "eng_min": 0,
+        "eng_max": 10,
+    },
+    ("d1", "AI005"): {"modo": "disabled"},
+}
+
+
+@pytest.mark.parametrize("canal", sorted(canal for _, canal in CONFIGS))
+def test_value_matches_series(canal):
+    channel = DeviceChannels("d1", CONFIGS, full_scale_v=4.096).channel(canal)
+    raw = np.random.default_rng(3).integers(0, 32767, 500)
+    df = pd.DataFrame({channel.field: raw})
+
+    rows = np.array([channel.value(row) for _, row in df.iterrows()])
+
+    np.testing.assert_array_equal(rows, channel.series(df).to_numpy())
@@ -0,0 +1,127 @@
+"""
+MqttTelemetryIngest com um cliente falso via client_factory: as mensagens
+chegam pelos mesmos callbacks que o loop do paho chamaria.
+"""
+import json
+import types
+
+import pytest
+
+from services.mqtt_ingest import MqttTelemetryIngest
+
+
+class FakeClient:
+    """Cliente compatível com paho: registra as chamadas, sem rede."""
+
+    def __init__(self, client_id, clean_session):
+        self.client_id = client_id
+        self.subscriptions = []
+        self.connected_to = None
+        self.looping = False
+
+    def username_pw_set(self, username, password):
+        self.credentials = (username, password)
+
+    def tls_set(self):
+        pass
+
+    def connect_async(self, host, port, keepalive):
+        self.connected_to = (host, port)
+
+    def loop_start(self):
+        self.looping = True
+
+    def loop_stop(self):
+        self.looping = False
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic, qos):
+        self.subscriptions.append(topic)
+
+    def publish(self, topic, data):
+        message = types.SimpleNamespace(
+            topic=topic,
+            payload=json.dumps(data).encode("utf-8"),
+        )
+        self.on_message(self, None, message)
+
+
+@pytest.fixture
+def ingest():
+    clients = []
+
+    def factory(**kwargs):
+        client = FakeClient(**kwargs)
+        clients.append(client)
+        return client
+
+    ingest = MqttTelemetryIngest(
+        ["ai001"],
+        "broker.teste",
+        capacity=3,
+        client_factory=factory,
+    )
+    ingest.start()
+    ingest.client = clients[0]
+    ingest.client.on_connect(ingest.client, None, {}, 0)
+    yield ingest
+    ingest.stop()
+
+
+def _reading(second, value):
+    return {
+        "recebido_em": f"2026-10-18T10:00:{second:02d}Z",
+        "ai001": value,
+    }
+
+
+def test_client_factory_subscribes_and_receives(ingest):
+    client = ingest.client
+
+    assert client.connected_to == ("broker.teste", 1883)
+    assert client.looping
+    assert client.subscriptions == ["axion/+/telemetria"]
+
+    ingest.set_devices(["d1"])
+    client.publish("axion/d1/telemetria", _reading(1, 100))
+
+    frame = ingest.latest_frame()
+
+    assert list(frame["device_id"]) == ["d1"]
+    assert frame["ai001"].tolist() == [100]
+    assert ingest.metrics()["messages"] == 1
+
+
+def test_unregistered_devices_get_no_buffer(ingest):
+    ingest.set_devices(["d1"])
+
+    for index in range(50):
+        ingest.client.publish(
+            f"axion/intruso{index}/telemetria",
+            _reading(1, 1),
+        )
+
+    assert ingest.recent_frame("intruso0").empty
+    assert ingest.latest_frame().empty
+    assert ingest.metrics()["unknown_devices"] == 50
+
+    ingest.client.publish("axion/d1/telemetria", _reading(1, 1))
+    ingest.set_devices(["d2"])
+
+    assert ingest.latest_frame().empty
+
+
+def test_out_of_order_messages_are_kept_sorted(ingest):
+    ingest.set_devices(["d1"])
+
+    for second, value in [(1, 1), (5, 5), (3, 3), (7, 7), (0, 0), (6, 6)]:
+        ingest.client.publish("axion/d1/telemetria", _reading(second, value))
+
+    frame = ingest.recent_frame("d1")
+
+    # capacity=3: ficam as três leituras mais recentes, em ordem.
+    assert frame["ai001"].tolist() == [5, 6, 7]
+    assert frame["recebido_em"].is_monotonic_increasing
+    assert ingest.recent_frame("d1", last=1)["ai001"].tolist() == [7]
@@ -0,0 +1,84 @@
+"""
+ReportJobs com um __main__ igual ao do streamlit run, em que __file__
+aponta para o app.py: os processos de relatório não podem executar o
+script.
+"""
+import sys
+import time
+import types
+
+import pandas as pd
+import pytest
+
+from services.channel_table import DeviceChannels
+from services.report_jobs import ReportJobs
+
+
+@pytest.fixture
+def streamlit_main(tmp_path, monkeypatch):
+    script = tmp_path / "app.py"
+    script.write_text(
+        'raise SystemExit("app.py executado no processo do relatório")\n'
+    )
+
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+    return main
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    jobs = ReportJobs(directory=str(tmp_path / "relatorios"), workers=1)
+    yield jobs
+    jobs.shutdown()
+
+
+def _fetch():
+    return {
+        "device_id": "d1",
+        "row": {"nome": "Bomba 1", "local": "Jacutinga"},
+        "history": pd.DataFrame(),
+        "period_label": "24 horas",
+        "alarm_events": None,
+        "device_channels": DeviceChannels("d1", {}),
+    }
+
+
+def _wait(jobs, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        status = jobs.status(job_id)
+
+        if status is not None and not status.active:
+            return status
+
+        time.sleep(0.1)
+
+    pytest.fail(f"job {job_id} não terminou em {timeout}s")
+
+
+def test_submit_does_not_run_main_script(streamlit_main, jobs):
+    job_id = jobs.submit(("d1", "24 horas"), _fetch)
+    status = _wait(jobs, job_id)
+
+    assert status.state == "done", status.error
+    assert jobs.result(job_id).startswith(b"%PDF")
+    assert sys.modules["__main__"] is streamlit_main
+
+
+def test_dead_worker_is_replaced(streamlit_main, jobs):
+    job_id = jobs.submit(("d1", "24 horas"), _fetch)
+    assert _wait(jobs, job_id).state == "done"
+
+    (worker,) = jobs._workers
+    worker.process.kill()
+    worker.process.wait()
+
+    job_id = jobs.submit(("d1", "3 dias"), _fetch)
+    status = _wait(jobs, job_id)
+
+    assert status.state == "done", status.error
+    assert len(jobs._workers) == 1
+    assert jobs._workers[0] is not worker
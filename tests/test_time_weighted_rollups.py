@@ -0,0 +1,125 @@
+"""
+Ponderação no tempo pelos agregados por hora (com bordas brutas) contra
+o cálculo direto sobre as leituras da mesma janela.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.analytics import time_weighted_statistics
+from services.data import (
+    _aggregate_raw_rows,
+    _reading_rollups,
+    _rollup_plan,
+)
+from services.reports import _epoch_seconds, time_weighted_rollups
+
+
+FIELDS = ["ai001", "x_mm_s"]
+MAX_HOLD = 60
+
+
+def _readings():
+    """Uma leitura a cada 10 s, sem dados entre 11h e 12h."""
+    rng = np.random.default_rng(7)
+    times = pd.date_range(
+        "2026-10-18 09:00:05",
+        "2026-10-18 14:59:55",
+        freq="10s",
+        tz="UTC",
+    )
+    times = times[(times.hour != 11)]
+
+    return [
+        {
+            "device_id": "d1",
+            "recebido_em": when.isoformat(),
+            "ai001": int(rng.integers(4000, 20000)),
+            "x_mm_s": float(np.float32(rng.uniform(0.5, 6.0))),
+        }
+        for when in times
+    ]
+
+
+def _between(rows, start, end):
+    return [
+        row
+        for row in rows
+        if start <= pd.Timestamp(row["recebido_em"]) < end
+    ]
+
+
+def _hourly(rows, start, end):
+    """O que telemetria_rollup_hora guarda para as horas de [start, end)."""
+    hour = timedelta(hours=1)
+    parts = []
+
+    while start < end:
+        parts.append(_aggregate_raw_rows(
+            _between(rows, start, start + hour),
+            FIELDS,
+        ))
+        start += hour
+
+    return parts
+
+
+@pytest.mark.parametrize("watermark", [
+    datetime(2026, 10, 18, 13, 40, tzinfo=timezone.utc),
+    None,
+])
+def test_rollups_match_raw_time_weighting(watermark):
+    rows = _readings()
+    start = datetime(2026, 10, 18, 9, 17, 23, tzinfo=timezone.utc)
+    end = datetime(2026, 10, 18, 14, 12, 41, tzinfo=timezone.utc)
+
+    days, hours, raw = _rollup_plan(start, end, True, watermark)
+    parts = []
+
+    for interval_start, interval_end in days + hours:
+        parts.extend(_hourly(rows, interval_start, interval_end))
+
+    for interval_start, interval_end in raw:
+        parts.append(_reading_rollups(
+            _between(rows, interval_start, interval_end),
+            FIELDS,
+        ))
+
+    rollups = pd.concat(
+        [part for part in parts if not part.empty],
+        ignore_index=True,
+    )
+    weighted = time_weighted_rollups(rollups, MAX_HOLD, end).set_index(
+        "grandeza"
+    )
+
+    window = pd.DataFrame(_between(rows, start, end))
+    seconds = _epoch_seconds(
+        pd.to_datetime(window["recebido_em"], utc=True)
+        .to_numpy("datetime64[ns]")
+    )
+    expected = time_weighted_statistics(
+        seconds,
+        np.vstack([
+            window[field].to_numpy(dtype=np.float64)
+            for field in FIELDS
+        ]),
+        MAX_HOLD,
+        pd.Timestamp(end).timestamp(),
+    )
+
+    for position, field in enumerate(FIELDS):
+        result = weighted.loc[field]
+
+        assert result["leituras"] == len(window)
+        assert result["media"] == pytest.approx(expected["media"][position])
+        assert result["desvio"] == pytest.approx(
+            expected["desvio"][position],
+            rel=1e-6,
+        )
+        assert result["duracao_s"] == pytest.approx(
+            expected["duracao_s"][position]
+        )
+        assert result["lacunas"] == expected["lacunas"][position] == 1
@@ -86,3 +86,29 @@ def render_alarm_card(
         unsafe_allow_html=True,
     )
 
+
+
+def render_data_warnings(issues):
+    """Avisos de dados vencidos ou indisponíveis (services.cache)."""
+    shown = set()
+
+    for issue in issues:
+        if issue.label in shown:
+            continue
+
+        shown.add(issue.label)
+
+        if not issue.has_value:
+            if issue.error:
+                st.error(
+                    f"Não foi possível carregar {issue.label}: {issue.error}"
+                )
+            else:
+                st.info(f"Carregando {issue.label}…")
+            continue
+
+        st.warning(
+            f"Exibindo {issue.label} de {int(issue.age_seconds)}s atrás: "
+            "o banco de dados está lento ou indisponível."
+            + (f" Última falha: {issue.error}" if issue.error else "")
+        )
@@ -5,6 +5,7 @@ import streamlit as st
 from supabase import create_client
 
 from core.session import get_supabase_config
+from services.cache import clear_loader_caches
 
 ROOT = Path(__file__).resolve().parent.parent
 ASSETS = ROOT / "assets"
@@ -416,6 +417,7 @@ def render_login() -> None:
             }
 
             st.cache_data.clear()
+            clear_loader_caches()
             st.session_state.user_profile = None
             st.rerun()
 